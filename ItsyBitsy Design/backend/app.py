@@ -1,90 +1,111 @@
 from flask import Flask
 from flask_cors import CORS
+from flask_sock import Sock
 import threading
 import signal
 import atexit
 import time
 from logic.itsybitsy_device import ItsyBitsyDevice
+from logic.device_pool import device_pool, pool_status
+from logic.hotplug import HotplugEvent, open_hotplug_watcher
+from logic.sequence_player import SequencePlayer
+from logic.preferences_manager import flush_preferences
+from logic.status_broadcaster import device_status, status_broadcaster
 import os
 
 VERBOSE = os.environ.get('DRINKY_VERBOSE', '1') == '1'
+# Sequence-numbered, acknowledged frames with retransmission (needs matching firmware)
+ACK_MODE = os.environ.get('DRINKY_ACK_MODE', '0') == '1'
 
 app = Flask(__name__)
 CORS(app, origins=['http://localhost:3000'])
+# WebSocket routes (the direct input channel)
+sock = Sock(app)
 
 #region Drinky Board manager
 ##########################################################
-# Global variable for the ItsyBitsy device
+# Every connected board is in device_pool; itsy_device is its primary (default) device
 itsy_device = None
 # Global state for modifier keys in Direct Input mode
 active_modifiers = set()
+# Plays saved sequences on the connected devices
+sequence_player = SequencePlayer()
 
 stop_event = threading.Event()
+# Wakes the manager on serial hotplug events (set while it runs)
+hotplug_watcher = None
 
 def drinky_manager():
     '''Background thread for device discovery and health monitoring'''
-    global itsy_device
+    global itsy_device, hotplug_watcher
     
-    def find_and_connect_device():
-        '''Find and connect to an ItsyBitsy device'''
+    def find_and_connect_devices():
+        '''Find and connect to every ItsyBitsy device not already in the pool'''
         global itsy_device
-        devices = ItsyBitsyDevice.find_devices()
-        if devices:
-            # Close any existing device
-            if itsy_device:
-                itsy_device.close()
-            
-            # Connect to the first available device
-            itsy_device = devices[0]
+        devices = ItsyBitsyDevice.find_devices(ack_mode=ACK_MODE, exclude=device_pool.ports())
+        for device in devices:
+            # The same board on a new port replaces its stale connection
+            replaced = device_pool.add(device)
+            if replaced:
+                replaced.close()
             if VERBOSE:
-                print(f'Connected to device on port {itsy_device.port}')
-            
-            # Close any additional devices found
-            for unused in devices[1:]:
-                unused.close()
-            return True
-        return False
+                print(f'Connected to device {device.key} on port {device.port}')
+        if devices:
+            itsy_device = device_pool.primary()
+            status_broadcaster.publish(pool_status(device_pool))
+        return bool(devices)
 
     # Initial device discovery
-    if not find_and_connect_device():
+    if not find_and_connect_devices():
         print('No devices found on startup')
     
     # Health monitoring loop
-    last_device_check = time.time()
-    device_check_interval = 1.0  # Check device health every 1 second
-    last_device_scan = time.time()
-    device_scan_interval = 2.0  # Scan for new devices every 2 seconds
+    device_check_interval = 0.25  # Check device health every quarter second while one is connected (a few flag checks)
+    device_scan_interval = 2.0  # Without hotplug events, scan for new devices every 2 seconds
+    # Blocks until a serial port comes or goes, so there are no wakeups while nothing is connected
+    watcher = hotplug_watcher = open_hotplug_watcher(poll_interval=device_scan_interval)
+
+    last_device_scan = time.monotonic()
 
     while not stop_event.is_set():
         try:
-            time.sleep(1)  # Check every second
-            
-            current_time = time.time()
+            events = watcher.wait(device_check_interval if len(device_pool) else None)
+            if stop_event.is_set():
+                break
             
-            # Check device health
-            if current_time - last_device_check > device_check_interval:
-                if itsy_device and not itsy_device.is_connected():
-                    print('Device is unresponsive, will attempt reconnection...')
-                    itsy_device.close()
-                    itsy_device = None
-                last_device_check = current_time
+            # Check each device's health; status streams only hear about transitions
+            if len(device_pool):
+                # An unplugged port is gone at once; is_connected() would only notice at the next heartbeat
+                dropped = device_pool.check_health(check_ports=any(event.action != 'add' for event in events))
+                for device, unplugged in dropped:
+                    print(f'Device {device.key} is unplugged' if unplugged else f'Device {device.key} is unresponsive, will attempt reconnection...')
+                    if device is itsy_device:
+                        status_broadcaster.publish({**device_status(device, connected=False), 'devices': device_pool.summary()})
+                    device.close()
+                    # Still plugged in: try it again shortly, without waiting for a hotplug event
+                    if not unplugged:
+                        watcher.inject(HotplugEvent('change', device.port))
+                itsy_device = device_pool.primary()
+                status_broadcaster.publish(pool_status(device_pool))
             
-            # Scan for new devices if we don't have one
-            if current_time - last_device_scan > device_scan_interval:
-                if not itsy_device:
-                    if VERBOSE:
-                        print('Scanning for devices...')
-                    find_and_connect_device()
-                last_device_scan = current_time
+            # Scan for new devices on hotplug events (or every scan interval without them)
+            now = time.monotonic()
+            if events or (not watcher.event_driven and now - last_device_scan >= device_scan_interval):
+                if VERBOSE:
+                    print('Scanning for devices...')
+                find_and_connect_devices()
+                last_device_scan = now
                 
         except Exception as e:
             print(f'Error in drinky_manager: {e}')
             time.sleep(0.5)  # Wait before retrying
 
     # Cleanup on shutdown
-    if itsy_device:
-        print('Closing device connection...')
-        itsy_device.close()
+    if len(device_pool):
+        print('Closing device connections...')
+        device_pool.close_all()
+    itsy_device = None
+    watcher.close()
 
 def start_drinky_manager():
     '''Start the background device management thread'''
@@ -95,12 +116,18 @@ def start_drinky_manager():
 def stop_drinky_manager():
     '''Stop the background device management thread'''
     stop_event.set()
+    if hotplug_watcher:
+        hotplug_watcher.wake()
+    # Ends the open status streams so their request threads can finish
+    status_broadcaster.close()
     print('Stopping Drinky Board manager...')
 
 def drinky_shutdown_handler(signum, frame):
     '''Handle shutdown signals gracefully'''
     print(f'\nReceived signal {signum}, shutting down...')
     stop_drinky_manager()
+    # Preference writes are debounced; the forced exit below skips atexit handlers
+    flush_preferences()
     # Force exit after a short delay to allow cleanup
     def force_exit():
         time.sleep(1)
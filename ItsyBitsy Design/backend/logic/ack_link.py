@@ -0,0 +1,321 @@
+'''
+Acknowledged Serial Link for the Drinky Board
+
+This module adds optional delivery guarantees on top of the raw serial port.
+Frames are wrapped in sequence-numbered packets that the firmware echoes back,
+so dropped or corrupted frames are detected and sent again, and every ACK
+doubles as a round-trip measurement of the device.
+
+Packet layout (must match itsybitsy_controller.ino):
+- Host:   [SEQ_FRAME][seq][length][payload x length][crc8]
+- Device: [SEQ_FRAME][seq] once the packet arrived intact (sent before executing it)
+- Device: [SEQ_NAK][expected_seq] on a bad checksum or a gap in the sequence
+- Host:   [SEQ_RESET] -> Device: [SEQ_RESET][1], restarting the sequence at 0
+
+The payload is any run of whole frames (legacy, compact or batch). An empty
+payload is a ping. The CRC-8 (polynomial 0x07) covers seq, length and payload.
+
+Delivery is go-back-N over a sliding window of WINDOW_SIZE packets: ACKs are
+cumulative, and a timeout or NAK resends every packet still in flight. The
+firmware ACKs duplicates without executing them again. The retransmit timeout
+adapts to the measured RTT and doubles on each retry; after MAX_RETRIES the
+link is marked failed.
+
+Usage:
+- link = AckLink(ser, write_lock, port)
+- link.send([b'\\x38\\x01', b'\\x38\\x00']) -> True once queued in the window
+- link.ping(); link.stats() -> {'rtt': {'p50_ms': ...}, 'retransmits': 0, ...}
+- link.close()
+'''
+
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+import threading
+import time
+import serial
+
+SEQ_FRAME = 0xB4
+SEQ_RESET = 0xB5
+SEQ_NAK = 0xB6
+MAX_SEQ_PAYLOAD = 160  # Firmware receive buffer; a full 32-entry batch frame is 131 bytes
+RTT_SAMPLE_WINDOW = 1024
+
+def _crc8_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+CRC8_TABLE = _crc8_table()
+
+def crc8(data, crc=0):
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+def encode_packet(seq, payload):
+    '''Wraps a payload in a sequence-numbered packet'''
+    header = bytes((seq, len(payload)))
+    return bytes((SEQ_FRAME,)) + header + payload + bytes((crc8(payload, crc8(header)),))
+
+def pack_payloads(frames):
+    '''Groups whole frames into payloads of at most MAX_SEQ_PAYLOAD bytes'''
+    payloads = []
+    current = bytearray()
+    for frame in frames:
+        if len(frame) > MAX_SEQ_PAYLOAD:
+            raise ValueError(f'Frame of {len(frame)} bytes exceeds the {MAX_SEQ_PAYLOAD}-byte packet payload')
+        if len(current) + len(frame) > MAX_SEQ_PAYLOAD:
+            payloads.append(bytes(current))
+            current.clear()
+        current += frame
+    if current:
+        payloads.append(bytes(current))
+    return payloads
+
+@dataclass(frozen=True)
+class RttStats:
+    count: int = 0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    p99_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'p50_ms': round(self.p50_ms, 3),
+            'p95_ms': round(self.p95_ms, 3),
+            'p99_ms': round(self.p99_ms, 3),
+            'max_ms': round(self.max_ms, 3)
+        }
+
+class _Packet:
+    __slots__ = ('data', 'first_sent', 'last_sent', 'attempts')
+
+    def __init__(self, data, now):
+        self.data = data
+        self.first_sent = now
+        self.last_sent = now
+        self.attempts = 1
+
+class AckLink:
+    WINDOW_SIZE = 8        # Packets in flight before send() waits for ACKs
+    SEND_TIMEOUT = 2.0     # Seconds send() waits for room in the window
+    MIN_RTO = 0.03         # Retransmit timeout bounds (seconds)
+    MAX_RTO = 1.0
+    MAX_RETRIES = 6        # Retransmissions of one packet before the link is failed
+    READ_INTERVAL = 0.005  # Serial read timeout of the reader thread
+
+    def __init__(self, ser, write_lock, port):
+        self.ser = ser
+        self.port = port
+        self.failed = False
+        self.last_ack = time.time()  # Wall-clock time of the last ACK (or of link setup)
+        self.acked = 0
+        self.retransmits = 0
+        self.naks = 0
+
+        self._write_lock = write_lock
+        self._cond = threading.Condition()
+        self._next_seq = 0
+        self._in_flight = OrderedDict()  # seq -> _Packet, oldest first
+        self._rtt = deque(maxlen=RTT_SAMPLE_WINDOW)
+        self._srtt = None
+        self._rttvar = 0.0
+        self._closed = threading.Event()
+
+        # Only the reader thread reads from the port from here on
+        self.ser.timeout = self.READ_INTERVAL
+        self._reader = threading.Thread(target=self._reader_loop, name=f'itsybitsy-acks-{port}', daemon=True)
+        self._reader.start()
+
+    @property
+    def rto(self):
+        if self._srtt is None:
+            return self.MAX_RTO / 4
+        return min(self.MAX_RTO, max(self.MIN_RTO, self._srtt + 4 * self._rttvar))
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight)
+
+    def send(self, payloads, timeout=None):
+        '''Sends payloads as sequenced packets, waiting for window room; returns False if the link failed'''
+        timeout = self.SEND_TIMEOUT if timeout is None else timeout
+        for payload in payloads:
+            deadline = time.monotonic() + timeout
+            with self._cond:
+                while len(self._in_flight) >= self.WINDOW_SIZE and not self.failed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        print(f'No ACKs from {self.port} for {timeout}s')
+                        self.failed = True
+                        break
+                    self._cond.wait(remaining)
+                if self.failed:
+                    return False
+                seq = self._next_seq
+                self._next_seq = (seq + 1) & 0xFF
+                packet = _Packet(encode_packet(seq, payload), time.monotonic())
+                self._in_flight[seq] = packet
+            if not self._write(packet.data):
+                return False
+        return True
+
+    def ping(self):
+        '''Sends an empty packet to measure RTT; skipped while traffic is already in flight'''
+        if self._in_flight:
+            return True
+        return self.send([b''])
+
+    def wait_idle(self, timeout):
+        '''Waits until every packet is acknowledged; returns False on timeout or failure'''
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._in_flight and not self.failed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self.failed
+
+    def rtt_stats(self) -> RttStats:
+        samples = sorted(self._rtt)
+        if not samples:
+            return RttStats()
+        def percentile(fraction):
+            return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+        return RttStats(
+            count=len(samples),
+            p50_ms=percentile(0.50),
+            p95_ms=percentile(0.95),
+            p99_ms=percentile(0.99),
+            max_ms=samples[-1] * 1000
+        )
+
+    def stats(self):
+        return {
+            'rtt': self.rtt_stats().to_dict(),
+            'rto_ms': round(self.rto * 1000, 3),
+            'in_flight': self.in_flight,
+            'acked': self.acked,
+            'retransmits': self.retransmits,
+            'naks': self.naks,
+            'last_ack': self.last_ack,
+            'failed': self.failed
+        }
+
+    def close(self):
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._reader.join(timeout=1.0)
+
+    def _write(self, data):
+        try:
+            with self._write_lock:
+                self.ser.write(data)
+                self.ser.flush()
+            return True
+        except (serial.SerialException, OSError) as e:
+            print(f'Failed to send packet: {e}')
+            self._fail()
+            return False
+
+    def _fail(self):
+        with self._cond:
+            self.failed = True
+            self._cond.notify_all()
+
+    def _reader_loop(self):
+        buffer = bytearray()
+        while not self._closed.is_set() and not self.failed:
+            try:
+                buffer += self.ser.read(max(1, self.ser.in_waiting))
+            except (serial.SerialException, OSError) as e:
+                print(f'Failed to read ACKs: {e}')
+                self._fail()
+                break
+            self._parse(buffer)
+            self._check_timeouts()
+
+    def _parse(self, buffer):
+        # Anything other than ACK/NAK (e.g. text the firmware printed) is skipped
+        while len(buffer) >= 2:
+            opcode = buffer[0]
+            if opcode == SEQ_FRAME:
+                self._on_ack(buffer[1])
+            elif opcode == SEQ_NAK:
+                self._on_nak(buffer[1])
+            else:
+                del buffer[0]
+                continue
+            del buffer[:2]
+
+    def _on_ack(self, seq):
+        now = time.monotonic()
+        with self._cond:
+            if seq not in self._in_flight:
+                return  # Duplicate ACK for a retransmission
+            # ACKs are cumulative: everything sent before seq arrived too
+            while self._in_flight:
+                acked_seq, packet = self._in_flight.popitem(last=False)
+                self.acked += 1
+                if acked_seq == seq:
+                    break
+            # Karn's rule: only packets sent once give an unambiguous RTT
+            if packet.attempts == 1:
+                self._record_rtt(now - packet.first_sent)
+            self.last_ack = time.time()
+            self._cond.notify_all()
+
+    def _on_nak(self, expected):
+        with self._cond:
+            self.naks += 1
+            # The firmware has everything before `expected`
+            while self._in_flight and next(iter(self._in_flight)) != expected:
+                self._in_flight.popitem(last=False)
+                self.acked += 1
+            self.last_ack = time.time()
+            self._cond.notify_all()
+        self._retransmit()
+
+    def _record_rtt(self, rtt):
+        self._rtt.append(rtt)
+        if self._srtt is None:
+            self._srtt = rtt
+            self._rttvar = rtt / 2
+        else:
+            self._rttvar = 0.75 * self._rttvar + 0.25 * abs(self._srtt - rtt)
+            self._srtt = 0.875 * self._srtt + 0.125 * rtt
+
+    def _check_timeouts(self):
+        with self._cond:
+            if not self._in_flight:
+                return
+            head = next(iter(self._in_flight.values()))
+            backoff = min(self.MAX_RTO, self.rto * (2 ** (head.attempts - 1)))
+            if time.monotonic() - head.last_sent < backoff:
+                return
+            if head.attempts > self.MAX_RETRIES:
+                print(f'Device on {self.port} stopped acknowledging frames')
+                self.failed = True
+                self._cond.notify_all()
+                return
+        self._retransmit()
+
+    def _retransmit(self):
+        '''Go-back-N: resends every packet in flight, oldest first'''
+        now = time.monotonic()
+        with self._cond:
+            packets = list(self._in_flight.values())
+            for packet in packets:
+                packet.last_sent = now
+                packet.attempts += 1
+            self.retransmits += len(packets)
+        if packets:
+            self._write(b''.join(packet.data for packet in packets))
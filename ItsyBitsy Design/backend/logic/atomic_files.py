@@ -0,0 +1,227 @@
+'''
+Atomic File Writes for the Drinky Board
+
+Every JSON file the backend saves (profiles, sequences, preferences) goes through
+this module, so a crash or power loss mid-write can never leave a half-written file:
+- Content is written to a temporary file in the target's directory and fsync'ed,
+  with the target's permissions (mkstemp would leave it 0600)
+- os.replace() swaps it in atomically (readers see the old or the new file, never a mix)
+- The directory is fsync'ed so the rename itself survives a crash
+
+Group commit:
+Writes are handed to a GroupCommitWriter. The first caller becomes the leader and
+flushes everything submitted so far in one pass (one fsync per file, one per
+directory); callers arriving during a flush wait and go into the next one together.
+The leader can also wait GROUP_COMMIT_WINDOW seconds for more writes to join. A later
+write to a path that is still pending replaces the earlier content, so rapid edits
+of the same file cost one write. Callers return once their data is durable.
+
+Inside `with transaction():` writes and deletes are collected and committed in a
+single flush at the end, e.g. an added profile together with the updated order.
+Callbacks registered with after_commit() run once the data is on disk (right away
+outside a transaction), which is how caches learn the new file stats. If the
+transaction raises instead, nothing is written and the rollback callbacks run.
+
+Usage:
+- write_json('data/profiles/x.json', data)
+- delete_file('data/profiles/x.json')
+- with transaction(): write_json(a, ...); write_json(b, ...)
+- after_commit(lambda: ...)
+'''
+
+from contextlib import contextmanager
+import json
+import os
+import tempfile
+import threading
+
+GROUP_COMMIT_WINDOW = 0.0  # Seconds a leader waits for more writes; flushes in progress already batch arrivals
+
+_DELETE = object()
+
+def _read_umask():
+    # os.umask can only be read by setting it; done once, before any writer threads exist
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# Mode for new files, as open(path, 'w') would create them
+NEW_FILE_MODE = 0o666 & ~_read_umask()
+
+def fsync_dir(directory):
+    '''Makes renames and deletes in a directory durable (no-op where directories cannot be opened)'''
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # e.g. Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _write_temp(path, content):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        # The replaced file keeps its permissions; a new one gets the usual ones
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = NEW_FILE_MODE
+        with os.fdopen(fd, 'w') as f:
+            if hasattr(os, 'fchmod'):
+                os.fchmod(f.fileno(), mode)
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def atomic_write(path, content):
+    '''Replaces `path` with `content` atomically and durably, without batching'''
+    os.replace(_write_temp(path, content), path)
+    fsync_dir(os.path.dirname(path) or '.')
+
+class GroupCommitWriter:
+    def __init__(self, window=GROUP_COMMIT_WINDOW):
+        self.window = window
+        self.flushes = 0  # Flushes performed (for benchmarks)
+        self._cond = threading.Condition()
+        self._pending = {}  # path -> content or _DELETE, for the batch being accumulated
+        self._batch_id = 0  # Id of the batch being accumulated
+        self._done_id = -1  # Highest batch id flushed
+        self._errors = {}   # batch id -> exception
+        self._flushing = False
+        self._local = threading.local()
+
+    def in_transaction(self):
+        return getattr(self._local, 'ops', None) is not None
+
+    def after_commit(self, callback, rollback=None):
+        '''Runs callback once the current transaction is on disk (immediately outside one),
+        or rollback if the transaction fails'''
+        if self.in_transaction():
+            self._local.callbacks.append((callback, rollback))
+        else:
+            callback()
+
+    @contextmanager
+    def transaction(self):
+        '''Collects writes on this thread and commits them in one flush on exit'''
+        if self.in_transaction():
+            yield  # Nested: the outermost transaction commits
+            return
+        self._local.ops = {}
+        self._local.callbacks = []
+        try:
+            yield
+            ops, callbacks = self._local.ops, self._local.callbacks
+            if ops:
+                self.commit(ops)
+        except BaseException:
+            for _, rollback in self._local.callbacks:
+                if rollback:
+                    rollback()
+            raise
+        finally:
+            self._local.ops = None
+            self._local.callbacks = None
+        for callback, _ in callbacks:
+            callback()
+
+    def write(self, path, content):
+        self._submit(path, content)
+
+    def delete(self, path):
+        self._submit(path, _DELETE)
+
+    def _submit(self, path, op):
+        ops = getattr(self._local, 'ops', None)
+        if ops is not None:
+            ops[path] = op
+        else:
+            self.commit({path: op})
+
+    def commit(self, ops):
+        '''Adds ops to the current batch and blocks until that batch is on disk'''
+        with self._cond:
+            self._pending.update(ops)
+            ticket = self._batch_id
+            while self._done_id < ticket:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                # Become the leader for the batch being accumulated
+                self._flushing = True
+                if self.window:
+                    self._cond.wait(self.window)
+                batch, self._pending = self._pending, {}
+                batch_id = self._batch_id
+                self._batch_id += 1
+                self._cond.release()
+                try:
+                    self._flush(batch)
+                    error = None
+                except Exception as e:
+                    error = e
+                finally:
+                    self._cond.acquire()
+                if error:
+                    self._errors[batch_id] = error
+                    # Waiters of older batches have long been woken
+                    for old_id in [i for i in self._errors if i < batch_id - 64]:
+                        del self._errors[old_id]
+                self._done_id = batch_id
+                self._flushing = False
+                self._cond.notify_all()
+            error = self._errors.get(ticket)
+        if error:
+            raise error
+
+    def _flush(self, batch):
+        replacements = []
+        try:
+            for path, op in batch.items():
+                if op is not _DELETE:
+                    replacements.append((_write_temp(path, op), path))
+        except BaseException:
+            for temp_path, _ in replacements:
+                os.remove(temp_path)
+            raise
+        directories = set()
+        for temp_path, path in replacements:
+            os.replace(temp_path, path)
+            directories.add(os.path.dirname(path) or '.')
+        for path, op in batch.items():
+            if op is _DELETE:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                directories.add(os.path.dirname(path) or '.')
+        for directory in directories:
+            fsync_dir(directory)
+        self.flushes += 1
+
+writer = GroupCommitWriter()
+
+def write_json(path, data):
+    '''Serializes now (so later changes to `data` are not saved) and writes through the group commit'''
+    writer.write(path, json.dumps(data, indent=2))
+
+def delete_file(path):
+    writer.delete(path)
+
+def transaction():
+    return writer.transaction()
+
+def in_transaction():
+    return writer.in_transaction()
+
+def after_commit(callback, rollback=None):
+    writer.after_commit(callback, rollback)
@@ -0,0 +1,137 @@
+'''
+Device Pool for the Drinky Board
+
+One backend can drive several boards. Every ItsyBitsy found is kept in the pool,
+keyed by its USB serial number (or its port when it reports none), so a board
+keeps its name when it is replugged into another port. Each device already has
+its own writer thread and queue (see itsybitsy_device.py), so boards never wait
+on each other and output scales with the number of boards.
+
+The first device connected is the primary one: requests that do not name a
+device go to it, as they did when only one board was supported. A request can
+name a device by key, or ALL to fan out to every board.
+
+Health is tracked per device: check_health() drops the devices that are
+unplugged or unresponsive, and summary() reports each device's state.
+
+Usage:
+- device_pool.add(device); device_pool.remove(key)
+- device_pool.primary() -> the default device, or None
+- for key, device in device_pool.targets(request_target): ...  # KeyError for an unknown key
+- dropped = device_pool.check_health(check_ports=True)  # [(device, unplugged), ...]
+'''
+
+import threading
+import time
+from logic.hotplug import port_present
+from logic.status_broadcaster import device_status
+
+ALL = 'all'  # Target every connected device
+
+class DevicePool:
+    '''Connected ItsyBitsy devices keyed by USB serial number (or port), in connection order'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices = {}  # key -> ItsyBitsyDevice
+        self._health = {}   # key -> {'connected_since', 'last_check', 'checks'}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._devices)
+
+    def keys(self):
+        with self._lock:
+            return list(self._devices)
+
+    def ports(self):
+        with self._lock:
+            return {device.port for device in self._devices.values()}
+
+    def get(self, key):
+        with self._lock:
+            return self._devices.get(key)
+
+    def primary(self):
+        with self._lock:
+            return next(iter(self._devices.values()), None)
+
+    def add(self, device):
+        '''Adds a device; returns the device it replaces under the same key (the caller closes it)'''
+        with self._lock:
+            previous = self._devices.pop(device.key, None)
+            self._devices[device.key] = device
+            self._health[device.key] = {'connected_since': time.time(), 'last_check': None, 'checks': 0}
+            return previous
+
+    def remove(self, key):
+        '''Removes a device without closing it; returns it (None if unknown)'''
+        with self._lock:
+            self._health.pop(key, None)
+            return self._devices.pop(key, None)
+
+    def targets(self, target=None):
+        '''(key, device) pairs for a request: None for the primary device, ALL, or a key'''
+        with self._lock:
+            if target is None:
+                return list(self._devices.items())[:1]
+            if target == ALL:
+                return list(self._devices.items())
+            if target not in self._devices:
+                raise KeyError(f'Unknown device: {target}')
+            return [(target, self._devices[target])]
+
+    def check_health(self, check_ports=False):
+        '''Removes and returns the devices that failed their health check as (device, unplugged);
+        check_ports also treats a device whose /dev node is gone as unplugged'''
+        dropped = []
+        for key in self.keys():
+            device = self.get(key)
+            if device is None:
+                continue
+            unplugged = check_ports and not port_present(device.port)
+            if unplugged or not device.is_connected():
+                self.remove(key)
+                dropped.append((device, unplugged))
+                continue
+            with self._lock:
+                health = self._health.get(key)
+                if health is not None:
+                    health['last_check'] = time.time()
+                    health['checks'] += 1
+        return dropped
+
+    def summary(self, details=False):
+        '''Each device's key, port and status; details adds health, heartbeat, queue depth and held keys'''
+        with self._lock:
+            items = list(self._devices.items())
+            health = {key: dict(value) for key, value in self._health.items()}
+        devices = []
+        for key, device in items:
+            entry = {'key': key, 'port': device.port, 'serial_number': device.serial_number, 'status': 'connected'}
+            if details:
+                entry.update(health.get(key, {}))
+                entry['last_heartbeat'] = device.last_heartbeat
+                entry['queue_depth'] = device.queue_depth
+                entry['link'] = device.link_stats()
+                entry['keys'] = device.key_state.snapshot()
+            devices.append(entry)
+        return devices
+
+    def close_all(self):
+        with self._lock:
+            devices = list(self._devices.values())
+            self._devices.clear()
+            self._health.clear()
+        for device in devices:
+            device.close()
+
+def pool_status(pool):
+    '''Status of the primary device (see device_status) plus the key, port and status of every device'''
+    primary = pool.primary()
+    # The pool only holds devices that passed their last health check
+    status = device_status(primary, connected=primary is not None)
+    status['devices'] = pool.summary()
+    return status
+
+device_pool = DevicePool()
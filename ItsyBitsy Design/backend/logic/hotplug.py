@@ -0,0 +1,240 @@
+'''
+USB Hotplug Watcher for the Drinky Board
+
+The drinky_manager thread blocks on a HotplugWatcher instead of waking up on a
+timer to enumerate serial ports. The watcher wakes it when serial devices come
+and go:
+- Linux: kernel uevents over a NETLINK_KOBJECT_UEVENT socket, filtered to the
+  tty subsystem ('add'/'remove' of ttyACM0 and friends)
+- macOS/BSD: kqueue on /dev, which changes whenever a device node appears or
+  disappears
+- Anywhere else (or if the above cannot be opened): PollingWatcher, which wakes
+  every poll_interval seconds like the old loop
+
+A plug-in is reported again FOLLOWUP_DELAYS after the event, because the port
+may not be openable yet when the kernel announces it (udev still setting its
+permissions); a successful connect simply ignores the repeats. wake() (used on
+shutdown) and inject() (used by playground/hotplug_harness.py to simulate
+events without hardware) go through a socket pair, so they interrupt a wait()
+(a socket rather than a pipe, since select() only takes sockets on Windows).
+
+Usage:
+- watcher = open_hotplug_watcher()
+- events = watcher.wait(timeout)  # [] on timeout; timeout=None blocks until an event
+- if watcher.event_driven: ... (False for PollingWatcher, which never reports events)
+- watcher.wake(); watcher.close()
+'''
+
+from collections import deque
+from dataclasses import dataclass
+import os
+import select
+import socket
+import sys
+import threading
+import time
+from typing import List, Optional
+
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+UEVENT_BUFFER_SIZE = 64 * 1024
+FOLLOWUP_DELAYS = (0.05, 0.25, 1.0)  # Seconds after a plug-in to report it again
+DEFAULT_POLL_INTERVAL = 2.0
+SERIAL_SUBSYSTEMS = frozenset({'tty'})
+
+@dataclass(frozen=True)
+class HotplugEvent:
+    action: str                 # 'add', 'remove' or 'change' (something changed, details unknown)
+    port: Optional[str] = None  # Device path (e.g. '/dev/ttyACM0') when known
+
+def parse_uevent(data: bytes) -> Optional[HotplugEvent]:
+    '''Parses a kernel uevent ('add@/devices/...\\0ACTION=add\\0SUBSYSTEM=tty\\0DEVNAME=ttyACM0...');
+    returns None for anything that is not a serial port being added or removed'''
+    fields = {}
+    for part in data.split(b'\0')[1:]:
+        key, sep, value = part.partition(b'=')
+        if sep:
+            fields[key.decode('ascii', 'replace')] = value.decode('utf-8', 'replace')
+    if fields.get('SUBSYSTEM') not in SERIAL_SUBSYSTEMS or fields.get('ACTION') not in ('add', 'remove'):
+        return None
+    devname = fields.get('DEVNAME')
+    if devname and not devname.startswith('/'):
+        devname = '/dev/' + devname
+    return HotplugEvent(fields['ACTION'], devname)
+
+def port_present(port: Optional[str]) -> bool:
+    '''False once a device node under /dev is gone (ports outside /dev count as present)'''
+    if not port or not port.startswith('/dev/'):
+        return True
+    return os.path.exists(port)
+
+class HotplugWatcher:
+    '''Base watcher: a socket pair for wake()/inject() plus the follow-up schedule'''
+
+    event_driven = True
+
+    def __init__(self):
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._lock = threading.Lock()
+        self._injected = deque()
+        self._followups = deque()  # (due, event), in due order
+
+    def fileno(self):
+        '''The descriptor that becomes readable on OS events (None if there is none)'''
+        return None
+
+    def _read_events(self) -> List[HotplugEvent]:
+        '''Reads the pending OS events once fileno() is readable'''
+        return []
+
+    def wake(self):
+        '''Makes a blocked wait() return (with no events)'''
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass  # Buffer full (a wake is already pending) or closed
+
+    def inject(self, event: HotplugEvent):
+        '''Delivers an event as if the OS had reported it'''
+        with self._lock:
+            self._injected.append(event)
+        self.wake()
+
+    def wait(self, timeout: Optional[float] = None) -> List[HotplugEvent]:
+        '''Blocks until events arrive or timeout seconds pass; returns the events'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            now = time.monotonic()
+            events = self._due_followups(now)
+            if events:
+                return events
+            remaining = None if deadline is None else max(0.0, deadline - now)
+            if self._followups:
+                until_followup = max(0.0, self._followups[0][0] - now)
+                remaining = until_followup if remaining is None else min(remaining, until_followup)
+
+            readers = [self._wake_r] + ([self.fileno()] if self.fileno() is not None else [])
+            ready, _, _ = select.select(readers, [], [], remaining)
+            if self._wake_r in ready:
+                self._drain_wake()
+            if self.fileno() is not None and self.fileno() in ready:
+                events.extend(self._read_events())
+            with self._lock:
+                events.extend(self._injected)
+                self._injected.clear()
+            if events or self._wake_r in ready:
+                self._schedule_followups(events)
+                return events
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+
+    def _drain_wake(self):
+        try:
+            while self._wake_r.recv(512):
+                pass
+        except OSError:
+            pass  # Drained (BlockingIOError) or closed
+
+    def _due_followups(self, now):
+        events = []
+        while self._followups and self._followups[0][0] <= now:
+            events.append(self._followups.popleft()[1])
+        return events
+
+    def _schedule_followups(self, events):
+        now = time.monotonic()
+        for event in events:
+            if event.action in ('add', 'change'):
+                self._followups.extend((now + delay, event) for delay in FOLLOWUP_DELAYS)
+        if len(self._followups) > 1:
+            self._followups = deque(sorted(self._followups, key=lambda pair: pair[0]))
+
+    def close(self):
+        self._wake_r.close()
+        self._wake_w.close()
+
+class NetlinkWatcher(HotplugWatcher):
+    '''Linux: kernel uevents for serial ports'''
+
+    def __init__(self, sock=None):
+        super().__init__()
+        # A socket can be passed in (e.g. one end of a socketpair) to feed raw uevents in tests
+        if sock is None:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            sock.bind((0, UEVENT_KERNEL_GROUP))
+        sock.setblocking(False)
+        self._sock = sock
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def _read_events(self):
+        events = []
+        while True:
+            try:
+                data = self._sock.recv(UEVENT_BUFFER_SIZE)
+            except (BlockingIOError, InterruptedError):
+                return events
+            except OSError as e:
+                # ENOBUFS: uevents were dropped; rescan as if something changed
+                print(f'Hotplug socket error: {e}')
+                return events + [HotplugEvent('change')]
+            event = parse_uevent(data)
+            if event is not None:
+                events.append(event)
+
+    def close(self):
+        self._sock.close()
+        super().close()
+
+class KqueueWatcher(HotplugWatcher):
+    '''macOS/BSD: /dev changes (device nodes appearing or disappearing)'''
+
+    def __init__(self, directory='/dev'):
+        super().__init__()
+        self._dir_fd = os.open(directory, os.O_RDONLY | getattr(os, 'O_EVTONLY', 0))
+        self._kqueue = select.kqueue()
+        self._kqueue.control([select.kevent(
+            self._dir_fd,
+            filter=select.KQ_FILTER_VNODE,
+            flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+            fflags=select.KQ_NOTE_WRITE
+        )], 0, 0)
+
+    def fileno(self):
+        return self._kqueue.fileno()
+
+    def _read_events(self):
+        if self._kqueue.control(None, 16, 0):
+            return [HotplugEvent('change')]
+        return []
+
+    def close(self):
+        self._kqueue.close()
+        os.close(self._dir_fd)
+        super().close()
+
+class PollingWatcher(HotplugWatcher):
+    '''Fallback: no OS events, the caller scans every poll_interval seconds'''
+
+    event_driven = False
+
+    def __init__(self, poll_interval=DEFAULT_POLL_INTERVAL):
+        super().__init__()
+        self.poll_interval = poll_interval
+
+    def wait(self, timeout=None):
+        return super().wait(self.poll_interval if timeout is None else min(timeout, self.poll_interval))
+
+def open_hotplug_watcher(poll_interval=DEFAULT_POLL_INTERVAL) -> HotplugWatcher:
+    '''Returns the best watcher this platform supports, falling back to polling'''
+    try:
+        if sys.platform.startswith('linux'):
+            return NetlinkWatcher()
+        if hasattr(select, 'kqueue'):
+            return KqueueWatcher()
+    except OSError as e:
+        print(f'Hotplug events unavailable ({e}), polling for devices every {poll_interval} s')
+    return PollingWatcher(poll_interval)
@@ -9,28 +9,96 @@ The ItsyBitsyDevice class handles:
 - Device discovery and connection management
 - Heartbeat monitoring to detect disconnections
 - Sending key press/release commands to the hardware
+- Owning a writer thread that drains a bounded queue of timestamped frames
 
 Key Features:
 - Automatic device discovery using USB VID/PID or port description
 - Connection health monitoring with heartbeat checks
 - Structured command protocol for key matrix control
 - Error handling for serial communication issues
+- Non-blocking enqueue API so HTTP handlers never wait on hardware timing
+- Key state tracking: redundant PRESS/RELEASE frames never reach the wire, and
+  no key is left held when the device closes or fails
 
 Usage:
-- Find devices: devices = ItsyBitsyDevice.find_devices()
+- Find devices: devices = ItsyBitsyDevice.find_devices(exclude=ports_already_open)
+- Name a board across reconnects: device.key (USB serial number, or the port)
 - Create connection: device = ItsyBitsyDevice(port)
 - Send commands: device.send_command(KEYS.A, 'PRESS')
+- Tap a key (press, hold, release): device.tap(KEYS.A)
+- Queue a timed run of frames: device.enqueue([(0.0, KEYS.A.press_frame), (0.02, KEYS.A.release_frame)])
+- Send a chord timed by the firmware: device.send_batch(ItsyBitsyDevice.chord_entries(KEYS.C, [KEYS.LEFT_CTRL]))
+- Frame for a key in the negotiated protocol: device.frame(KEYS.A, 'PRESS')
 - Check connection: if device.is_connected(): ...
+- Acknowledged delivery and RTT: device = ItsyBitsyDevice(port, ack_mode=True); device.link_stats()
+- Keys held right now: device.key_state.snapshot(); release them: device.release_all()
 - Cleanup: device.close()
 
 The device communicates using a binary protocol where each command contains
-I2C addresses, pin assignments, and action (press/release) information.
+I2C addresses, pin assignments, and action (press/release) information. The
+frames are precompiled on each KeyDefinition (see key_definitions.py).
+
+Batch frames (protocol extension, version 1):
+A batch frame carries up to MAX_BATCH_ENTRIES compact (switch address, action, delay_ms)
+entries that the firmware executes with its own timing, so a chord or a word ships in
+one USB transfer. Layout: [BATCH_MAGIC][BATCH_VERSION][count] + count x 4-byte entries
+[row_pin | action << 7][col_pin][delay_ms u16 big-endian]. Legacy frames start with the
+row I2C address (0x70), which is how the firmware tells the two apart.
+
+Compact key-index protocol:
+On connect the device queries the firmware's stored key table (TABLE_QUERY). If its
+version/count/CRC-32 differ from KEY_TABLE_CHECKSUM (see key_index.py), the packed
+table is uploaded once (TABLE_UPLOAD). From then on each key command is 2 bytes,
+(key_id, action), instead of 13. Firmware that does not answer the query keeps
+receiving legacy 13-byte frames.
+
+Writer thread:
+Every frame goes through a per-device queue drained by a single writer thread, so
+concurrent requests cannot interleave bytes on the wire. Each queued item is a list
+of (offset_seconds, frame) pairs. Offsets count from when the writer reaches the item
+(or from enqueue time, if it is idle), so holds are kept even behind a backlog. All
+frames that are due at the same moment are coalesced into one write.
+
+ACK mode (optional):
+With ack_mode=True the device resets the firmware's sequence counter (SEQ_RESET) and,
+if the firmware answers, every write goes through an AckLink (see ack_link.py):
+frames are sent as sequence-numbered packets, retransmitted until acknowledged, and
+the heartbeat becomes a ping whose ACK proves the firmware is actually responding.
+Without ACK mode the heartbeat only checks that the port is still open.
+
+Key state:
+Every write goes through a KeyState (see key_state.py) that drops frames which
+would not change a switch. On connect every key is released once, since a crashed
+session may have left switches closed; on close the keys still held are released,
+and after a failed write they are released with plain (unacknowledged) frames.
 '''
 
+from collections import deque
 import serial.tools.list_ports
 import serial
-import struct
+import threading
+import queue
 import time
+from logic.ack_link import SEQ_RESET, AckLink, pack_payloads
+from logic.key_state import KeyState
+from logic.keymaps.key_index import (
+    KEY_ITEMS, KEY_TABLE, KEY_TABLE_CHECKSUM, KEY_TABLE_VERSION,
+    COMPACT_PRESS_FRAMES, COMPACT_RELEASE_FRAMES
+)
+
+# Batch frame protocol (must match itsybitsy_controller.ino)
+BATCH_MAGIC = 0xB1
+BATCH_VERSION = 1
+MAX_BATCH_ENTRIES = 32
+MAX_BATCH_DELAY_MS = 0xFFFF
+
+# Compact key-index protocol (must match itsybitsy_controller.ino)
+TABLE_QUERY = 0xB2
+TABLE_UPLOAD = 0xB3
+
+# Policies for enqueue() when the command queue is full
+BLOCK = 'block'  # Wait for room (optionally up to a timeout)
+DROP = 'drop'    # Reject the frames immediately
 
 class ItsyBitsyDevice:
     # region Constants
@@ -39,10 +107,16 @@ class ItsyBitsyDevice:
     ]
     DEFAULT_BAUDRATE = 115200
     DEFAULT_TIMEOUT = 0.001
+    DEFAULT_QUEUE_SIZE = 256  # Queued items (each a list of timed frames)
+    DEFAULT_ENQUEUE_TIMEOUT = 1.0  # Seconds BLOCK waits for room, so a stalled board never hangs a request
+    DEFAULT_KEY_HOLD = 0.02   # Seconds between PRESS and RELEASE for tap()
+    HANDSHAKE_TIMEOUT = 0.5   # Seconds to wait for each key table reply
+    UPLOAD_TIMEOUT = 1.5      # The upload reply comes after the table is written to EEPROM (~0.7 s)
     #endregion
 
-    def __init__(self, port: str):
+    def __init__(self, port: str, ack_mode: bool = False, serial_number: str = None):
         self.port = port
+        self.serial_number = serial_number  # USB serial number, if the port reports one
         self.ser = serial.Serial(
             port,
             self.DEFAULT_BAUDRATE,
@@ -50,22 +124,51 @@ class ItsyBitsyDevice:
         )
         self.last_heartbeat = time.time()
         self.heartbeat_interval = 5.0  # Check every 5 seconds
+        self.failed = False  # Set by the writer thread when the port stops accepting writes
+        self.compact = self._sync_key_table()  # True once the firmware holds our key table
+
+        self._write_lock = threading.Lock()
+        self._send_lock = threading.Lock()  # Keeps key state updates in wire order
+        self.link = self._start_ack_link() if ack_mode else None  # AckLink, or None for fire-and-forget writes
+        # Switches left closed by an earlier session are unknown until released
+        self.key_state = KeyState(unknown=True)
+        self.release_all()
+        self._queue = queue.Queue(maxsize=self.DEFAULT_QUEUE_SIZE)
+        self._writer = threading.Thread(target=self._writer_loop, name=f'itsybitsy-writer-{port}', daemon=True)
+        self._writer.start()
 
     @classmethod
-    def find_devices(cls):
+    def find_devices(cls, ack_mode=False, exclude=()):
+        '''Connects to every ItsyBitsy found, except on the ports in `exclude` (already open)'''
         devices = []
         for port in serial.tools.list_ports.comports():
+            if port.device in exclude:
+                continue
             if 'itsybitsy' in port.description.lower() or (port.vid, port.pid) in cls.VID_PID:
                 try:
-                    devices.append(cls(port.device))
+                    devices.append(cls(port.device, ack_mode=ack_mode, serial_number=port.serial_number))
                 except Exception as e:
                     print(f'Failed to connect to {port.device}: {e}')
         return devices
+
+    @property
+    def key(self):
+        '''Stable name for this board: its USB serial number, or the port without one'''
+        return self.serial_number or self.port
     
     def is_connected(self):
         '''Check if device is actually connected and responsive'''
-        if not self.ser or not self.ser.is_open:
+        if self.failed or not self.ser or not self.ser.is_open:
             return False
+
+        # In ACK mode responsiveness comes from the firmware's own replies
+        if self.link:
+            if self.link.failed:
+                return False
+            if time.time() - self.link.last_ack > self.heartbeat_interval:
+                self.link.ping()
+            self.last_heartbeat = self.link.last_ack
+            return True
         
         # Check if it's time for a heartbeat
         current_time = time.time()
@@ -96,32 +199,247 @@ class ItsyBitsyDevice:
             print(f'Heartbeat failed: {e}')
             return False
     
-    def send_command(self, key, action):
-        if self.is_connected():
-            try:
-                command = struct.pack('>BBBBBBBBBBBBB',
-                    key.physical_mapping.row.i2c_addr,
-                    key.physical_mapping.row.logi_pin,
-                    key.physical_mapping.row.pin.axis.value,
-                    key.physical_mapping.row.pin.channel,
-                    key.physical_mapping.row.bus_pin.axis.value,
-                    key.physical_mapping.row.bus_pin.channel,
-                    key.physical_mapping.col.i2c_addr,
-                    key.physical_mapping.col.logi_pin,
-                    key.physical_mapping.col.pin.axis.value,
-                    key.physical_mapping.col.pin.channel,
-                    key.physical_mapping.col.bus_pin.axis.value,
-                    key.physical_mapping.col.bus_pin.channel,
-                    1 if action == 'PRESS' else 0
-                )
-                self.ser.write(command)
-                self.ser.flush()
-            except (serial.SerialException, OSError) as e:
-                print(f'Failed to send command: {e}')
+    def _sync_key_table(self):
+        '''Uploads the packed key table unless the firmware already has it; returns True if compact commands work'''
+        try:
+            self.ser.reset_input_buffer()
+            self.ser.write(bytes((TABLE_QUERY,)))
+            self.ser.flush()
+            info = self._read_reply(TABLE_QUERY, 6)
+            if info is None:
+                print(f'Device on {self.port} did not answer the key table query, using 13-byte frames')
                 return False
+            if (info[0], info[1], int.from_bytes(info[2:6], 'big')) == (KEY_TABLE_VERSION, len(KEY_ITEMS), KEY_TABLE_CHECKSUM):
+                return True
+
+            upload = bytes((TABLE_UPLOAD, KEY_TABLE_VERSION, len(KEY_ITEMS))) + KEY_TABLE + KEY_TABLE_CHECKSUM.to_bytes(4, 'big')
+            self.ser.write(upload)
+            self.ser.flush()
+            status = self._read_reply(TABLE_UPLOAD, 1, self.UPLOAD_TIMEOUT)
+            if status is None or status[0] != 1:
+                print(f'Key table upload to {self.port} failed, using 13-byte frames')
+                return False
+            print(f'Uploaded key table ({len(KEY_ITEMS)} keys) to {self.port}')
+            return True
+        except (serial.SerialException, OSError) as e:
+            print(f'Key table handshake failed: {e}')
+            return False
+
+    def _start_ack_link(self):
+        '''Restarts the firmware's sequence counter; returns an AckLink, or None if the firmware lacks ACK mode'''
+        try:
+            self.ser.write(bytes((SEQ_RESET,)))
+            self.ser.flush()
+            status = self._read_reply(SEQ_RESET, 1)
+        except (serial.SerialException, OSError) as e:
+            print(f'ACK mode handshake failed: {e}')
+            return None
+        if status is None or status[0] != 1:
+            print(f'Device on {self.port} does not support ACK mode, sending unacknowledged frames')
+            return None
+        return AckLink(self.ser, self._write_lock, self.port)
+
+    def link_stats(self):
+        '''Delivery and round-trip statistics (ACK mode only; None otherwise)'''
+        return self.link.stats() if self.link else None
+
+    def _read_reply(self, opcode, length, timeout=HANDSHAKE_TIMEOUT):
+        '''Reads until `opcode` followed by `length` bytes arrives, skipping any text the firmware printed'''
+        deadline = time.monotonic() + timeout
+        buffer = bytearray()
+        while time.monotonic() < deadline:
+            buffer += self.ser.read(max(1, self.ser.in_waiting))
+            start = buffer.find(opcode)
+            if start != -1 and len(buffer) - start > length:
+                return bytes(buffer[start + 1:start + 1 + length])
+        return None
+
+    def frame(self, key, action):
+        '''Returns the frame for a key in the protocol negotiated on connect'''
+        if self.compact:
+            return (COMPACT_PRESS_FRAMES if action == 'PRESS' else COMPACT_RELEASE_FRAMES)[key]
+        return key.press_frame if action == 'PRESS' else key.release_frame
+
+    def send_command(self, key, action):
+        '''Queues a single PRESS or RELEASE frame; returns False if the device is gone or the queue is full'''
+        if not self.is_connected():
+            return False
+        return self.enqueue([(0.0, self.frame(key, action))])
+
+    def tap(self, key, hold=None, policy=BLOCK, timeout=DEFAULT_ENQUEUE_TIMEOUT):
+        '''Queues PRESS, then RELEASE after `hold` seconds, as one uninterruptible item'''
+        if not self.is_connected():
+            return False
+        hold = self.DEFAULT_KEY_HOLD if hold is None else hold
+        return self.enqueue([(0.0, self.frame(key, 'PRESS')), (hold, self.frame(key, 'RELEASE'))], policy, timeout)
+
+    def enqueue(self, frames, policy=BLOCK, timeout=DEFAULT_ENQUEUE_TIMEOUT):
+        '''Queues (offset_seconds, frame) pairs as one item for the writer thread.
+
+        Returns False if the queue is full (immediately for DROP, after `timeout` for BLOCK;
+        timeout=None waits for as long as it takes).'''
+        if self.failed:
+            return False
+        item = (time.monotonic(), list(frames))
+        try:
+            self._queue.put(item, block=(policy == BLOCK), timeout=timeout)
+        except queue.Full:
+            print(f'Command queue full on {self.port}, dropped {len(item[1])} frame(s)')
+            return False
         return True
 
+    @staticmethod
+    def encode_batch(entries):
+        '''Encodes up to MAX_BATCH_ENTRIES (key, action, delay_ms) entries as one batch frame.
+
+        Each entry waits delay_ms (after the previous entry) before it executes.'''
+        entries = list(entries)
+        if not 1 <= len(entries) <= MAX_BATCH_ENTRIES:
+            raise ValueError(f'A batch holds 1 to {MAX_BATCH_ENTRIES} entries, got {len(entries)}')
+        frame = bytearray((BATCH_MAGIC, BATCH_VERSION, len(entries)))
+        for key, action, delay_ms in entries:
+            delay_ms = int(round(delay_ms))
+            if not 0 <= delay_ms <= MAX_BATCH_DELAY_MS:
+                raise ValueError(f'Batch delay out of range: {delay_ms} ms')
+            row, col = key.switch_address
+            frame.append(row | 0x80 if action == 'PRESS' else row)
+            frame.append(col)
+            frame += delay_ms.to_bytes(2, 'big')
+        return bytes(frame)
+
+    @staticmethod
+    def chord_entries(key, modifiers=(), hold_ms=DEFAULT_KEY_HOLD * 1000):
+        '''Batch entries for pressing modifiers, tapping key for hold_ms, then releasing modifiers'''
+        entries = [(modifier, 'PRESS', 0) for modifier in modifiers]
+        entries.append((key, 'PRESS', 0))
+        entries.append((key, 'RELEASE', hold_ms))
+        entries.extend((modifier, 'RELEASE', 0) for modifier in reversed(modifiers))
+        return entries
+
+    def send_batch(self, entries, policy=BLOCK, timeout=DEFAULT_ENQUEUE_TIMEOUT):
+        '''Queues (key, action, delay_ms) entries as batch frames, split every MAX_BATCH_ENTRIES'''
+        if not self.is_connected():
+            return False
+        entries = list(entries)
+        frames = [
+            (0.0, self.encode_batch(entries[i:i + MAX_BATCH_ENTRIES]))
+            for i in range(0, len(entries), MAX_BATCH_ENTRIES)
+        ]
+        return self.enqueue(frames, policy, timeout)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def write_frames(self, frames):
+        '''Writes a list of frames to the port under the write lock (as acknowledged packets in ACK mode),
+        skipping those that would not change a switch'''
+        with self._send_lock:
+            frames = self.key_state.filter(frames)
+            if not frames:
+                return True
+            if self._write(frames):
+                return True
+            self.failed = True
+            self._release_unacknowledged()
+            return False
+
+    def _write(self, frames):
+        if self.link:
+            return self.link.send(pack_payloads(frames))
+        try:
+            with self._write_lock:
+                self.ser.write(b''.join(frames))
+                self.ser.flush()
+            return True
+        except (serial.SerialException, OSError) as e:
+            print(f'Failed to send command: {e}')
+            return False
+
+    def _release_unacknowledged(self):
+        '''After a failed write: best-effort plain RELEASE frames for every held key (the firmware
+        takes them in ACK mode too), so a broken link does not leave keys down'''
+        frames = [self.frame(key, 'RELEASE') for key in self.key_state.held()]
+        self.key_state.clear()
+        if not frames or not self.ser or not self.ser.is_open:
+            return
+        try:
+            with self._write_lock:
+                self.ser.write(b''.join(frames))
+                self.ser.flush()
+        except (serial.SerialException, OSError):
+            pass  # Unplugged: the board lost power and its switches opened anyway
+
+    def release_all(self):
+        '''Releases every key this device may hold; returns False if the release could not be written'''
+        with self._send_lock:
+            held = self.key_state.held()
+            if not held:
+                return True
+            if self._write([self.frame(key, 'RELEASE') for key in held]):
+                self.key_state.clear()
+                return True
+            self.failed = True
+            self._release_unacknowledged()
+            return False
+
+    def _writer_loop(self):
+        '''Drains the command queue, sleeping until each frame is due and coalescing due frames'''
+        pending = deque()
+        stopping = False
+        while not (stopping and not pending):
+            if not pending:
+                item = self._queue.get()
+                if item is None:
+                    break
+                self._schedule(pending, item, time.monotonic())
+
+            # Nothing reaches the wire after a failed write; drain without waiting
+            if self.failed:
+                pending.clear()
+                continue
+
+            delay = pending[0][0] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            # Gather everything due now, pulling further items only once this one is exhausted
+            now = time.monotonic()
+            buffer = []
+            while pending and pending[0][0] <= now:
+                buffer.append(pending.popleft()[1])
+                if not pending and not stopping:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                    else:
+                        self._schedule(pending, item, now)
+
+            self.write_frames(buffer)
+
+    @staticmethod
+    def _schedule(pending, item, now):
+        enqueued_at, frames = item
+        start = max(enqueued_at, now)
+        pending.extend((start + offset, frame) for offset, frame in frames)
+
     def close(self):
+        # Let the writer flush what is already queued before the port goes away
+        if self._writer.is_alive():
+            try:
+                self._queue.put(None, timeout=1.0)
+            except queue.Full:
+                self.failed = True
+                self._queue.put(None)
+            self._writer.join(timeout=2.0)
+        # Anything a scheduler or Direct Input still holds comes up before the port closes
+        self.release_all()
+        if self.link:
+            self.link.wait_idle(timeout=0.5)
+            self.link.close()
         if self.ser and self.ser.is_open:
             print(f'Closing device on port {self.port}')
-            self.ser.close()
\ No newline at end of file
+            self.ser.close()
@@ -0,0 +1,220 @@
+'''
+Key Event Scheduler for the Drinky Board
+
+This module dispatches timed key events to an ItsyBitsyDevice at absolute
+time.monotonic() deadlines instead of chaining sleep() calls, so Python overhead
+and serial writes never accumulate into drift over a long run.
+
+Each run takes an iterable of (offset_seconds, key, action) events, offsets
+measured from the start of the run and non-decreasing. Waiting is hybrid: the
+scheduler sleeps until SPIN_THRESHOLD before a deadline and busy-waits the rest.
+Events that share a deadline (or are already late) are written as one buffer.
+
+Every run records jitter (actual write time minus deadline) in JitterStats.
+A run ends at the first write the device rejects, with `failed` set.
+
+Pausing releases every key the run holds. Modifiers held across a run of taps
+(shift over "HELLO") are pressed again on resume, so the rest of the run keeps them.
+
+Usage:
+- Blocking run: stats = KeyScheduler(device).run([(0.0, KEYS.A, 'PRESS'), (0.02, KEYS.A, 'RELEASE')])
+- Background run: scheduler.start(events); scheduler.pause(); scheduler.resume(); scheduler.stop()
+'''
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+import threading
+import time
+from logic.keymaps.key_definitions import KEYS
+
+JITTER_SAMPLE_WINDOW = 4096  # Most recent jitter samples kept for percentiles
+# Keys held across several taps, which a resume must press again
+MODIFIER_KEYS = frozenset({KEYS.LEFT_CTRL, KEYS.LEFT_SHIFT, KEYS.LEFT_ALT, KEYS.LEFT_WINDOWS})
+
+@dataclass(frozen=True)
+class JitterStats:
+    count: int = 0
+    mean_ms: float = 0.0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.mean_ms, 3),
+            'p50_ms': round(self.p50_ms, 3),
+            'p95_ms': round(self.p95_ms, 3),
+            'max_ms': round(self.max_ms, 3)
+        }
+
+class _JitterRecorder:
+    '''Running jitter totals plus a bounded window of samples for percentiles'''
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=JITTER_SAMPLE_WINDOW)
+
+    def record(self, jitter):
+        self.count += 1
+        self.total += jitter
+        if jitter > self.max:
+            self.max = jitter
+        self.samples.append(jitter)
+
+    def stats(self) -> JitterStats:
+        if not self.count:
+            return JitterStats()
+        ordered = sorted(self.samples)
+        return JitterStats(
+            count=self.count,
+            mean_ms=self.total / self.count * 1000,
+            p50_ms=ordered[len(ordered) // 2] * 1000,
+            p95_ms=ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+            max_ms=self.max * 1000
+        )
+
+class KeyScheduler:
+    SPIN_THRESHOLD = 0.002  # Seconds before a deadline to stop sleeping and spin
+
+    def __init__(self, device, spin_threshold: Optional[float] = None):
+        self.device = device
+        self.spin_threshold = self.SPIN_THRESHOLD if spin_threshold is None else spin_threshold
+        self.dispatched = 0  # Events written in the current/last run
+        self.failed = False  # Set when the device rejected a write and the run ended early
+        self.last_stats = JitterStats()
+        self._held = set()  # Keys pressed by this run and not yet released
+        self._stop = threading.Event()
+        self._running = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._wake = threading.Event()  # Interrupts the sleep phase on stop/pause
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    def start(self, events: Iterable[Tuple[float, object, str]]):
+        '''Runs the events on a background thread; returns the thread'''
+        # Cleared here, not on the thread, so a stop() right after start() is not lost
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, args=(events,), name='key-scheduler', daemon=True)
+        self._running.set()
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._resume.set()
+        self._wake.set()
+
+    def pause(self):
+        self._resume.clear()
+        self._wake.set()
+
+    def resume(self):
+        self._resume.set()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run(self, events: Iterable[Tuple[float, object, str]]) -> JitterStats:
+        '''Dispatches events at their deadlines; blocks until finished, stopped or the device fails.
+
+        A stop() issued before the run begins (e.g. while its thread starts) ends it at once.'''
+        self._running.set()
+        self.dispatched = 0
+        self.failed = False
+        recorder = _JitterRecorder()
+        start = time.monotonic()
+        batch = []
+        batch_deadline = None
+        try:
+            for offset, key, action in events:
+                deadline = start + offset
+                # Same deadline (or late already): accumulate into one write
+                if batch and deadline <= max(batch_deadline, time.monotonic()):
+                    batch.append((key, action))
+                    continue
+                if batch:
+                    jitter = self._write(batch, batch_deadline)
+                    if jitter is None:
+                        batch = []
+                        break
+                    recorder.record(jitter)
+                shift = self._wait_until(deadline)
+                if shift is None:
+                    batch = []
+                    break
+                start += shift
+                batch = [(key, action)]
+                batch_deadline = deadline + shift
+            if batch and not self._stop.is_set():
+                jitter = self._write(batch, batch_deadline)
+                if jitter is not None:
+                    recorder.record(jitter)
+        finally:
+            self.release_held()
+            self.last_stats = recorder.stats()
+            # The stop belonged to this run; the next one starts fresh
+            self._stop.clear()
+            self._running.clear()
+        return self.last_stats
+
+    def release_held(self):
+        '''Releases every key this scheduler pressed and has not released yet'''
+        if self._held:
+            self.device.write_frames([self.device.frame(key, 'RELEASE') for key in self._held])
+            self._held.clear()
+
+    def _write(self, batch, deadline):
+        frame = self.device.frame
+        frames = []
+        for key, action in batch:
+            if action == 'PRESS':
+                self._held.add(key)
+            else:
+                self._held.discard(key)
+            frames.append(frame(key, action))
+        if not self.device.write_frames(frames):
+            # Nothing after this reaches the board; don't keep timing frames that are never sent
+            self.failed = True
+            return None
+        self.dispatched += len(batch)
+        return max(0.0, time.monotonic() - deadline)
+
+    def _wait_until(self, deadline) -> Optional[float]:
+        '''Waits for a deadline; returns the time spent paused, or None if stopped'''
+        paused_for = 0.0
+        while True:
+            if self._stop.is_set():
+                return None
+            if not self._resume.is_set():
+                # Don't leave keys closed while paused; later RELEASE events are harmless
+                modifiers = self._held & MODIFIER_KEYS
+                self.release_held()
+                paused_at = time.monotonic()
+                self._resume.wait()
+                paused_for += time.monotonic() - paused_at
+                # A held modifier still applies to the taps after the pause
+                if modifiers and not self._stop.is_set():
+                    self._held |= modifiers
+                    self.device.write_frames([self.device.frame(key, 'PRESS') for key in modifiers])
+                continue
+            remaining = deadline + paused_for - time.monotonic()
+            if remaining <= 0:
+                return paused_for
+            if remaining > self.spin_threshold:
+                self._wake.clear()
+                if self._stop.is_set() or not self._resume.is_set():
+                    continue
+                self._wake.wait(remaining - self.spin_threshold)
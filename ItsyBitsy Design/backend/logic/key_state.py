@@ -0,0 +1,112 @@
+'''
+Key State Model for the Drinky Board
+
+The board closes and opens matrix switches; pressing a closed switch or
+releasing an open one changes nothing on the hardware. KeyState records which
+switches the host has closed on one device, as frames are written (see
+ItsyBitsyDevice.write_frames), and drops those redundant frames before they go
+on the wire: an auto-repeating Shift keydown, a modifier pressed again by a
+sequence while Direct Input holds it, a release for a key that is already up.
+
+Compact, legacy and batch frames are all understood. Batch entries only update
+the state (the firmware times them), and frames that are not key commands pass
+through untouched.
+
+Because the state is known, the device can also release everything it holds
+when it closes or a write fails, and clear whatever a crashed session left
+closed when it connects (a new KeyState starts with every switch unknown).
+
+Usage:
+- state = KeyState(unknown=True)
+- frames = state.filter(frames)  # what still needs writing; the state now assumes it was written
+- state.held() -> keys that may be closed; state.clear() once they are released
+- state.snapshot() -> {'down': ['LEFT_SHIFT'], 'unknown': False, 'suppressed': 12}
+'''
+
+import threading
+import time
+from logic.keymaps.key_index import KEY_ITEMS, COMPACT_PRESS_FRAMES, COMPACT_RELEASE_FRAMES
+
+# Batch frame header (see itsybitsy_device.py)
+BATCH_MAGIC = 0xB1
+BATCH_HEADER_SIZE = 3
+BATCH_ENTRY_SIZE = 4
+
+KEY_NAMES = {key: name for name, key in KEY_ITEMS}
+
+# Frame -> (key, pressed) for every single-key frame in either protocol
+FRAME_ACTIONS = {}
+for _, _key in KEY_ITEMS:
+    FRAME_ACTIONS[_key.press_frame] = (_key, True)
+    FRAME_ACTIONS[_key.release_frame] = (_key, False)
+    FRAME_ACTIONS[COMPACT_PRESS_FRAMES[_key]] = (_key, True)
+    FRAME_ACTIONS[COMPACT_RELEASE_FRAMES[_key]] = (_key, False)
+
+# Packed (row_pin, col_pin) switch address -> key, for batch entries
+SWITCH_KEYS = {key.switch_address: key for _, key in KEY_ITEMS}
+
+class KeyState:
+    '''Matrix switches closed on one device, as written by the host'''
+
+    def __init__(self, unknown=False):
+        self._lock = threading.Lock()
+        self._down = {}  # key -> time.time() it was pressed
+        # Until everything has been released once, any switch may be closed
+        self._unknown = unknown
+        self.suppressed = 0  # Redundant frames dropped so far
+
+    def filter(self, frames):
+        '''Returns the frames that change a switch (plus any that are not key commands)'''
+        written = []
+        with self._lock:
+            for frame in frames:
+                action = FRAME_ACTIONS.get(frame)
+                if action is None:
+                    if frame[:1] == bytes((BATCH_MAGIC,)):
+                        self._apply_batch(frame)
+                    written.append(frame)
+                    continue
+                key, pressed = action
+                if pressed:
+                    if key in self._down:
+                        self.suppressed += 1
+                        continue
+                    self._down[key] = time.time()
+                elif key in self._down:
+                    del self._down[key]
+                elif not self._unknown:
+                    self.suppressed += 1
+                    continue
+                written.append(frame)
+        return written
+
+    def _apply_batch(self, frame):
+        for i in range(BATCH_HEADER_SIZE, len(frame) - BATCH_ENTRY_SIZE + 1, BATCH_ENTRY_SIZE):
+            key = SWITCH_KEYS.get(bytes((frame[i] & 0x7F, frame[i + 1])))
+            if key is None:
+                continue
+            if frame[i] & 0x80:
+                self._down.setdefault(key, time.time())
+            else:
+                self._down.pop(key, None)
+
+    def held(self):
+        '''Keys that may be closed: every key while the state is unknown'''
+        with self._lock:
+            if self._unknown:
+                return [key for _, key in KEY_ITEMS]
+            return list(self._down)
+
+    def clear(self):
+        '''Records that every switch is open'''
+        with self._lock:
+            self._down.clear()
+            self._unknown = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'down': [KEY_NAMES[key] for key in self._down],
+                'unknown': self._unknown,
+                'suppressed': self.suppressed
+            }
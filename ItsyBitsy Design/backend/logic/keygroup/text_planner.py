@@ -0,0 +1,85 @@
+'''
+Text Planner for the Drinky Board
+
+This module turns arbitrary text into the key taps that type it on the board.
+The character -> (key id, needs shift) relationships that the translators only
+imply (e.g. '!' is NUM_1 with shift held) are precomputed once at import into
+str.translate tables over KEYS, so planning a string is two C-level passes over
+it rather than a dict lookup per character.
+
+A plan keeps shift held across a run of uppercase letters or shifted symbols
+instead of pressing and releasing it around every character: 'HELLO' is one
+shift press, five taps and one shift release. Characters with no key on the
+board are left out of the plan and reported with their positions.
+
+Usage:
+- plan = plan_text('Hello, World!')
+- plan.key_ids, plan.shifted -> array('B') per typed character (key id, 0/1)
+- plan.untypeable -> [(index, char), ...]; plan.shift_presses, plan.event_count
+- for key, action in plan.events(): ...  # action is 'PRESS' or 'RELEASE'
+'''
+
+from array import array
+from typing import Dict, List, Tuple
+from ..keymaps.key_definitions import KEYS
+from ..keymaps.key_index import KEY_IDS, KEYS_BY_ID
+from .translators import CHARACTER_KEY_NAMES, SHIFTED_CHARACTERS
+
+# Character -> (key id, needs shift) for every character typeable on the board
+TEXT_TAPS: Dict[str, Tuple[int, bool]] = {
+    char: (KEY_IDS[getattr(KEYS, name)], char in SHIFTED_CHARACTERS)
+    for char, name in CHARACTER_KEY_NAMES.items()
+}
+
+class _TranslationTable(dict):
+    '''A str.translate table that drops the characters it does not list'''
+
+    def __missing__(self, ordinal):
+        return None
+
+# Code point -> key id, and code point -> 1 if shift is held for it (both drop untypeable characters)
+KEY_ID_TABLE = _TranslationTable({ord(char): key_id for char, (key_id, _) in TEXT_TAPS.items()})
+SHIFT_TABLE = _TranslationTable({ord(char): int(shifted) for char, (_, shifted) in TEXT_TAPS.items()})
+
+class TextPlan:
+    '''The taps that type a string, with shift held across runs of shifted characters'''
+
+    def __init__(self, key_ids: array, shifted: array, untypeable: List[Tuple[int, str]]):
+        self.key_ids = key_ids        # Key id per typed character
+        self.shifted = shifted        # 1 where shift is held for the character
+        self.untypeable = untypeable  # (index in the text, character) with no key on the board
+
+    def __len__(self):
+        return len(self.key_ids)
+
+    @property
+    def shift_presses(self):
+        '''Times shift goes down: once per run of shifted characters'''
+        return (b'\x00' + self.shifted.tobytes()).count(b'\x00\x01')
+
+    @property
+    def event_count(self):
+        return 2 * (len(self.key_ids) + self.shift_presses)
+
+    def events(self):
+        '''Yields (KeyDefinition, 'PRESS' | 'RELEASE') in typing order'''
+        shift = KEYS.LEFT_SHIFT
+        held = 0
+        for key_id, shifted in zip(self.key_ids, self.shifted):
+            if shifted != held:
+                yield shift, 'PRESS' if shifted else 'RELEASE'
+                held = shifted
+            key = KEYS_BY_ID[key_id]
+            yield key, 'PRESS'
+            yield key, 'RELEASE'
+        if held:
+            yield shift, 'RELEASE'
+
+def plan_text(text: str) -> TextPlan:
+    '''Plans the taps that type text; characters with no key are skipped and reported'''
+    key_ids = array('B', text.translate(KEY_ID_TABLE).encode('latin-1'))
+    shifted = array('B', text.translate(SHIFT_TABLE).encode('latin-1'))
+    untypeable = []
+    if len(key_ids) != len(text):
+        untypeable = [(i, char) for i, char in enumerate(text) if char not in TEXT_TAPS]
+    return TextPlan(key_ids, shifted, untypeable)
@@ -0,0 +1,132 @@
+'''
+Key Translators for the Drinky Board
+
+This module turns environment-specific key events (pynput keys in the 'bash'
+environment, plain characters from text, ...) into KeyDefinitions from KEYS.
+
+Each environment registers a KeyTranslator built from two tables:
+- special_keys: event objects (e.g. pynput keyboard.Key members) -> key name
+- characters: single characters -> key name
+
+Both tables are resolved against KEYS once, when the translator is built, so a
+translation is at most two dict lookups regardless of which key was pressed.
+Unknown key names raise a ValueError at registration instead of at keystroke time.
+
+Usage:
+- Register an environment: register_translator('evdev', KeyTranslator(special_keys={...}))
+- Translate an event: translate(key, 'bash') -> KeyDefinition or None
+- Translate to a name: translate_name(key, 'bash') -> 'LEFT_SHIFT' or None
+'''
+
+from typing import Callable, Dict, Hashable, Mapping, Optional, Tuple
+from ..keymaps.key_definitions import KEYS, KeyDefinition
+
+# Key name -> (unshifted character, shifted character) for the printable US layout keys
+CHARACTER_PAIRS = {
+    'NUM_1': ('1', '!'),
+    'NUM_2': ('2', '@'),
+    'NUM_3': ('3', '#'),
+    'NUM_4': ('4', '$'),
+    'NUM_5': ('5', '%'),
+    'NUM_6': ('6', '^'),
+    'NUM_7': ('7', '&'),
+    'NUM_8': ('8', '*'),
+    'NUM_9': ('9', '('),
+    'NUM_0': ('0', ')'),
+    'MINUS': ('-', '_'),
+    'EQUALS': ('=', '+'),
+    'PERIOD': ('.', '>'),
+    'COMMA': (',', '<'),
+    'FORWARD_SLASH': ('/', '?'),
+    'SEMICOLON': (';', ':'),
+    'APOSTROPHE': ("'", '"'),
+    'OPENING_BRACKET': ('[', '{'),
+    'CLOSING_BRACKET': (']', '}'),
+    'BACKSLASH': ('\\', '|'),
+    'BACKTICK': ('`', '~'),
+}
+for _letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+    CHARACTER_PAIRS[_letter] = (_letter.lower(), _letter)
+
+# Characters typed without a shifted counterpart
+WHITESPACE_KEY_NAMES = {
+    ' ': 'SPACE',
+    '\n': 'ENTER',
+    '\t': 'TAB',
+}
+
+# Character -> key name, and the characters that need shift held
+CHARACTER_KEY_NAMES: Dict[str, str] = dict(WHITESPACE_KEY_NAMES)
+SHIFTED_CHARACTERS = frozenset(shifted for _, shifted in CHARACTER_PAIRS.values())
+for _name, (_plain, _shifted) in CHARACTER_PAIRS.items():
+    CHARACTER_KEY_NAMES[_plain] = _name
+    CHARACTER_KEY_NAMES[_shifted] = _name
+
+def _resolve(name: str) -> Tuple[str, KeyDefinition]:
+    key = getattr(KEYS, name, None)
+    if not isinstance(key, KeyDefinition):
+        raise ValueError(f'Unknown key name: {name}')
+    return (name, key)
+
+class KeyTranslator:
+    '''Resolves one environment's key events to KeyDefinitions through prebuilt dicts'''
+
+    def __init__(self,
+                 special_keys: Optional[Mapping[Hashable, str]] = None,
+                 characters: Optional[Mapping[str, str]] = None,
+                 fallback: Optional[Callable[[object], Optional[str]]] = None):
+        self._special = {key: _resolve(name) for key, name in (special_keys or {}).items()}
+        self._characters = {char: _resolve(name) for char, name in (characters or {}).items()}
+        # Optional last resort for events neither table covers; returns a key name or None
+        self._fallback = fallback
+
+    def lookup(self, key) -> Optional[Tuple[str, KeyDefinition]]:
+        '''Returns (key name, KeyDefinition) for an event, or None if it has no mapping'''
+        try:
+            match = self._special.get(key)
+        except TypeError:
+            match = None
+        if match is not None:
+            return match
+
+        char = key if type(key) is str and len(key) == 1 else getattr(key, 'char', None)
+        if char is not None:
+            match = self._characters.get(char)
+            if match is not None:
+                return match
+
+        if self._fallback is not None:
+            name = self._fallback(key)
+            key_def = getattr(KEYS, name, None) if name else None
+            if isinstance(key_def, KeyDefinition):
+                return (name, key_def)
+        return None
+
+    def translate(self, key) -> Optional[KeyDefinition]:
+        match = self.lookup(key)
+        return match[1] if match else None
+
+    def translate_name(self, key) -> Optional[str]:
+        match = self.lookup(key)
+        return match[0] if match else None
+
+_TRANSLATORS: Dict[str, KeyTranslator] = {}
+
+def register_translator(env: str, translator: KeyTranslator):
+    '''Registers (or replaces) the translator used for an environment'''
+    _TRANSLATORS[env] = translator
+
+def get_translator(env: str) -> KeyTranslator:
+    translator = _TRANSLATORS.get(env)
+    if translator is None:
+        raise ValueError(f'No key translator registered for environment: {env}')
+    return translator
+
+def translate(key, env: str) -> Optional[KeyDefinition]:
+    return get_translator(env).translate(key)
+
+def translate_name(key, env: str) -> Optional[str]:
+    return get_translator(env).translate_name(key)
+
+# Plain text: every printable character on the board, no special keys
+register_translator('text', KeyTranslator(characters=CHARACTER_KEY_NAMES))
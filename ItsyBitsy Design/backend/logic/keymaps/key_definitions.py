@@ -16,18 +16,24 @@ Usage:
 - Access individual keys: KEYS.A, KEYS.SPACE, KEYS.LEFT_CTRL, etc.
 - Use for hardware control: itsy_device.send_command(KEYS.A, 'PRESS')
 - Use for client mapping: Check key.string_aliases.web_client for JavaScript key codes
+- Serial frames: KEYS.A.press_frame / KEYS.A.release_frame are packed once when KEYS is built
+- Batch frames: KEYS.A.switch_address is the 2-byte packed (row, col) pin pair used in batch entries
 
 This is the central source of truth for all key mappings in the Drinky Board system.
 '''
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Set
+import struct
 from .adg2128_axis import Axis
 from .adg2128_pin import ADG2128Pin, get_bus_pin
 
 ROW_I2C_ADDR = 0x70
 COL_I2C_ADDR = 0x71
 
+# Layout of the 13-byte KeyCommand struct read by the ItsyBitsy firmware
+FRAME_FORMAT = '>BBBBBBBBBBBBB'
+
 @dataclass(frozen=True)
 class Pin:
     i2c_addr: int
@@ -45,14 +51,49 @@ class PhysicalMapping:
     row: Pin
     col: Pin
 
+def pack_pin(pin: ADG2128Pin) -> int:
+    '''Packs an ADG2128 pin as (axis << 4) | channel; bus pins are derived from the axis by the firmware'''
+    return (pin.axis.value << 4) | pin.channel
+
 @dataclass(frozen=True)
 class StringAliases:
     web_client: Set[str]
 
-@dataclass(frozen=True)
+def pack_frame(mapping: PhysicalMapping, action: str) -> bytes:
+    '''Packs the firmware KeyCommand frame for a physical mapping and action ('PRESS' or 'RELEASE')'''
+    return struct.pack(FRAME_FORMAT,
+        mapping.row.i2c_addr,
+        mapping.row.logi_pin,
+        mapping.row.pin.axis.value,
+        mapping.row.pin.channel,
+        mapping.row.bus_pin.axis.value,
+        mapping.row.bus_pin.channel,
+        mapping.col.i2c_addr,
+        mapping.col.logi_pin,
+        mapping.col.pin.axis.value,
+        mapping.col.pin.channel,
+        mapping.col.bus_pin.axis.value,
+        mapping.col.bus_pin.channel,
+        1 if action == 'PRESS' else 0
+    )
+
+# Each key is a singleton in KEYS, so identity equality lets definitions be used in sets and dicts
+@dataclass(frozen=True, eq=False)
 class KeyDefinition:
     physical_mapping: PhysicalMapping
     string_aliases: StringAliases
+    press_frame: bytes = field(init=False, repr=False, compare=False)
+    release_frame: bytes = field(init=False, repr=False, compare=False)
+    switch_address: bytes = field(init=False, repr=False, compare=False)
+
+    # Frames are packed once when KEYS is built so sending a key is a single buffer write
+    def __post_init__(self):
+        object.__setattr__(self, 'press_frame', pack_frame(self.physical_mapping, 'PRESS'))
+        object.__setattr__(self, 'release_frame', pack_frame(self.physical_mapping, 'RELEASE'))
+        object.__setattr__(self, 'switch_address', bytes((
+            pack_pin(self.physical_mapping.row.pin),
+            pack_pin(self.physical_mapping.col.pin)
+        )))
 
 class KEYS:
     ESCAPE = KeyDefinition(
@@ -0,0 +1,64 @@
+'''
+Key Lookup Indexes for the Drinky Board
+
+This module builds read-only reverse indexes over the KEYS table so that a
+client-side identifier (e.g. a JavaScript KeyboardEvent.code) resolves to its
+KeyDefinition with a single dict lookup instead of a scan over every key.
+
+The indexes are built once at import. Building fails with a ValueError if two
+keys claim the same alias, since the lookup would otherwise be ambiguous.
+
+It also derives the packed key table uploaded to the firmware for the compact
+key-index protocol: key i (in KEYS declaration order) is stored as its 2-byte
+switch_address, and KEY_TABLE_CHECKSUM (CRC-32 over version, count and table)
+identifies the table so an unchanged one is never uploaded twice.
+
+Usage:
+- Resolve a web client code: lookup_web_client_code('KeyA') -> ('A', KEYS.A)
+- Iterate keys in declaration order: for name, key in KEY_ITEMS: ...
+- Compact command for a key: COMPACT_PRESS_FRAMES[KEYS.A] -> bytes((key_id, 1))
+- Key id <-> key: KEY_IDS[KEYS.A], KEYS_BY_ID[key_id]
+'''
+
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+import zlib
+from .key_definitions import KEYS, KeyDefinition
+
+# (name, definition) pairs in the order they are declared in KEYS
+KEY_ITEMS: Tuple[Tuple[str, KeyDefinition], ...] = tuple(
+    (name, key) for name, key in vars(KEYS).items() if isinstance(key, KeyDefinition)
+)
+
+def build_alias_index(client: str) -> Mapping[str, Tuple[str, KeyDefinition]]:
+    '''Builds a frozen alias -> (key name, KeyDefinition) index for one StringAliases field'''
+    index = {}
+    for name, key in KEY_ITEMS:
+        for alias in getattr(key.string_aliases, client):
+            if alias in index:
+                raise ValueError(f'Duplicate {client} alias {alias!r} on {index[alias][0]} and {name}')
+            index[alias] = (name, key)
+    return MappingProxyType(index)
+
+WEB_CLIENT_INDEX = build_alias_index('web_client')
+
+def lookup_web_client_code(code: str) -> Optional[Tuple[str, KeyDefinition]]:
+    '''Returns (key name, KeyDefinition) for a web client code, or None if unmapped'''
+    return WEB_CLIENT_INDEX.get(code)
+
+#region Compact key-index protocol
+KEY_TABLE_VERSION = 1
+# Key ids must stay below the first byte of a legacy frame (row I2C address 0x70)
+MAX_KEY_IDS = 0x70
+
+if len(KEY_ITEMS) > MAX_KEY_IDS:
+    raise ValueError(f'{len(KEY_ITEMS)} keys exceed the {MAX_KEY_IDS} ids of the compact protocol')
+
+KEY_IDS: Mapping[KeyDefinition, int] = MappingProxyType({key: i for i, (_, key) in enumerate(KEY_ITEMS)})
+KEYS_BY_ID: Tuple[KeyDefinition, ...] = tuple(key for _, key in KEY_ITEMS)
+KEY_TABLE = b''.join(key.switch_address for _, key in KEY_ITEMS)
+KEY_TABLE_CHECKSUM = zlib.crc32(bytes((KEY_TABLE_VERSION, len(KEY_ITEMS))) + KEY_TABLE)
+
+COMPACT_PRESS_FRAMES: Mapping[KeyDefinition, bytes] = MappingProxyType({key: bytes((i, 1)) for key, i in KEY_IDS.items()})
+COMPACT_RELEASE_FRAMES: Mapping[KeyDefinition, bytes] = MappingProxyType({key: bytes((i, 0)) for key, i in KEY_IDS.items()})
+#endregion
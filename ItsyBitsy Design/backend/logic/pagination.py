@@ -0,0 +1,105 @@
+'''
+List Pagination for the Drinky Board
+
+Pages, projections and ETags for the profile and sequence lists, so a
+get_all request only encodes what the client asked for:
+- offset/limit: plain paging (limit is capped at MAX_LIMIT)
+- cursor: continue after the last item of the previous page; the cursor is the
+  item's (rank, filename), so it stays valid while items are added, moved or deleted
+- fields: keep only these keys of each item's data (e.g. 'name,isActive')
+
+The ETag comes from the collection's version and the active item, not from the
+list contents, so an unchanged list is answered with 304 before anything is
+encoded. A per-process tag keeps ETags from an earlier run from matching.
+
+Usage:
+- query = PageQuery.from_args(request.args)  # ValueError on bad parameters
+- page = paginate(version, items, query, active='x.json')
+- page.items, page.total, page.next_cursor, page.etag
+'''
+
+import base64
+import bisect
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+from logic.storage.ranks import is_rank
+
+MAX_LIMIT = 500
+PROCESS_TAG = uuid.uuid4().hex[:8]
+
+@dataclass(frozen=True)
+class PageQuery:
+    offset: int = 0
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+    fields: Optional[tuple] = None
+
+    @classmethod
+    def from_args(cls, args):
+        '''Parses offset, limit, cursor and fields from request query parameters'''
+        try:
+            offset = int(args.get('offset', 0))
+            limit = int(args['limit']) if args.get('limit') else None
+        except ValueError:
+            raise ValueError('offset and limit must be integers')
+        if offset < 0 or (limit is not None and not 1 <= limit <= MAX_LIMIT):
+            raise ValueError(f'offset must be >= 0 and limit between 1 and {MAX_LIMIT}')
+        cursor = args.get('cursor') or None
+        if cursor is not None:
+            _decode_cursor(cursor)
+        fields = args.get('fields')
+        fields = tuple(field for field in fields.split(',') if field) if fields else None
+        return cls(offset, limit, cursor, fields)
+
+@dataclass
+class Page:
+    items: list
+    total: int
+    next_cursor: Optional[str]
+    etag: str
+
+def _sort_key(entry):
+    # The order listings come in: by rank, unranked entries last, ties by filename
+    rank = entry.get('rank')
+    return (rank is None, rank or 0, entry['filename'])
+
+def _encode_cursor(entry):
+    raw = json.dumps([entry.get('rank'), entry['filename']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def _decode_cursor(cursor):
+    try:
+        rank, filename = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not (rank is None or is_rank(rank)) or not isinstance(filename, str):
+        raise ValueError('Invalid cursor')
+    return (rank is None, rank or 0, filename)
+
+def _project(entry, fields):
+    if fields is None or 'data' not in entry:
+        return entry
+    return {'filename': entry['filename'], 'data': {k: entry['data'][k] for k in fields if k in entry['data']}}
+
+def page_etag(version, active, query):
+    key = repr((version, active, query)).encode()
+    return f'{PROCESS_TAG}-{version}-{hashlib.sha1(key).hexdigest()[:12]}'
+
+def paginate(version, items, query, active=None):
+    '''Cuts one page out of an ordered listing (see Collection.listing)'''
+    start = 0
+    if query.cursor is not None:
+        start = bisect.bisect_right(items, _decode_cursor(query.cursor), key=_sort_key)
+    start += query.offset
+    end = len(items) if query.limit is None else start + query.limit
+    page = items[start:end]
+    next_cursor = _encode_cursor(page[-1]) if page and end < len(items) else None
+    return Page(
+        items=[_project(entry, query.fields) for entry in page],
+        total=len(items),
+        next_cursor=next_cursor,
+        etag=page_etag(version, active, query)
+    )
@@ -1,36 +1,198 @@
-import os
-import json
+'''
+Preferences Store for the Drinky Board
 
-# Path to the preferences file
-PREFERENCES_FILE = 'data/user_preferences.json'
+User preferences are held in memory by one process-wide PreferencesStore. It is
+loaded from storage on first use and is the source of truth from then on:
+- Reads return the current dict without touching storage
+- Changes are applied under a lock, either as a JSON merge patch (RFC 7386: keys
+  set to null are removed) or by a function that edits the dict in place, so
+  concurrent requests no longer overwrite each other's updates
+- Changed preferences are written back by a background thread, PERSIST_DEBOUNCE
+  seconds after the last change (at most PERSIST_MAX_DELAY after the first), so a
+  burst of changes costs one write. flush() writes immediately; it runs at exit.
+
+Edits made to the stored preferences outside the app are not picked up while
+it runs.
+
+Usage:
+- preferences_store.view() -> the current preferences (shared, read-only)
+- preferences_store.patch({'theme': 'dark', 'old': None})
+- preferences_store.set('activeProfile', None)  # stores the null, unlike patch
+- preferences_store.modify(lambda prefs: prefs.pop('profileOrder', None))
+- reset_preferences()  # back to defaults, keeping the active profile and sequence
+'''
+
+import atexit
+import copy
+import threading
+import time
+from logic.storage import get_storage
+
+PERSIST_DEBOUNCE = 0.25  # Seconds without changes before writing
+PERSIST_MAX_DELAY = 2.0  # Longest a change waits for its write while changes keep coming
+PERSIST_RETRY = 1.0      # Seconds before retrying a failed write
+
+def merge_patch(target, patch):
+    '''Applies a JSON merge patch (RFC 7386) and returns the result; target is not modified'''
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+# Which profile and sequence are active lives in preferences too, but is not a UI preference
+ACTIVE_POINTER_KEYS = ('activeProfile', 'activeSequence')
+
+def get_default_preferences():
+    '''Get default preferences structure (item order is stored with the items, not here)'''
+    return {}
+
+class PreferencesStore:
+    def __init__(self, storage=None, debounce=PERSIST_DEBOUNCE, max_delay=PERSIST_MAX_DELAY):
+        self._storage = storage
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._data = None  # Replaced, never modified in place, so readers can share it
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # Keeps an older snapshot from overwriting a newer one
+        self._generation = 0  # Bumped on every change
+        self._saved = 0       # Generation last written to storage
+        self._first_change = None
+        self._last_change = None
+        self._writer = None
+
+    def _load(self):
+        '''Loads the stored preferences on first use; must hold the lock'''
+        if self._data is None:
+            if self._storage is None:
+                self._storage = get_storage()
+            stored = self._storage.load_preferences()
+            self._data = stored if stored is not None else get_default_preferences()
+        return self._data
+
+    def view(self):
+        '''Returns the current preferences; shared between callers, do not modify'''
+        with self._cond:
+            return self._load()
+
+    def copy(self):
+        '''Returns a private copy of the current preferences'''
+        return copy.deepcopy(self.view())
+
+    def modify(self, fn):
+        '''Calls fn on a working copy of the preferences under the lock and commits it;
+        returns the new preferences (shared, read-only)'''
+        with self._cond:
+            updated = copy.deepcopy(self._load())
+            fn(updated)
+            if updated != self._data:
+                self._data = updated
+                self._changed()
+            return self._data
+
+    def patch(self, delta):
+        '''Applies a JSON merge patch; returns the new preferences (shared, read-only)'''
+        with self._cond:
+            updated = merge_patch(self._load(), delta)
+            if updated != self._data:
+                self._data = updated
+                self._changed()
+            return self._data
+
+    def set(self, key, value):
+        '''Sets one key; unlike patch, a None value is stored rather than removing the key'''
+        with self._cond:
+            if key in self._load() and self._data[key] == value:
+                return self._data
+            self._data = {**self._data, key: copy.deepcopy(value)}
+            self._changed()
+            return self._data
+
+    def replace(self, preferences):
+        with self._cond:
+            self._load()
+            self._data = copy.deepcopy(preferences)
+            self._changed()
+            return self._data
+
+    def _changed(self):
+        '''Schedules a debounced write; must hold the lock'''
+        now = time.monotonic()
+        self._generation += 1
+        self._last_change = now
+        if self._first_change is None:
+            self._first_change = now
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._writer_loop, name='preferences-writer', daemon=True)
+            self._writer.start()
+        self._cond.notify_all()
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._saved == self._generation or self._first_change is None:
+                        self._cond.wait()  # Nothing pending, or a flush is writing it
+                        continue
+                    # Wait for the changes to settle
+                    due = min(self._last_change + self.debounce, self._first_change + self.max_delay)
+                    remaining = due - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            if not self.flush():
+                time.sleep(PERSIST_RETRY)
+
+    def flush(self):
+        '''Writes pending changes now; returns False if the write failed'''
+        with self._write_lock:
+            with self._cond:
+                if self._saved == self._generation:
+                    return True
+                generation, data = self._generation, self._data
+                self._first_change = None
+            try:
+                self._storage.save_preferences(data)
+            except Exception as e:
+                print(f'Failed to save preferences: {e}')
+                with self._cond:
+                    if self._first_change is None:
+                        self._first_change = time.monotonic()
+                    self._cond.notify_all()
+                return False
+            with self._cond:
+                self._saved = generation
+                self._cond.notify_all()
+            return True
+
+preferences_store = PreferencesStore()
+atexit.register(preferences_store.flush)
 
 def load_preferences():
-    '''Load user preferences from file'''
-    if os.path.exists(PREFERENCES_FILE):
-        try:
-            with open(PREFERENCES_FILE, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return get_default_preferences()
-    return get_default_preferences()
+    '''Load user preferences (a private copy, safe to modify)'''
+    return preferences_store.copy()
 
 def save_preferences(preferences):
-    '''Save user preferences to file'''
-    # Ensure the data directory exists
-    os.makedirs(os.path.dirname(PREFERENCES_FILE), exist_ok=True)
-    
-    with open(PREFERENCES_FILE, 'w') as f:
-        json.dump(preferences, f, indent=2)
+    '''Replace all user preferences'''
+    preferences_store.replace(preferences)
 
-def get_default_preferences():
-    '''Get default preferences structure'''
-    return {
-        'profileOrder': []
-    }
-
-def update_profile_order(profile_order):
-    '''Update the profile order in preferences'''
-    preferences = load_preferences()
-    preferences['profileOrder'] = profile_order
-    save_preferences(preferences)
-    return preferences 
\ No newline at end of file
+def reset_preferences():
+    '''Reset user preferences to defaults, keeping the active profile and sequence pointers;
+    returns a private copy of the result'''
+    def reset(prefs):
+        kept = {key: prefs[key] for key in ACTIVE_POINTER_KEYS if key in prefs}
+        prefs.clear()
+        prefs.update(get_default_preferences(), **kept)
+    return copy.deepcopy(preferences_store.modify(reset))
+
+def patch_preferences(delta):
+    '''Apply a JSON merge patch to the user preferences; returns a private copy of the result'''
+    return copy.deepcopy(preferences_store.patch(delta))
+
+def flush_preferences():
+    '''Write pending preference changes to storage now'''
+    preferences_store.flush()
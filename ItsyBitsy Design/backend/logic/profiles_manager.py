@@ -1,109 +1,128 @@
-import os
-import json
 import uuid
 from datetime import datetime
-from logic.preferences_manager import load_preferences, save_preferences
+from logic.pagination import PageQuery, paginate
+from logic.preferences_manager import preferences_store
+from logic.storage import get_storage
 
-PROFILES_DIR = 'data/profiles'
+# Profiles live in the configured storage backend (JSON files or SQLite, see logic/storage)
+storage = get_storage()
+profile_repository = storage.collection('profiles')
 
-# Utility to ensure the profiles directory exists
-def ensure_profiles_dir():
-    if not os.path.exists(PROFILES_DIR):
-        os.makedirs(PROFILES_DIR)
+# The active profile is one pointer in preferences ('activeProfile'); isActive is derived on read
+def _active_profile(preferences):
+    if 'activeProfile' in preferences:
+        return preferences['activeProfile']
+    # Older versions stored isActive in every file; adopt the first active one once
+    active = None
+    for filename in profile_repository.filenames():
+        entry = profile_repository.load(filename)
+        if entry and entry.get('data', {}).get('isActive'):
+            active = filename
+            break
+    return preferences_store.modify(lambda prefs: prefs.setdefault('activeProfile', active))['activeProfile']
 
-# Load all profiles, optionally sorted by profileOrder from preferences
+def get_active_profile():
+    return _active_profile(preferences_store.view())
+
+# The order is a rank stored with each profile (see logic/storage/ranks.py). Older versions kept
+# a profileOrder list in preferences; it places the unranked profiles once and is then dropped
+def _rank_profiles(preferences):
+    if 'profileOrder' not in preferences and not profile_repository.unranked():
+        return
+    profile_repository.rank_unranked(preferences.get('profileOrder', []))
+    preferences_store.modify(lambda prefs: prefs.pop('profileOrder', None))
+
+# Load all profiles in order (the returned dicts are shared with the cache; copy before modifying)
 def load_all_profiles():
-    ensure_profiles_dir()
-    profiles = []
-    for filename in os.listdir(PROFILES_DIR):
-        if filename.endswith('.json'):
-            file_path = os.path.join(PROFILES_DIR, filename)
-            try:
-                with open(file_path, 'r') as f:
-                    profile_data = json.load(f)
-                    profiles.append({'filename': filename, 'data': profile_data})
-            except json.JSONDecodeError:
-                profiles.append({'filename': filename, 'error': 'Invalid JSON'})
-    # Sort by profileOrder if available
-    preferences = load_preferences()
-    profile_order = preferences.get('profileOrder', [])
-    if profile_order:
-        order_map = {fn: i for i, fn in enumerate(profile_order)}
-        profiles.sort(key=lambda x: order_map.get(x['filename'], len(profile_order)))
-    return profiles
+    preferences = preferences_store.view()
+    _rank_profiles(preferences)
+    return profile_repository.items(_active_profile(preferences))
+
+# Load one page of profiles (see logic/pagination.py); the ETag is known without encoding the list
+def list_profiles(query=PageQuery()):
+    preferences = preferences_store.view()
+    _rank_profiles(preferences)
+    active = _active_profile(preferences)
+    version, items = profile_repository.listing(active)
+    return paginate(version, items, query, active=active)
 
 # Load a single profile by filename
 def load_profile(filename):
-    file_path = os.path.join(PROFILES_DIR, filename)
-    if not os.path.exists(file_path):
+    entry = profile_repository.load(filename)
+    if entry is None:
         return None
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    if 'error' in entry:
+        raise ValueError(f'Profile {filename}: {entry["error"]}')
+    return {**entry['data'], 'isActive': filename == get_active_profile()}
 
-# Save a profile (create or overwrite)
+# Save a profile (create or overwrite); isActive is not stored in the file
 def save_profile(filename, data):
-    ensure_profiles_dir()
-    file_path = os.path.join(PROFILES_DIR, filename)
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2)
+    profile_repository.save(filename, {k: v for k, v in data.items() if k != 'isActive'})
 
-# Delete a profile by filename
+# Delete a profile by filename; the active pointer is cleared if it pointed here
 def delete_profile(filename):
-    file_path = os.path.join(PROFILES_DIR, filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-        # Remove from profileOrder in preferences
-        preferences = load_preferences()
-        profile_order = preferences.get('profileOrder', [])
-        if filename in profile_order:
-            profile_order.remove(filename)
-            preferences['profileOrder'] = profile_order
-            save_preferences(preferences)
-        return True
-    return False
+    get_active_profile()  # Adopt a legacy active profile before its file is gone
+    if not profile_repository.delete(filename):
+        return False
+    # No other profile's rank changes
+    _clear_active_profile(filename)
+    return True
 
-# Add a new profile (returns filename)
+# Add a new profile, ranked last (returns filename)
 def add_profile(profile_data):
-    ensure_profiles_dir()
     profile_data['created'] = datetime.now().isoformat()
     filename = f"{uuid.uuid4()}.json"
     save_profile(filename, profile_data)
-    # Add to profileOrder
-    preferences = load_preferences()
-    profile_order = preferences.get('profileOrder', [])
-    profile_order.append(filename)
-    preferences['profileOrder'] = profile_order
-    save_preferences(preferences)
+    if profile_data.get('isActive'):
+        preferences_store.set('activeProfile', filename)
     return filename
 
 # Edit an existing profile
 def edit_profile(filename, profile_data):
-    file_path = os.path.join(PROFILES_DIR, filename)
-    if not os.path.exists(file_path):
-        return False
-    try:
-        with open(file_path, 'r') as f:
-            existing_data = json.load(f)
-            profile_data['created'] = existing_data.get('created')
-    except json.JSONDecodeError:
+    existing = profile_repository.load(filename)
+    if existing is None or 'error' in existing:
         return False
+    profile_data['created'] = existing['data'].get('created')
     save_profile(filename, profile_data)
+    if 'isActive' in profile_data:
+        was_active = get_active_profile() == filename
+        if profile_data['isActive'] and not was_active:
+            set_active_profile(filename)
+        elif not profile_data['isActive'] and was_active:
+            _clear_active_profile(filename)
+    return True
+
+# Make the given profile the only active one (None deactivates all); one in-memory preferences change
+def set_active_profile(filename):
+    if filename is not None:
+        entry = profile_repository.load(filename)
+        if entry is None or 'error' in entry:
+            return False
+    preferences_store.set('activeProfile', filename)
     return True
 
-# Deactivate all profiles except the given filename
-def deactivate_all_except(filename):
-    ensure_profiles_dir()
-    updated_count = 0
-    for profile_filename in os.listdir(PROFILES_DIR):
-        if profile_filename.endswith('.json'):
-            file_path = os.path.join(PROFILES_DIR, profile_filename)
-            try:
-                with open(file_path, 'r') as f:
-                    profile_data = json.load(f)
-                profile_data['isActive'] = (profile_filename == filename)
-                with open(file_path, 'w') as f:
-                    json.dump(profile_data, f, indent=2)
-                updated_count += 1
-            except json.JSONDecodeError:
-                continue
-    return updated_count 
\ No newline at end of file
+# Deactivate a profile only if it is still the active one (checked under the preferences lock,
+# so a profile activated by another request meanwhile stays active)
+def _clear_active_profile(filename):
+    def clear(prefs):
+        if prefs.get('activeProfile') == filename:
+            prefs['activeProfile'] = None
+    preferences_store.modify(clear)
+
+# Move one profile directly before or after another; only the moved profile's rank is written
+def move_profile(filename, before=None, after=None):
+    _rank_profiles(preferences_store.view())
+    return profile_repository.move(filename, before=before, after=after)
+
+# Reorder to match a whole list of filenames (the old order API); moves only what is out of place
+def reorder_profiles(filenames):
+    _rank_profiles(preferences_store.view())
+    current = [entry['filename'] for entry in profile_repository.items()]
+    known = set(current)
+    wanted = [filename for filename in filenames if filename in known]
+    with storage.transaction():
+        for i, filename in enumerate(wanted):
+            if current[i] != filename:
+                profile_repository.move(filename, before=current[i])
+                current.remove(filename)
+                current.insert(i, filename)
\ No newline at end of file
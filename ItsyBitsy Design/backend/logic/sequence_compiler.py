@@ -0,0 +1,465 @@
+'''
+Sequence Compiler for the Drinky Board
+
+This module turns a stored sequence (see sequences_manager.py) into a
+CompiledSequence: TapRuns holding the taps it types as compact arrays (key id
+from the compact key table, modifier bitmask) plus the explicit delays between
+them, and FileRuns for file actions. Everything slow about a sequence happens
+here, once: parsing, text-to-key translation (shift held across runs of
+shifted characters), modifier resolution and inlining nested sequences (raising
+SequenceError on cycles). File contents are never expanded up front; they are
+streamed in small chunks while playing.
+
+Compiled sequences are cached in an LRU bounded to COMPILE_CACHE_MAX_BYTES and
+keyed by content: a SHA-256 over the sequence's JSON, the keys of the sequences
+it includes and KEY_TABLE_CHECKSUM. An edited sequence (or one whose nested
+sequence changed) gets a new key and is recompiled; the nested sequences that
+did not change come from the cache.
+
+Timing is not cached: each playback renders a Timeline from the compiled runs
+with a fresh TimingModel, so every run keeps its humanized variation. Rendering
+is lazy, RENDER_CHUNK taps at a time into array-backed (key id, action, offset)
+buffers, so playback starts without building the whole timeline first. A file
+is read FILE_STREAM_CHUNK bytes at a time, decoded incrementally, translated and
+rendered as the scheduler consumes events, so memory stays constant however
+large the file is.
+
+Usage:
+- compiled = compile_sequence('abc.json')
+- timeline = compile_timeline('abc.json'); for offset, key, action in timeline: ...
+- timeline.rendered, timeline.total_events, timeline.complete
+- compile_cache.stats() -> {'entries': 3, 'bytes': 5120, 'hits': 10, 'misses': 3}
+'''
+
+from array import array
+from collections import OrderedDict
+import codecs
+import hashlib
+import json
+import os
+import threading
+from logic.keymaps.key_definitions import KEYS
+from logic.keymaps.key_index import KEY_IDS, KEY_TABLE_CHECKSUM, KEYS_BY_ID, lookup_web_client_code
+from logic.keygroup.text_planner import plan_text
+from logic.sequences_manager import load_sequence
+from logic.timing_model import MIN_KEY_GAP, TimingModel
+
+SEQUENCE_FILES_DIR = 'data/files'
+FILE_STREAM_CHUNK = 4096  # Bytes of a file read, decoded and translated at a time during playback
+COMPILE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+RENDER_CHUNK = 4096  # Taps rendered into the timeline buffers at a time
+
+MODIFIER_KEYS = {
+    'Ctrl': KEYS.LEFT_CTRL,
+    'Shift': KEYS.LEFT_SHIFT,
+    'Alt': KEYS.LEFT_ALT,
+    'Meta': KEYS.LEFT_WINDOWS,
+}
+# One bit per modifier in a tap's modifier mask, pressed in this order
+MODIFIER_BITS = {name: 1 << i for i, name in enumerate(MODIFIER_KEYS)}
+_MODIFIER_IDS = tuple((MODIFIER_BITS[name], KEY_IDS[key]) for name, key in MODIFIER_KEYS.items())
+SHIFT_BIT = MODIFIER_BITS['Shift']
+# bytes.translate table from a text plan's shifted flags (0/1) to modifier masks
+_SHIFT_MASKS = bytes((0, SHIFT_BIT)) + bytes(254)
+
+# Timeline actions, matching the action byte of the compact protocol
+RELEASE, PRESS = 0, 1
+ACTION_NAMES = ('RELEASE', 'PRESS')
+
+TIMING_FIELDS = ('wpm', 'wpmVariation', 'keyDuration', 'keyDurationVariation')
+
+class SequenceError(Exception):
+    '''Raised when a sequence cannot be compiled (missing, cyclic, or malformed)'''
+
+def resolve_key(name: str):
+    '''Resolves a keypress key as authored in the web client ('A', '1', 'Enter', 'ArrowUp', ...)'''
+    for code in (name, f'Key{name}', f'Digit{name}'):
+        match = lookup_web_client_code(code)
+        if match:
+            return match[1]
+    key = getattr(KEYS, name.upper(), None)
+    if key is None:
+        raise SequenceError(f'Unknown key: {name}')
+    return key
+
+def _bit_count(mask):
+    return bin(mask).count('1')
+
+class TapRun:
+    '''A run of taps as compact arrays, with the explicit delays between them.
+    Consecutive taps with the same modifiers and no delay between them keep the
+    modifiers held (one shift press for 'HELLO'), which modifier_count reflects.'''
+
+    def __init__(self):
+        self.keys = array('B')       # Key id per tap
+        self.modifiers = array('B')  # Modifier mask per tap
+        self.delay_at = array('I')   # Tap index each explicit delay comes before
+        self.delays = array('d')     # Delay seconds
+        self.modifier_count = 0      # Modifier presses over all taps
+        self.skipped = 0             # Characters with no key on the board
+        self.untypeable = set()      # Those characters, for reporting
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def event_count(self):
+        return 2 * (len(self.keys) + self.modifier_count)
+
+    @property
+    def nbytes(self):
+        return sum(len(a) * a.itemsize for a in (self.keys, self.modifiers, self.delay_at, self.delays))
+
+    def _holds(self, mask):
+        '''True if a tap with this mask added now keeps the previous tap's modifiers held'''
+        return (mask and self.modifiers and self.modifiers[-1] == mask
+                and not (self.delay_at and self.delay_at[-1] == len(self.keys)))
+
+    def tap(self, key_id, mask=0):
+        if mask and not self._holds(mask):
+            self.modifier_count += _bit_count(mask)
+        self.keys.append(key_id)
+        self.modifiers.append(mask)
+
+    def delay(self, seconds):
+        if seconds > 0:
+            self._delay_before(len(self.keys), seconds)
+
+    def _delay_before(self, index, seconds):
+        if self.delay_at and self.delay_at[-1] == index:
+            self.delays[-1] += seconds
+        else:
+            self.delay_at.append(index)
+            self.delays.append(seconds)
+
+    def text(self, text):
+        plan = plan_text(text)
+        if plan.key_ids:
+            presses = plan.shift_presses
+            if plan.shifted[0] and self._holds(SHIFT_BIT):
+                presses -= 1
+            self.keys.extend(plan.key_ids)
+            self.modifiers.frombytes(plan.shifted.tobytes().translate(_SHIFT_MASKS))
+            self.modifier_count += presses
+        if plan.untypeable:
+            self.skipped += len(plan.untypeable)
+            self.untypeable.update(char for _, char in plan.untypeable)
+
+    def extend(self, other):
+        base = len(self.keys)
+        self.modifier_count += other.modifier_count
+        if other.modifiers and self._holds(other.modifiers[0]) and not (other.delay_at and other.delay_at[0] == 0):
+            self.modifier_count -= _bit_count(other.modifiers[0])
+        for index, seconds in zip(other.delay_at, other.delays):
+            self._delay_before(base + index, seconds)
+        self.keys.extend(other.keys)
+        self.modifiers.extend(other.modifiers)
+        self.skipped += other.skipped
+        self.untypeable |= other.untypeable
+
+class FileRun:
+    '''A file action; its text is streamed and translated at playback, never stored'''
+
+    nbytes = 0
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+
+class CompiledSequence:
+    '''A compiled sequence: TapRuns and FileRuns in order; read-only once it is in the cache'''
+
+    def __init__(self, timing=None):
+        self.timing = dict(timing or {})  # wpm/keyDuration fields for the TimingModel
+        self.runs = []
+
+    def _taps(self):
+        if not self.runs or not isinstance(self.runs[-1], TapRun):
+            self.runs.append(TapRun())
+        return self.runs[-1]
+
+    def __len__(self):
+        '''Taps known at compile time (file contents are not counted)'''
+        return sum(len(run) for run in self.runs if isinstance(run, TapRun))
+
+    @property
+    def event_count(self):
+        return sum(run.event_count for run in self.runs if isinstance(run, TapRun))
+
+    @property
+    def files(self):
+        return [run.filepath for run in self.runs if isinstance(run, FileRun)]
+
+    @property
+    def skipped(self):
+        return sum(run.skipped for run in self.runs if isinstance(run, TapRun))
+
+    @property
+    def untypeable(self):
+        return set().union(*(run.untypeable for run in self.runs if isinstance(run, TapRun)))
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self.runs)
+
+    def tap(self, key_id, mask=0):
+        self._taps().tap(key_id, mask)
+
+    def delay(self, seconds):
+        self._taps().delay(seconds)
+
+    def text(self, text):
+        self._taps().text(text)
+
+    def file(self, filepath):
+        self.runs.append(FileRun(filepath))
+
+    def extend(self, other):
+        '''Appends another compiled sequence's runs (its timing fields are not used)'''
+        for run in other.runs:
+            if isinstance(run, TapRun):
+                # Copied into our own run; the other sequence may be shared through the cache
+                self._taps().extend(run)
+            else:
+                self.runs.append(run)
+
+def _emit_modifiers(key_ids, actions, offsets, mask, action, offset):
+    for bit, modifier_id in _MODIFIER_IDS:
+        if mask & bit:
+            key_ids.append(modifier_id)
+            actions.append(action)
+            offsets.append(offset)
+
+class Timeline:
+    '''One playback of a CompiledSequence, rendered lazily with its own TimingModel.
+    Iterating yields (offset_seconds, key, action) events with non-decreasing offsets.
+
+    Files are streamed while playing: FILE_STREAM_CHUNK bytes are read, decoded
+    incrementally and translated at a time, so the first key of a multi-megabyte
+    file goes out within milliseconds and memory stays constant. Their event count
+    is only known once played; until then total_events is an estimate.'''
+
+    def __init__(self, compiled: CompiledSequence, timing: TimingModel):
+        self.compiled = compiled
+        self.timing = timing
+        self.rendered = 0      # Events produced so far
+        self.skipped = 0       # Characters with no key on the board, files included
+        self.untypeable = set()  # Those characters
+        self.complete = False  # True once every event has been produced
+        self._offset = 0.0
+        self._estimate = compiled.event_count
+        for filepath in compiled.files:
+            try:
+                # About one character per byte, pressed and released
+                self._estimate += 2 * os.path.getsize(_file_path(filepath))
+            except SequenceError:
+                pass  # Reported when playback reaches it
+
+    @property
+    def total_events(self):
+        '''Exact once complete (or without files); an estimate while files are still playing'''
+        if self.complete:
+            return self.rendered
+        return max(self._estimate, self.rendered)
+
+    def chunks(self):
+        '''Yields (key_ids, actions, offsets) arrays covering at most RENDER_CHUNK taps each'''
+        for run in self.compiled.runs:
+            if isinstance(run, FileRun):
+                for text in _read_text_file(run.filepath, FILE_STREAM_CHUNK):
+                    taps = TapRun()
+                    taps.text(text)
+                    self.skipped += taps.skipped
+                    self.untypeable |= taps.untypeable
+                    yield from self._render(taps)
+            else:
+                self.skipped += run.skipped
+                self.untypeable |= run.untypeable
+                yield from self._render(run)
+        self.complete = True
+
+    def _render(self, run):
+        timing = self.timing
+        keys, modifiers, delay_at, delays = run.keys, run.modifiers, run.delay_at, run.delays
+        offset = self._offset
+        next_delay = 0
+        held = 0          # Modifier mask currently held down
+        released_at = 0.0  # When the previous tap's key came up
+        for start in range(0, len(keys), RENDER_CHUNK):
+            end = min(len(keys), start + RENDER_CHUNK)
+            holds = timing.holds(end - start)
+            intervals = timing.intervals(end - start)
+            key_ids, actions, offsets = array('B'), array('B'), array('d')
+            for i in range(start, end):
+                delayed = False
+                while next_delay < len(delay_at) and delay_at[next_delay] == i:
+                    offset += delays[next_delay]
+                    next_delay += 1
+                    delayed = True
+                hold = holds[i - start]
+                mask = modifiers[i]
+                # Modifiers stay down while the next tap needs the same ones (see TapRun)
+                if held and (held != mask or delayed):
+                    _emit_modifiers(key_ids, actions, offsets, held, RELEASE, released_at)
+                    held = 0
+                if mask and not held:
+                    _emit_modifiers(key_ids, actions, offsets, mask, PRESS, offset)
+                    held = mask
+                key_ids.append(keys[i])
+                actions.append(PRESS)
+                offsets.append(offset)
+                key_ids.append(keys[i])
+                actions.append(RELEASE)
+                released_at = offset + hold
+                offsets.append(released_at)
+                # The next tap never starts before this one is released
+                offset += max(intervals[i - start], hold + MIN_KEY_GAP)
+            if held and end == len(keys):
+                _emit_modifiers(key_ids, actions, offsets, held, RELEASE, released_at)
+            self._offset = offset
+            yield key_ids, actions, offsets
+        # Delays after the last tap of the run still push back whatever follows
+        while next_delay < len(delay_at):
+            offset += delays[next_delay]
+            next_delay += 1
+        self._offset = offset
+
+    def __iter__(self):
+        for key_ids, actions, offsets in self.chunks():
+            for key_id, action, offset in zip(key_ids, actions, offsets):
+                self.rendered += 1
+                yield offset, KEYS_BY_ID[key_id], ACTION_NAMES[action]
+
+class CompileCache:
+    '''LRU of compiled sequences by content key, bounded by their total array size'''
+
+    def __init__(self, max_bytes=COMPILE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return compiled
+
+    def put(self, key, compiled):
+        size = compiled.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = compiled
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'hits': self.hits, 'misses': self.misses}
+
+compile_cache = CompileCache()
+
+def _file_path(filepath):
+    path = os.path.join(SEQUENCE_FILES_DIR, os.path.basename(filepath))
+    if not os.path.isfile(path):
+        raise SequenceError(f'File not found: {filepath}')
+    return path
+
+def _read_text_file(filepath, chunk_size=FILE_STREAM_CHUNK):
+    '''Yields decoded text from a file under SEQUENCE_FILES_DIR in fixed-size chunks; a
+    character split across chunks is held back by the incremental decoder'''
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    with open(_file_path(filepath), 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+def _nested_filename(action):
+    # The web client also sends the nested sequence as 'key'
+    return action.get('sequence') or action.get('key')
+
+class _Compiler:
+    '''One compile_sequence call: loads and keys each sequence once, reuses cached ones'''
+
+    def __init__(self, load):
+        self.load = load
+        self.sequences = {}  # filename -> (data, content key)
+
+    def resolve(self, filename, stack):
+        if filename in stack:
+            raise SequenceError(f'Sequence cycle: {" -> ".join(stack + [filename])}')
+        if filename in self.sequences:
+            return self.sequences[filename]
+        data = self.load(filename) if filename else None
+        if data is None:
+            raise SequenceError(f'Nested sequence not found: {filename}' if stack else f'Sequence not found: {filename}')
+        digest = hashlib.sha256(KEY_TABLE_CHECKSUM.to_bytes(4, 'big'))
+        document = {k: v for k, v in data.items() if k != 'isActive'}
+        digest.update(json.dumps(document, sort_keys=True, separators=(',', ':')).encode())
+        for action in data.get('actions', []):
+            if action.get('type') == 'sequence':
+                digest.update(self.resolve(_nested_filename(action), stack + [filename])[1].encode())
+            elif action.get('type') == 'file':
+                _file_path(action.get('filepath') or '')  # Fail before playback if it is missing
+        self.sequences[filename] = (data, digest.hexdigest())
+        return self.sequences[filename]
+
+    def compile(self, filename, stack=None):
+        stack = stack or []
+        data, key = self.resolve(filename, stack)
+        compiled = compile_cache.get(key)
+        if compiled is not None:
+            return compiled
+        compiled = CompiledSequence({field: data.get(field) for field in TIMING_FIELDS})
+        for action in data.get('actions', []):
+            action_type = action.get('type')
+            if action_type == 'delay':
+                compiled.delay(float(action.get('duration') or 0) / 1000.0)
+            elif action_type == 'keypress':
+                key_id = KEY_IDS[resolve_key(action.get('key') or '')]
+                mask = 0
+                for name in action.get('modifiers') or []:
+                    if name not in MODIFIER_BITS:
+                        raise SequenceError(f'Unknown modifier: {name}')
+                    mask |= MODIFIER_BITS[name]
+                compiled.tap(key_id, mask)
+            elif action_type == 'text':
+                compiled.text(action.get('text') or '')
+            elif action_type == 'sequence':
+                compiled.extend(self.compile(_nested_filename(action), stack + [filename]))
+            elif action_type == 'file':
+                compiled.file(action.get('filepath') or '')
+            else:
+                raise SequenceError(f'Unknown action type: {action_type}')
+        if compiled.skipped and not stack:
+            chars = ''.join(sorted(compiled.untypeable))
+            print(f'Sequence {filename}: skipped {compiled.skipped} character(s) with no key: {chars!r}')
+        compile_cache.put(key, compiled)
+        return compiled
+
+def compile_sequence(filename, load=load_sequence) -> CompiledSequence:
+    '''Compiles a stored sequence, or returns the cached result if nothing it depends on changed'''
+    return _Compiler(load).compile(filename)
+
+def compile_timeline(filename, load=load_sequence, seed=None) -> Timeline:
+    '''Compiles a stored sequence and pairs it with a fresh TimingModel for one playback'''
+    compiled = compile_sequence(filename, load)
+    return Timeline(compiled, TimingModel.from_profile(compiled.timing, seed=seed))
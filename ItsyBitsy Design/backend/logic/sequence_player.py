@@ -0,0 +1,181 @@
+'''
+Sequence Playback Engine for the Drinky Board
+
+This module plays saved sequences (see sequences_manager.py) on the device.
+A sequence is compiled (see sequence_compiler.py, which caches the result) and
+its timeline of (offset_seconds, key, action) events is handed to a KeyScheduler.
+
+Supported actions (as authored in the web client):
+- {'type': 'delay', 'duration': ms}
+- {'type': 'keypress', 'key': 'A', 'modifiers': ['Ctrl', 'Shift']}
+- {'type': 'text', 'text': 'Hello'}
+- {'type': 'sequence', 'sequence': '<filename>.json'} (the web client also sends it as 'key')
+- {'type': 'file', 'filepath': 'notes.txt'} (read from data/files)
+
+Compilation expands text to key taps (shift held across runs of shifted characters),
+resolves modifiers and inlines nested sequences (raising SequenceError on
+cycles); file contents are streamed in small chunks while playing, so the total
+is an estimate until a sequence with files has played through. Timing is drawn for each playback from a
+TimingModel built from the sequence's wpm/keyDuration fields and their variations.
+
+A sequence can be fanned out to several boards (see device_pool.py): each gets its
+own timeline and scheduler thread, all drawn from the same timing seed, so the
+boards type in step without waiting on each other.
+
+Usage:
+- player = SequencePlayer()
+- player.start(device, 'abc.json'); player.pause(); player.resume(); player.stop()
+- player.start(device_pool.targets(ALL), 'abc.json')  # every board at once
+- player.play_events(targets, 'Alphabet', [(0.0, KEYS.A, 'PRESS'), ...])  # e.g. output tests
+- player.progress() -> {'state': 'playing', 'dispatched': 10, 'total': 40, 'skipped': 0, 'devices': [...], ...}
+'''
+
+import random
+import threading
+from logic.key_scheduler import KeyScheduler
+from logic.sequence_compiler import SequenceError, compile_timeline
+
+class _EventTimeline:
+    '''A fixed list of (offset, key, action) events, played like a compiled timeline'''
+
+    def __init__(self, events):
+        self.events = list(events)
+        self.total_events = self.rendered = len(self.events)
+        self.complete = True
+        self.skipped = 0
+        self.untypeable = set()
+
+    def __iter__(self):
+        return iter(self.events)
+
+class _DeviceRun:
+    '''One device's share of a playback: its scheduler, thread and outcome'''
+
+    def __init__(self, key, device, timeline):
+        self.key = key
+        self.scheduler = KeyScheduler(device)
+        self.timeline = timeline
+        self.thread = None
+        self.state = 'playing'  # playing | finished | stopped | error
+        self.error = None
+
+    def progress(self):
+        return {
+            'device': self.key,
+            'state': self.state,
+            'dispatched': self.scheduler.dispatched,
+            'total': self.timeline.total_events,
+            'error': self.error
+        }
+
+class SequencePlayer:
+    '''Plays one sequence at a time on one or more devices, with stop/pause/resume and progress'''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = []
+        self._filename = None
+        self._paused = False
+
+    def start(self, targets, filename):
+        '''Compiles and starts playing a sequence on a device or a list of (key, device) pairs;
+        raises SequenceError if it cannot compile'''
+        # Compiled once (cached); every device draws the same timing
+        seed = random.getrandbits(32)
+        self._play(targets, filename, lambda: compile_timeline(filename, seed=seed))
+
+    def play_events(self, targets, name, events):
+        '''Plays a fixed list of (offset, key, action) events in place of a sequence, so it can be
+        stopped like one and never interleaves with a sequence on the same board'''
+        events = list(events)
+        self._play(targets, name, lambda: _EventTimeline(events))
+
+    def _play(self, targets, name, make_timeline):
+        if not isinstance(targets, (list, tuple)):
+            targets = [(getattr(targets, 'key', None), targets)]
+        runs = [_DeviceRun(key, device, make_timeline()) for key, device in targets]
+        with self._lock:
+            previous = self._runs
+        # Only one sequence plays at a time; the previous runs release their keys on the way out
+        for run in previous:
+            run.scheduler.stop()
+        for run in previous:
+            run.thread.join(timeout=1.0)
+        for run in runs:
+            run.thread = threading.Thread(target=self._run, args=(run,), name=f'sequence-player-{run.key}', daemon=True)
+        with self._lock:
+            self._runs = runs
+            self._filename = name
+            self._paused = False
+        for run in runs:
+            run.thread.start()
+
+    def _run(self, run):
+        try:
+            run.scheduler.run(run.timeline)
+            if run.scheduler.failed:
+                state, error = 'error', 'Device stopped accepting key events'
+            else:
+                state = 'finished' if run.timeline.complete and run.scheduler.dispatched == run.timeline.rendered else 'stopped'
+                error = None
+        except Exception as e:
+            state, error = 'error', str(e)
+        with self._lock:
+            run.state = state
+            run.error = error
+
+    def _state(self):
+        if not self._runs:
+            return 'idle'
+        if any(run.state == 'playing' for run in self._runs):
+            return 'paused' if self._paused else 'playing'
+        if any(run.state == 'error' for run in self._runs):
+            return 'error'
+        if all(run.state == 'finished' for run in self._runs):
+            return 'finished'
+        return 'stopped'
+
+    def stop(self):
+        with self._lock:
+            # Runs whose thread has not reached the scheduler yet stop as soon as it does
+            running = [run for run in self._runs if run.state == 'playing']
+            for run in running:
+                run.scheduler.stop()
+            self._paused = False
+            return bool(running)
+
+    def pause(self):
+        with self._lock:
+            if self._state() != 'playing':
+                return False
+            for run in self._runs:
+                run.scheduler.pause()
+            self._paused = True
+            return True
+
+    def resume(self):
+        with self._lock:
+            if self._state() != 'paused':
+                return False
+            for run in self._runs:
+                run.scheduler.resume()
+            self._paused = False
+            return True
+
+    def progress(self):
+        with self._lock:
+            runs = list(self._runs)
+            # Boards play the same timeline, so the first one speaks for what was compiled
+            timeline = runs[0].timeline if runs else None
+            errors = [f'{run.key}: {run.error}' if len(runs) > 1 else run.error for run in runs if run.error]
+            return {
+                'state': self._state(),
+                'sequence': self._filename,
+                'dispatched': sum(run.scheduler.dispatched for run in runs),
+                'total': sum(run.timeline.total_events for run in runs),
+                'skipped': timeline.skipped if timeline else 0,
+                'untypeable': ''.join(sorted(timeline.untypeable)) if timeline else '',
+                'jitter': runs[0].scheduler.last_stats.to_dict() if runs else None,
+                'devices': [run.progress() for run in runs],
+                'error': '; '.join(errors) or None
+            }
@@ -1,109 +1,128 @@
-import os
-import json
 import uuid
 from datetime import datetime
-from logic.preferences_manager import load_preferences, save_preferences
+from logic.pagination import PageQuery, paginate
+from logic.preferences_manager import preferences_store
+from logic.storage import get_storage
 
-SEQUENCES_DIR = 'data/sequences'
+# Sequences live in the configured storage backend (JSON files or SQLite, see logic/storage)
+storage = get_storage()
+sequence_repository = storage.collection('sequences')
 
-# Utility to ensure the sequences directory exists
-def ensure_sequences_dir():
-    if not os.path.exists(SEQUENCES_DIR):
-        os.makedirs(SEQUENCES_DIR)
+# The active sequence is one pointer in preferences ('activeSequence'); isActive is derived on read
+def _active_sequence(preferences):
+    if 'activeSequence' in preferences:
+        return preferences['activeSequence']
+    # Older versions stored isActive in every file; adopt the first active one once
+    active = None
+    for filename in sequence_repository.filenames():
+        entry = sequence_repository.load(filename)
+        if entry and entry.get('data', {}).get('isActive'):
+            active = filename
+            break
+    return preferences_store.modify(lambda prefs: prefs.setdefault('activeSequence', active))['activeSequence']
 
-# Load all sequences, optionally sorted by sequenceOrder from preferences
+def get_active_sequence():
+    return _active_sequence(preferences_store.view())
+
+# The order is a rank stored with each sequence (see logic/storage/ranks.py). Older versions kept
+# a sequenceOrder list in preferences; it places the unranked sequences once and is then dropped
+def _rank_sequences(preferences):
+    if 'sequenceOrder' not in preferences and not sequence_repository.unranked():
+        return
+    sequence_repository.rank_unranked(preferences.get('sequenceOrder', []))
+    preferences_store.modify(lambda prefs: prefs.pop('sequenceOrder', None))
+
+# Load all sequences in order (the returned dicts are shared with the cache; copy before modifying)
 def load_all_sequences():
-    ensure_sequences_dir()
-    sequences = []
-    for filename in os.listdir(SEQUENCES_DIR):
-        if filename.endswith('.json'):
-            file_path = os.path.join(SEQUENCES_DIR, filename)
-            try:
-                with open(file_path, 'r') as f:
-                    sequence_data = json.load(f)
-                    sequences.append({'filename': filename, 'data': sequence_data})
-            except json.JSONDecodeError:
-                sequences.append({'filename': filename, 'error': 'Invalid JSON'})
-    # Sort by sequenceOrder if available
-    preferences = load_preferences()
-    sequence_order = preferences.get('sequenceOrder', [])
-    if sequence_order:
-        order_map = {fn: i for i, fn in enumerate(sequence_order)}
-        sequences.sort(key=lambda x: order_map.get(x['filename'], len(sequence_order)))
-    return sequences
+    preferences = preferences_store.view()
+    _rank_sequences(preferences)
+    return sequence_repository.items(_active_sequence(preferences))
+
+# Load one page of sequences (see logic/pagination.py); the ETag is known without encoding the list
+def list_sequences(query=PageQuery()):
+    preferences = preferences_store.view()
+    _rank_sequences(preferences)
+    active = _active_sequence(preferences)
+    version, items = sequence_repository.listing(active)
+    return paginate(version, items, query, active=active)
 
 # Load a single sequence by filename
 def load_sequence(filename):
-    file_path = os.path.join(SEQUENCES_DIR, filename)
-    if not os.path.exists(file_path):
+    entry = sequence_repository.load(filename)
+    if entry is None:
         return None
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    if 'error' in entry:
+        raise ValueError(f'Sequence {filename}: {entry["error"]}')
+    return {**entry['data'], 'isActive': filename == get_active_sequence()}
 
-# Save a sequence (create or overwrite)
+# Save a sequence (create or overwrite); isActive is not stored in the file
 def save_sequence(filename, data):
-    ensure_sequences_dir()
-    file_path = os.path.join(SEQUENCES_DIR, filename)
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2)
+    sequence_repository.save(filename, {k: v for k, v in data.items() if k != 'isActive'})
 
-# Delete a sequence by filename
+# Delete a sequence by filename; the active pointer is cleared if it pointed here
 def delete_sequence(filename):
-    file_path = os.path.join(SEQUENCES_DIR, filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-        # Remove from sequenceOrder in preferences
-        preferences = load_preferences()
-        sequence_order = preferences.get('sequenceOrder', [])
-        if filename in sequence_order:
-            sequence_order.remove(filename)
-            preferences['sequenceOrder'] = sequence_order
-            save_preferences(preferences)
-        return True
-    return False
+    get_active_sequence()  # Adopt a legacy active sequence before its file is gone
+    if not sequence_repository.delete(filename):
+        return False
+    # No other sequence's rank changes
+    _clear_active_sequence(filename)
+    return True
 
-# Add a new sequence (returns filename)
+# Add a new sequence, ranked last (returns filename)
 def add_sequence(sequence_data):
-    ensure_sequences_dir()
     sequence_data['created'] = datetime.now().isoformat()
     filename = f"{uuid.uuid4()}.json"
     save_sequence(filename, sequence_data)
-    # Add to sequenceOrder
-    preferences = load_preferences()
-    sequence_order = preferences.get('sequenceOrder', [])
-    sequence_order.append(filename)
-    preferences['sequenceOrder'] = sequence_order
-    save_preferences(preferences)
+    if sequence_data.get('isActive'):
+        preferences_store.set('activeSequence', filename)
     return filename
 
 # Edit an existing sequence
 def edit_sequence(filename, sequence_data):
-    file_path = os.path.join(SEQUENCES_DIR, filename)
-    if not os.path.exists(file_path):
-        return False
-    try:
-        with open(file_path, 'r') as f:
-            existing_data = json.load(f)
-            sequence_data['created'] = existing_data.get('created')
-    except json.JSONDecodeError:
+    existing = sequence_repository.load(filename)
+    if existing is None or 'error' in existing:
         return False
+    sequence_data['created'] = existing['data'].get('created')
     save_sequence(filename, sequence_data)
+    if 'isActive' in sequence_data:
+        was_active = get_active_sequence() == filename
+        if sequence_data['isActive'] and not was_active:
+            set_active_sequence(filename)
+        elif not sequence_data['isActive'] and was_active:
+            _clear_active_sequence(filename)
+    return True
+
+# Make the given sequence the only active one (None deactivates all); one in-memory preferences change
+def set_active_sequence(filename):
+    if filename is not None:
+        entry = sequence_repository.load(filename)
+        if entry is None or 'error' in entry:
+            return False
+    preferences_store.set('activeSequence', filename)
     return True
 
-# Deactivate all sequences except the given filename
-def deactivate_all_except(filename):
-    ensure_sequences_dir()
-    updated_count = 0
-    for sequence_filename in os.listdir(SEQUENCES_DIR):
-        if sequence_filename.endswith('.json'):
-            file_path = os.path.join(SEQUENCES_DIR, sequence_filename)
-            try:
-                with open(file_path, 'r') as f:
-                    sequence_data = json.load(f)
-                sequence_data['isActive'] = (sequence_filename == filename)
-                with open(file_path, 'w') as f:
-                    json.dump(sequence_data, f, indent=2)
-                updated_count += 1
-            except json.JSONDecodeError:
-                continue
-    return updated_count 
\ No newline at end of file
+# Deactivate a sequence only if it is still the active one (checked under the preferences lock,
+# so a sequence activated by another request meanwhile stays active)
+def _clear_active_sequence(filename):
+    def clear(prefs):
+        if prefs.get('activeSequence') == filename:
+            prefs['activeSequence'] = None
+    preferences_store.modify(clear)
+
+# Move one sequence directly before or after another; only the moved sequence's rank is written
+def move_sequence(filename, before=None, after=None):
+    _rank_sequences(preferences_store.view())
+    return sequence_repository.move(filename, before=before, after=after)
+
+# Reorder to match a whole list of filenames (the old order API); moves only what is out of place
+def reorder_sequences(filenames):
+    _rank_sequences(preferences_store.view())
+    current = [entry['filename'] for entry in sequence_repository.items()]
+    known = set(current)
+    wanted = [filename for filename in filenames if filename in known]
+    with storage.transaction():
+        for i, filename in enumerate(wanted):
+            if current[i] != filename:
+                sequence_repository.move(filename, before=current[i])
+                current.remove(filename)
+                current.insert(i, filename)
\ No newline at end of file
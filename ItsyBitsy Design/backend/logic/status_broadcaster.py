@@ -0,0 +1,150 @@
+'''
+Connection Status Broadcaster for the Drinky Board
+
+The drinky_manager thread already watches the device; it publishes what it sees
+here and clients are told about it over Server-Sent Events instead of polling:
+- A 'status' event goes out only when the status, port or ACK mode changes
+  (connected, unresponsive, disconnected, moved to another port), or a board
+  joins or leaves the device pool
+- A 'heartbeat' event goes out every HEARTBEAT_INTERVAL seconds in between, with
+  the device's last heartbeat and link statistics, so clients can tell a quiet
+  stream from a dead one
+- A client that reconnects with a Last-Event-ID it already has skips the
+  repeated status event
+
+Publishing an unchanged status only refreshes the heartbeat fields and wakes
+nobody, so an idle board costs no requests and no work per client. Streams
+always send the latest status, so transitions closer together than a client
+reads them (unresponsive, then disconnected) arrive as the last one. Status ids
+carry a per-process tag so an id from an earlier run never matches.
+
+Usage:
+- status_broadcaster.publish(device_status(device))  # from the drinky_manager thread
+- version, status = status_broadcaster.current()
+- for chunk in status_events(status_broadcaster, request.headers.get('Last-Event-ID')): ...
+'''
+
+import json
+import threading
+import time
+import uuid
+
+HEARTBEAT_INTERVAL = 15.0  # Seconds between heartbeat events on an unchanged status
+RETRY_MS = 2000            # How long EventSource waits before reconnecting
+PROCESS_TAG = uuid.uuid4().hex[:8]
+
+# Fields whose change is a transition; the rest only travel with heartbeats
+TRANSITION_FIELDS = ('status', 'port', 'ack_mode', 'devices')
+HEARTBEAT_FIELDS = ('last_heartbeat', 'link')
+
+def device_status(device, connected=None):
+    '''Status dict for a device (None when there is none); connected=None asks the device'''
+    if not device:
+        return {
+            'connected': False,
+            'status': 'disconnected',
+            'message': 'No device found',
+            'port': None,
+            'last_heartbeat': None,
+            'ack_mode': False,
+            'link': None
+        }
+
+    if connected is None:
+        connected = device.is_connected()
+    # In ACK mode the heartbeat is a ping the firmware must answer, so report its round trip
+    link = device.link_stats()
+
+    if connected:
+        message = f'Device connected on port {device.port}'
+        if link and link['rtt']['count']:
+            message = f'Device responding on port {device.port} (p50 round trip {link["rtt"]["p50_ms"]} ms)'
+        status = 'connected'
+    else:
+        message = f'Device on port {device.port} is not responding'
+        status = 'unresponsive'
+    return {
+        'connected': connected,
+        'status': status,
+        'message': message,
+        'port': device.port,
+        'last_heartbeat': device.last_heartbeat,
+        'ack_mode': link is not None,
+        'link': link
+    }
+
+class StatusBroadcaster:
+    '''Holds the latest device status and wakes waiting streams when it transitions'''
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._version = 0
+        self._status = device_status(None)
+        self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def current(self):
+        '''Returns (version, status); the status dict is shared, do not modify'''
+        with self._cond:
+            return self._version, self._status
+
+    def publish(self, status):
+        '''Records the latest status; returns True if it was a transition'''
+        with self._cond:
+            changed = any(status.get(field) != self._status.get(field) for field in TRANSITION_FIELDS)
+            self._status = status
+            if changed:
+                self._version += 1
+                self._cond.notify_all()
+            return changed
+
+    def wait(self, version, timeout):
+        '''Waits for a status newer than version; returns (version, status), or None on timeout or close'''
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._version == version and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._closed:
+                return None
+            return self._version, self._status
+
+    def close(self):
+        '''Ends every open stream (on shutdown)'''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+def format_event(event, data, event_id=None):
+    '''One Server-Sent Event'''
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def _event_id(version):
+    return f'{PROCESS_TAG}-{version}'
+
+def status_events(broadcaster, last_event_id=None, heartbeat=HEARTBEAT_INTERVAL):
+    '''Yields the body of a status event stream until the broadcaster is closed'''
+    yield f'retry: {RETRY_MS}\n\n'
+    version, status = broadcaster.current()
+    if last_event_id != _event_id(version):
+        yield format_event('status', status, _event_id(version))
+    while not broadcaster.closed:
+        change = broadcaster.wait(version, heartbeat)
+        if change is not None:
+            version, status = change
+            yield format_event('status', status, _event_id(version))
+        elif not broadcaster.closed:
+            _, status = broadcaster.current()
+            beat = {field: status.get(field) for field in HEARTBEAT_FIELDS}
+            yield format_event('heartbeat', {**beat, 'time': time.time()})
+
+status_broadcaster = StatusBroadcaster()
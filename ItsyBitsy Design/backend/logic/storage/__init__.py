@@ -0,0 +1,46 @@
+'''
+Storage for the Drinky Board
+
+Picks the storage backend used by profiles_manager, sequences_manager and
+preferences_manager (see base.py for the interface):
+- DRINKY_STORAGE=json (default): one JSON file per item under data/ (json_backend.py)
+- DRINKY_STORAGE=sqlite: one SQLite database, data/drinky.sqlite3 (sqlite_backend.py)
+
+Until existing JSON data has been migrated into the SQLite database, it is on
+every start (see migrate.py; a failed migration is retried next time); the JSON
+files are left untouched, so switching back still works.
+
+Usage:
+- storage = get_storage(); storage.collection('profiles').items()
+'''
+
+import os
+import threading
+
+STORAGE_BACKEND = os.environ.get('DRINKY_STORAGE', 'json')
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def create_storage(name):
+    if name == 'json':
+        from logic.storage.json_backend import JsonBackend
+        return JsonBackend()
+    if name == 'sqlite':
+        from logic.storage.sqlite_backend import SqliteBackend
+        from logic.storage.migrate import migrate_json_to_sqlite, needs_migration
+        backend = SqliteBackend()
+        if needs_migration(backend):
+            counts = migrate_json_to_sqlite(target=backend)
+            if any(counts.values()):
+                print(f'Migrated JSON data into {backend.path}: {counts}')
+        return backend
+    raise ValueError(f'Unknown storage backend: {name}')
+
+def get_storage():
+    '''Returns the process-wide storage backend selected by DRINKY_STORAGE'''
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage(STORAGE_BACKEND)
+        return _storage
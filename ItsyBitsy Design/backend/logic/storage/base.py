@@ -0,0 +1,92 @@
+'''
+Storage Backend Interface for the Drinky Board
+
+profiles_manager, sequences_manager and preferences_manager talk to storage only
+through these two classes, so the on-disk layout can change without touching them.
+
+A Collection is a named set of JSON documents ('profiles', 'sequences') keyed by
+filename. Entries are {'filename': ..., 'data': {...}} or, for an unreadable
+document, {'filename': ..., 'error': ...}. Readable entries also carry 'rank', the
+item's position key (see ranks.py), or None for items not placed yet.
+
+A StorageBackend owns the collections and the preferences record, and groups
+writes into transactions: everything written inside `with backend.transaction():`
+is committed together (or, where the backend supports it, not at all).
+
+Implementations: json_backend.JsonBackend (one file per item) and
+sqlite_backend.SqliteBackend (one database). Both are abstract base classes, so
+a backend missing a method fails when it is constructed.
+'''
+
+from abc import ABC, abstractmethod
+
+class Collection(ABC):
+    @abstractmethod
+    def filenames(self):
+        '''Returns the filenames of all documents'''
+        raise NotImplementedError
+
+    @abstractmethod
+    def load(self, filename):
+        '''Returns the entry for a filename, or None if there is no such document'''
+        raise NotImplementedError
+
+    def items(self, active=None):
+        '''Returns all entries by rank (unranked documents go last), with isActive
+        derived from the `active` filename. Treat the returned dicts as read-only.'''
+        return self.listing(active)[1]
+
+    @abstractmethod
+    def listing(self, active=None):
+        '''Returns (version, items(active)); the version changes whenever any entry
+        does, so it can tag the list (e.g. as an ETag) without hashing it'''
+        raise NotImplementedError
+
+    @abstractmethod
+    def save(self, filename, data):
+        '''Creates or replaces a document; a new document is ranked last, an existing
+        one keeps its rank'''
+        raise NotImplementedError
+
+    @abstractmethod
+    def move(self, filename, before=None, after=None):
+        '''Re-ranks one document to sit directly before `before` or after `after`;
+        returns False if either does not exist or is unranked'''
+        raise NotImplementedError
+
+    @abstractmethod
+    def unranked(self):
+        '''Returns the filenames of readable documents that have no rank yet'''
+        raise NotImplementedError
+
+    @abstractmethod
+    def rank_unranked(self, order=()):
+        '''Ranks the unranked documents after the ranked ones, in `order` first
+        (then by filename); ranked documents are not touched'''
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, filename):
+        '''Removes a document; returns False if it did not exist'''
+        raise NotImplementedError
+
+class StorageBackend(ABC):
+    name = None
+
+    @abstractmethod
+    def collection(self, name) -> Collection:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_preferences(self):
+        '''Returns a private copy of the stored preferences, or None if none are stored'''
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_preferences(self, preferences):
+        raise NotImplementedError
+
+    @abstractmethod
+    def transaction(self):
+        '''Context manager that commits every write made inside it together'''
+        raise NotImplementedError
@@ -0,0 +1,360 @@
+'''
+JSON File Storage Backend for the Drinky Board
+
+The original layout: one JSON file per item under data/profiles and
+data/sequences, plus data/user_preferences.json.
+
+JsonRepository keeps the parsed contents of a directory of JSON files (one file per
+profile or sequence) in memory, so listing and loading items does not reopen and
+re-parse every file on each request.
+
+Validation is cheap:
+- Every access stats the directory; a changed (mtime, inode) means files were
+  added, removed or replaced, and triggers a rescan that only re-parses files
+  whose own (mtime, inode, size) changed.
+- At most every REVALIDATE_INTERVAL seconds, each file is stat'ed as well, so
+  edits made outside the app (which leave the directory mtime alone) are picked up.
+Writes made through the repository update the cache as they hit the disk, and
+are atomic and durable (see atomic_files.py).
+
+Each file stores its own rank (see ranks.py) as a top-level "rank" key, which is
+kept out of the entry's data. A sorted (rank, filename) index is maintained as
+items are saved, moved and deleted, so listings come out in order without a sort,
+and a move rewrites only the moved file.
+
+Cached data is shared between callers: treat returned dicts as read-only and
+save a copy to make changes.
+
+Which item is active is not stored in the item files: callers keep a single
+pointer (see preferences) and items() derives each item's isActive from it.
+
+The preferences file is cached the same way, keyed on its (mtime, inode, size).
+
+Usage:
+- backend = JsonBackend(); repo = backend.collection('profiles')
+- repo.items(active='x.json') -> [{'filename': ..., 'data': {..., 'isActive': ...}, 'rank': ...}, ...] by rank (unranked files last)
+- repo.load('x.json') -> {'filename': ..., 'data': {...}, 'rank': ...} or {'filename': ..., 'error': ...}, or None
+- repo.save('x.json', data); repo.move('x.json', after='y.json'); repo.delete('x.json')
+- backend.load_preferences(); backend.save_preferences(preferences)
+'''
+
+import bisect
+import copy
+import json
+import os
+import threading
+import time
+from logic.atomic_files import after_commit, delete_file, transaction, write_json
+from logic.storage.base import Collection, StorageBackend
+from logic.storage.ranks import is_rank, moved, rank_between, respread
+
+JSON_DIRECTORIES = {
+    'profiles': 'data/profiles',
+    'sequences': 'data/sequences',
+}
+PREFERENCES_FILE = 'data/user_preferences.json'
+
+REVALIDATE_INTERVAL = 1.0  # Seconds between per-file stat sweeps
+
+def _stat_key(stat):
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+class JsonRepository(Collection):
+    def __init__(self, directory):
+        self.directory = directory
+        self.version = 0  # Bumped whenever any cached entry changes
+        self._lock = threading.RLock()
+        self._entries = {}  # filename -> (stat key, entry); key is None while a write is uncommitted
+        self._ranked = []  # (rank, filename) of every ranked entry, kept sorted
+        self._unranked = set()  # Filenames without a rank (including unreadable files)
+        self._deleting = set()  # Filenames whose delete is uncommitted
+        self._dir_key = None
+        self._last_sweep = 0.0
+        self._sorted = (None, [])  # ((version, active), items) of the last items() call
+
+    def ensure_dir(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def _read(self, filename):
+        try:
+            with open(self._path(filename), 'r') as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            return {'filename': filename, 'error': 'Invalid JSON'}
+        # The rank is stored in the file next to the document but kept out of 'data'
+        rank = data.pop('rank', None) if isinstance(data, dict) else None
+        return {'filename': filename, 'data': data, 'rank': rank if is_rank(rank) else None}
+
+    def _refresh(self):
+        '''Brings the cache in line with the directory; must hold the lock'''
+        self.ensure_dir()
+        dir_stat = os.stat(self.directory)
+        dir_key = (dir_stat.st_mtime_ns, dir_stat.st_ino)
+        now = time.monotonic()
+        if dir_key == self._dir_key and now - self._last_sweep < REVALIDATE_INTERVAL:
+            return
+
+        entries = {}
+        with os.scandir(self.directory) as it:
+            for dir_entry in it:
+                if not dir_entry.name.endswith('.json') or not dir_entry.is_file() or dir_entry.name in self._deleting:
+                    continue
+                key = _stat_key(dir_entry.stat())
+                cached = self._entries.get(dir_entry.name)
+                if cached and cached[0] in (key, None):
+                    entries[dir_entry.name] = cached
+                else:
+                    entries[dir_entry.name] = (key, self._read(dir_entry.name))
+        # Writes still waiting for their commit are not on disk yet
+        for name, cached in self._entries.items():
+            if cached[0] is None and name not in entries:
+                entries[name] = cached
+        if entries.keys() != self._entries.keys() or any(
+            entries[name] is not self._entries[name] for name in entries
+        ):
+            self.version += 1
+            # Files changed outside the app: rebuild the rank index (the only sort)
+            self._ranked = sorted((entry['rank'], name) for name, (_, entry) in entries.items() if entry.get('rank') is not None)
+            self._unranked = {name for name, (_, entry) in entries.items() if entry.get('rank') is None}
+        self._entries = entries
+        self._dir_key = dir_key
+        self._last_sweep = now
+
+    def _link(self, filename, entry):
+        if entry.get('rank') is None:
+            self._unranked.add(filename)
+        else:
+            bisect.insort(self._ranked, (entry['rank'], filename))
+
+    def _unlink(self, filename, entry):
+        if entry.get('rank') is None:
+            self._unranked.discard(filename)
+            return
+        i = bisect.bisect_left(self._ranked, (entry['rank'], filename))
+        if i < len(self._ranked) and self._ranked[i] == (entry['rank'], filename):
+            del self._ranked[i]
+
+    def _stage(self, filename, entry):
+        '''Puts an entry in the cache ahead of its write; must hold the lock'''
+        cached = self._entries.get(filename)
+        if cached:
+            self._unlink(filename, cached[1])
+        self._entries[filename] = (None, entry)
+        self._link(filename, entry)
+        self._deleting.discard(filename)
+        self.version += 1
+
+    def _persist(self, staged):
+        '''Writes staged entries to disk in one transaction; must not hold the lock, so
+        other saves can join the group commit'''
+        with transaction():
+            for i, (filename, entry) in enumerate(staged):
+                try:
+                    write_json(self._path(filename), {**entry['data'], 'rank': entry['rank']})
+                except Exception:
+                    for name, pending in staged[i:]:
+                        self._discard(name, pending)
+                    raise
+                after_commit(
+                    lambda filename=filename, entry=entry: self._committed(filename, entry),
+                    lambda filename=filename, entry=entry: self._discard(filename, entry)
+                )
+
+    def filenames(self):
+        with self._lock:
+            self._refresh()
+            return list(self._entries)
+
+    def load(self, filename):
+        '''Returns the cached entry for a filename, or None if there is no such file'''
+        with self._lock:
+            self._refresh()
+            cached = self._entries.get(filename)
+            return cached[1] if cached else None
+
+    def listing(self, active=None):
+        '''Returns (version, entries by rank (unranked files go last, by filename)), with
+        isActive set only on the `active` filename'''
+        with self._lock:
+            self._refresh()
+            state, items = self._sorted
+            if state == (self.version, active):
+                return self.version, list(items)
+            names = [name for _, name in self._ranked] + sorted(self._unranked)
+            items = []
+            for name in names:
+                entry = self._entries[name][1]
+                if 'data' in entry:
+                    entry = {**entry, 'data': {**entry['data'], 'isActive': name == active}}
+                items.append(entry)
+            self._sorted = ((self.version, active), items)
+            return self.version, list(items)
+
+    def unranked(self):
+        with self._lock:
+            self._refresh()
+            return sorted(name for name in self._unranked if 'data' in self._entries[name][1])
+
+    def _next_rank(self):
+        return rank_between(self._ranked[-1][0] if self._ranked else None, None)
+
+    def save(self, filename, data):
+        '''Writes an item to disk and to the cache; a new item is ranked last'''
+        data = {k: v for k, v in data.items() if k != 'rank'}
+        with self._lock:
+            self._refresh()
+            cached = self._entries.get(filename)
+            rank = cached[1].get('rank') if cached else None
+            entry = {'filename': filename, 'data': data, 'rank': self._next_rank() if rank is None else rank}
+            self._stage(filename, entry)
+        self._persist([(filename, entry)])
+
+    def move(self, filename, before=None, after=None):
+        '''Re-ranks one item next to an anchor; only that file is rewritten, unless its
+        neighbours have no room left and the directory is renumbered'''
+        anchor = before if before is not None else after
+        with self._lock:
+            self._refresh()
+            cached = self._entries.get(filename)
+            anchored = self._entries.get(anchor)
+            if not cached or not anchored or 'data' not in cached[1] or anchored[1].get('rank') is None:
+                return False
+            if anchor == filename:
+                return True
+            i = bisect.bisect_left(self._ranked, (anchored[1]['rank'], anchor))
+            step = -1 if before is not None else 1
+            j = i + step
+            neighbour = None
+            if 0 <= j < len(self._ranked):
+                if self._ranked[j][1] == filename:
+                    return True  # Already there
+                neighbour = self._ranked[j][0]
+            lo, hi = (neighbour, anchored[1]['rank']) if before is not None else (anchored[1]['rank'], neighbour)
+            rank = rank_between(lo, hi)
+            if rank is not None:
+                targets = {filename: rank}
+            else:
+                targets = respread(moved([name for _, name in self._ranked], filename, before, after))
+            staged = []
+            for name, new_rank in targets.items():
+                entry = self._entries[name][1]
+                if entry.get('rank') != new_rank:
+                    entry = {**entry, 'rank': new_rank}
+                    self._stage(name, entry)
+                    staged.append((name, entry))
+        self._persist(staged)
+        return True
+
+    def rank_unranked(self, order=()):
+        with self._lock:
+            self._refresh()
+            pending = [name for name in self._unranked if 'data' in self._entries[name][1]]
+            if not pending:
+                return
+            position = {name: i for i, name in enumerate(order)}
+            pending.sort(key=lambda name: (position.get(name, len(position)), name))
+            staged = []
+            for name in pending:
+                entry = {**self._entries[name][1], 'rank': self._next_rank()}
+                self._stage(name, entry)
+                staged.append((name, entry))
+        self._persist(staged)
+
+    def _committed(self, filename, entry):
+        with self._lock:
+            cached = self._entries.get(filename)
+            if cached and cached[1] is entry:
+                self._entries[filename] = (_stat_key(os.stat(self._path(filename))), entry)
+
+    def _discard(self, filename, entry):
+        '''Forgets a write that never reached the disk'''
+        with self._lock:
+            cached = self._entries.get(filename)
+            if cached and cached[1] is entry:
+                self._unlink(filename, entry)
+                del self._entries[filename]
+                self.version += 1
+            self._dir_key = None  # Rescan to pick up whatever is on disk
+
+    def delete(self, filename):
+        '''Removes an item from disk and from the cache; returns False if it did not exist'''
+        with self._lock:
+            self._refresh()
+            if filename not in self._entries:
+                return False
+            self._unlink(filename, self._entries.pop(filename)[1])
+            self._deleting.add(filename)
+            self.version += 1
+        delete_file(self._path(filename))
+        after_commit(lambda: self._deleting.discard(filename), lambda: self._undelete(filename))
+        return True
+
+    def _undelete(self, filename):
+        with self._lock:
+            self._deleting.discard(filename)
+            self._dir_key = None
+
+class JsonBackend(StorageBackend):
+    name = 'json'
+
+    def __init__(self, directories=JSON_DIRECTORIES, preferences_file=PREFERENCES_FILE):
+        self._collections = {name: JsonRepository(directory) for name, directory in directories.items()}
+        self.preferences_file = preferences_file
+        # Parsed preferences keyed by the file's (mtime, inode, size); reparsed only when the file changes.
+        # The key is None while a save is not yet on disk, so loads return the saved value meanwhile.
+        self._cache = (None, None)
+        self._cache_lock = threading.Lock()
+
+    def collection(self, name):
+        return self._collections[name]
+
+    def transaction(self):
+        return transaction()
+
+    def _file_key(self):
+        try:
+            stat = os.stat(self.preferences_file)
+        except FileNotFoundError:
+            return None
+        return _stat_key(stat)
+
+    def load_preferences(self):
+        with self._cache_lock:
+            if self._cache[1] is not None and self._cache[0] is None:
+                return copy.deepcopy(self._cache[1])
+            key = self._file_key()
+            if key is None:
+                return None
+            if self._cache[0] != key:
+                try:
+                    with open(self.preferences_file, 'r') as f:
+                        self._cache = (key, json.load(f))
+                except json.JSONDecodeError:
+                    return None
+            return copy.deepcopy(self._cache[1])
+
+    def save_preferences(self, preferences):
+        saved = copy.deepcopy(preferences)
+        with self._cache_lock:
+            self._cache = (None, saved)
+        try:
+            write_json(self.preferences_file, preferences)
+        except Exception:
+            self._preferences_discarded(saved)
+            raise
+        after_commit(lambda: self._preferences_committed(saved), lambda: self._preferences_discarded(saved))
+
+    def _preferences_committed(self, saved):
+        with self._cache_lock:
+            if self._cache[1] is saved:
+                self._cache = (self._file_key(), saved)
+
+    def _preferences_discarded(self, saved):
+        # Nothing was written; go back to reading the file
+        with self._cache_lock:
+            if self._cache[1] is saved:
+                self._cache = (None, None)
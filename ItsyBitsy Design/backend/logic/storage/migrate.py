@@ -0,0 +1,90 @@
+'''
+JSON to SQLite Migrator for the Drinky Board
+
+Copies every profile, sequence and the preferences from the JSON file layout into
+the SQLite database in one transaction, which also records MIGRATED_MARKER; if
+it fails nothing is kept, so the next start migrates again. Items keep their order (ranked items by
+rank, then older unranked ones by the legacy order lists in preferences), the
+active item pointers are resolved (older files carried isActive on every item),
+and unreadable JSON files are skipped and reported. The JSON files are not modified.
+
+Run from the backend directory: python -m logic.storage.migrate [--force]
+(--force migrates even if the database already holds items; existing rows with
+the same filename are overwritten.)
+'''
+
+import sys
+import time
+from logic.storage.json_backend import JsonBackend
+from logic.storage.sqlite_backend import SqliteBackend
+
+ACTIVE_KEYS = {
+    'profiles': 'activeProfile',
+    'sequences': 'activeSequence',
+}
+# meta key set (to the migration time) in the same transaction as the migrated data
+MIGRATED_MARKER = 'json_migrated_at'
+# Older versions kept the order as a list of filenames in preferences
+ORDER_KEYS = {
+    'profiles': 'profileOrder',
+    'sequences': 'sequenceOrder',
+}
+
+def needs_migration(target):
+    '''True until JSON data has been migrated into the database'''
+    if target.get_meta(MIGRATED_MARKER) is not None:
+        return False
+    if target.collection('profiles').filenames() or target.collection('sequences').filenames():
+        # Migrated before the marker was recorded; its data may have changed since
+        target.set_meta(MIGRATED_MARKER, 'before marker')
+        return False
+    return True
+
+def migrate_json_to_sqlite(source=None, target=None):
+    '''Copies all JSON data into the SQLite backend; returns counts per collection'''
+    source = source or JsonBackend()
+    target = target or SqliteBackend()
+    preferences = source.load_preferences() or {}
+    counts = {}
+    with target.transaction():
+        for name, order_key in ORDER_KEYS.items():
+            active_key = ACTIVE_KEYS[name]
+            legacy_order = {filename: i for i, filename in enumerate(preferences.pop(order_key, []))}
+            entries = sorted(
+                source.collection(name).items(),
+                key=lambda entry: (entry.get('rank') is None, entry.get('rank') or 0,
+                                   legacy_order.get(entry['filename'], len(legacy_order)))
+            )
+            migrated = skipped = 0
+            for entry in entries:
+                if 'data' not in entry:
+                    print(f'Skipping {name}/{entry["filename"]}: {entry["error"]}')
+                    skipped += 1
+                    continue
+                data = dict(source.collection(name).load(entry['filename'])['data'])
+                # Older versions stored isActive per file; the first active one becomes the pointer
+                if data.pop('isActive', False) and active_key not in preferences:
+                    preferences[active_key] = entry['filename']
+                # Saved in order, so each item is ranked after the previous one
+                target.collection(name).save(entry['filename'], data)
+                migrated += 1
+            preferences.setdefault(active_key, None)
+            counts[name] = migrated
+            if skipped:
+                counts[f'{name}_skipped'] = skipped
+        target.save_preferences(preferences)
+        target.set_meta(MIGRATED_MARKER, time.strftime('%Y-%m-%dT%H:%M:%S'))
+    return counts
+
+def main(argv):
+    target = SqliteBackend()
+    if not target.created and target.collection('profiles').filenames() + target.collection('sequences').filenames():
+        if '--force' not in argv:
+            print(f'{target.path} already has data; rerun with --force to migrate anyway')
+            return 1
+    counts = migrate_json_to_sqlite(target=target)
+    print(f'Migrated into {target.path}: {counts}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
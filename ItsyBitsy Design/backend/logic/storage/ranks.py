@@ -0,0 +1,42 @@
+'''
+Rank Keys for the Drinky Board
+
+The order of profiles and sequences is stored as an integer rank on each item
+instead of one order list in preferences. Ranks are handed out RANK_GAP apart,
+so moving an item only gives that item a new rank between its new neighbours,
+and adding or deleting an item touches nothing else. Only when two neighbours
+have no integer left between them is the whole collection renumbered.
+
+Usage:
+- rank_between(lo, hi) -> a rank strictly between two neighbours (None for no
+  neighbour on that side), or None if there is no room
+- respread(filenames) -> {filename: rank} evenly spaced, for a renumber
+'''
+
+RANK_GAP = 1 << 16
+
+def is_rank(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def rank_between(lo, hi):
+    if lo is None and hi is None:
+        return RANK_GAP
+    if lo is None:
+        return hi - RANK_GAP
+    if hi is None:
+        return lo + RANK_GAP
+    if hi - lo < 2:
+        return None
+    return (lo + hi) // 2
+
+def respread(filenames):
+    return {filename: (i + 1) * RANK_GAP for i, filename in enumerate(filenames)}
+
+def moved(filenames, filename, before=None, after=None):
+    '''Returns `filenames` with `filename` moved directly before `before` or after `after`'''
+    order = [name for name in filenames if name != filename]
+    if before is not None:
+        order.insert(order.index(before), filename)
+    else:
+        order.insert(order.index(after) + 1, filename)
+    return order
@@ -0,0 +1,326 @@
+'''
+SQLite Storage Backend for the Drinky Board
+
+Stores profiles, sequences and preferences in one SQLite database instead of one
+JSON file per item:
+- items(collection, filename, data, position): documents as JSON text, with an
+  index on (collection, position) so listings come back already ordered
+- preferences(key, value): one row per preference, values as JSON text
+- meta(key, value): bookkeeping about the database itself (e.g. when JSON data
+  was migrated into it, see migrate.py)
+
+The position column holds each item's rank (see ranks.py): moving an item updates
+only its own row, and adding or deleting one touches no other rows.
+
+The database runs in WAL mode (readers never block the writer) with
+synchronous=NORMAL. Connections come from a small pool; a transaction pins one
+connection to the current thread, and every write made on that thread joins it.
+
+Parsed documents are cached per collection and dropped whenever this process
+writes; the database is owned by the app, so nothing else invalidates it.
+
+Usage:
+- backend = SqliteBackend('data/drinky.sqlite3')
+- backend.collection('profiles').items(active='x.json')
+- with backend.transaction(): ...
+'''
+
+from contextlib import contextmanager
+import json
+import os
+import queue
+import sqlite3
+import threading
+from logic.storage.base import Collection, StorageBackend
+from logic.storage.ranks import RANK_GAP, moved, rank_between, respread
+
+SQLITE_PATH = 'data/drinky.sqlite3'
+POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+
+COLLECTIONS = ('profiles', 'sequences')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    collection TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    data TEXT NOT NULL,
+    position INTEGER,
+    PRIMARY KEY (collection, filename)
+);
+CREATE INDEX IF NOT EXISTS items_by_position ON items (collection, position);
+CREATE TABLE IF NOT EXISTS preferences (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+class _ConnectionPool:
+    def __init__(self, path, size):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class SqliteCollection(Collection):
+    def __init__(self, backend, name):
+        self.backend = backend
+        self.name = name
+        self._lock = threading.Lock()
+        self._snapshot = (None, {}, [])  # (backend version, filename -> entry, filenames by position)
+        self._sorted = (None, [])        # ((version, active), items) of the last items() call
+
+    def _load_snapshot(self):
+        version = self.backend.version
+        with self._lock:
+            if self._snapshot[0] == version:
+                return self._snapshot
+        with self.backend.connection() as conn:
+            rows = conn.execute(
+                'SELECT filename, data, position FROM items WHERE collection = ? '
+                'ORDER BY position IS NULL, position, filename',
+                (self.name,)
+            ).fetchall()
+        entries = {}
+        for filename, data, position in rows:
+            try:
+                entries[filename] = {'filename': filename, 'data': json.loads(data), 'rank': position}
+            except json.JSONDecodeError:
+                entries[filename] = {'filename': filename, 'error': 'Invalid JSON'}
+        snapshot = (version, entries, [filename for filename, _, _ in rows])
+        with self._lock:
+            # Only cache if nothing was written while we were reading
+            if self.backend.version == version:
+                self._snapshot = snapshot
+        return snapshot
+
+    def filenames(self):
+        return list(self._load_snapshot()[2])
+
+    def load(self, filename):
+        return self._load_snapshot()[1].get(filename)
+
+    def listing(self, active=None):
+        # Rows are already ordered by the indexed position column
+        version, entries, names = self._load_snapshot()
+        with self._lock:
+            if self._sorted[0] == (version, active):
+                return version, list(self._sorted[1])
+        items = [
+            {**entries[name], 'data': {**entries[name]['data'], 'isActive': name == active}}
+            if 'data' in entries[name] else entries[name]
+            for name in names
+        ]
+        with self._lock:
+            self._sorted = ((version, active), items)
+        return version, list(items)
+
+    def save(self, filename, data):
+        data = {k: v for k, v in data.items() if k != 'rank'}
+        with self.backend.transaction() as conn:
+            # A new row is ranked last; an existing one keeps its rank
+            conn.execute(
+                'INSERT INTO items (collection, filename, data, position) VALUES (?, ?, ?, '
+                '(SELECT COALESCE(MAX(position), 0) + ? FROM items WHERE collection = ?)) '
+                'ON CONFLICT (collection, filename) DO UPDATE SET '
+                'data = excluded.data, position = COALESCE(items.position, excluded.position)',
+                (self.name, filename, json.dumps(data), RANK_GAP, self.name)
+            )
+
+    def delete(self, filename):
+        with self.backend.transaction() as conn:
+            cursor = conn.execute('DELETE FROM items WHERE collection = ? AND filename = ?', (self.name, filename))
+            return cursor.rowcount > 0
+
+    def _position(self, conn, filename):
+        return conn.execute(
+            'SELECT position FROM items WHERE collection = ? AND filename = ?', (self.name, filename)
+        ).fetchone()
+
+    def move(self, filename, before=None, after=None):
+        anchor = before if before is not None else after
+        with self.backend.transaction() as conn:
+            row, anchored = self._position(conn, filename), self._position(conn, anchor)
+            if row is None or anchored is None or anchored[0] is None:
+                return False
+            if anchor == filename:
+                return True
+            if before is not None:
+                neighbour = conn.execute(
+                    'SELECT filename, position FROM items WHERE collection = ? AND (position, filename) < (?, ?) '
+                    'ORDER BY position DESC, filename DESC LIMIT 1',
+                    (self.name, anchored[0], anchor)
+                ).fetchone()
+            else:
+                neighbour = conn.execute(
+                    'SELECT filename, position FROM items WHERE collection = ? AND (position, filename) > (?, ?) '
+                    'ORDER BY position, filename LIMIT 1',
+                    (self.name, anchored[0], anchor)
+                ).fetchone()
+            if neighbour and neighbour[0] == filename:
+                return True  # Already there
+            neighbour = neighbour[1] if neighbour else None
+            lo, hi = (neighbour, anchored[0]) if before is not None else (anchored[0], neighbour)
+            rank = rank_between(lo, hi)
+            if rank is not None:
+                targets = {filename: rank}
+            else:
+                # No room between the neighbours: renumber the collection
+                ranked = conn.execute(
+                    'SELECT filename FROM items WHERE collection = ? AND position IS NOT NULL ORDER BY position, filename',
+                    (self.name,)
+                ).fetchall()
+                targets = respread(moved([name for (name,) in ranked], filename, before, after))
+            conn.executemany(
+                'UPDATE items SET position = ? WHERE collection = ? AND filename = ?',
+                [(position, self.name, name) for name, position in targets.items()]
+            )
+        return True
+
+    def unranked(self):
+        with self.backend.connection() as conn:
+            rows = conn.execute(
+                'SELECT filename FROM items WHERE collection = ? AND position IS NULL ORDER BY filename',
+                (self.name,)
+            ).fetchall()
+        return [filename for (filename,) in rows]
+
+    def rank_unranked(self, order=()):
+        position = {name: i for i, name in enumerate(order)}
+        with self.backend.transaction() as conn:
+            pending = sorted(self.unranked(), key=lambda name: (position.get(name, len(position)), name))
+            last = conn.execute(
+                'SELECT COALESCE(MAX(position), 0) FROM items WHERE collection = ?', (self.name,)
+            ).fetchone()[0]
+            conn.executemany(
+                'UPDATE items SET position = ? WHERE collection = ? AND filename = ?',
+                [(last + (i + 1) * RANK_GAP, self.name, name) for i, name in enumerate(pending)]
+            )
+
+class SqliteBackend(StorageBackend):
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH, pool_size=POOL_SIZE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.created = not os.path.exists(path)  # True if this call creates the database
+        self.version = 0  # Bumped on every write (and rollback) to invalidate cached snapshots
+        self._version_lock = threading.Lock()
+        self._pool = _ConnectionPool(path, pool_size)
+        self._local = threading.local()
+        self._collections = {name: SqliteCollection(self, name) for name in COLLECTIONS}
+        with self._pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _bump(self):
+        with self._version_lock:
+            self.version += 1
+
+    def collection(self, name):
+        return self._collections[name]
+
+    @contextmanager
+    def connection(self):
+        '''The current transaction's connection, or a pooled one for a read'''
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        with self._pool.connection() as conn:
+            yield conn
+
+    @contextmanager
+    def transaction(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            # Nested: join the outer transaction
+            self._bump()
+            yield conn
+            return
+        with self._pool.connection() as conn:
+            self._local.conn = conn
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                self._bump()
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+            finally:
+                self._local.conn = None
+                # Snapshots taken during the transaction may hold uncommitted or rolled back rows
+                self._bump()
+
+    def load_preferences(self):
+        with self.connection() as conn:
+            rows = conn.execute('SELECT key, value FROM preferences').fetchall()
+        if not rows:
+            return None
+        return {key: json.loads(value) for key, value in rows}
+
+    def save_preferences(self, preferences):
+        with self.transaction() as conn:
+            stored = [(key, json.dumps(value)) for key, value in preferences.items()]
+            conn.execute(
+                f'DELETE FROM preferences WHERE key NOT IN ({", ".join("?" * len(stored))})',
+                [key for key, _ in stored]
+            )
+            conn.executemany(
+                'INSERT INTO preferences (key, value) VALUES (?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+                stored
+            )
+
+    def get_meta(self, key):
+        '''Returns a bookkeeping value, or None if it was never set'''
+        with self.connection() as conn:
+            row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        '''Sets a bookkeeping value (inside the current transaction, if any)'''
+        with self.transaction() as conn:
+            conn.execute(
+                'INSERT INTO meta (key, value) VALUES (?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET value = excluded.value',
+                (key, value)
+            )
+
+    def close(self):
+        self._pool.close()
@@ -0,0 +1,137 @@
+'''
+Typing Timing Model for the Drinky Board
+
+This module turns profile settings into humanized key timings:
+- wpm / wpmVariation: typing speed, varied uniformly by +/- wpmVariation per key
+- keyDuration / keyDurationVariation: hold time in ms, varied by +/- keyDurationVariation
+
+Timings are pre-sampled in batches into array('d') buffers from a seeded
+random.Random, so drawing a timing is an index into a buffer rather than an RNG
+call per keystroke. A batch is refilled only when exhausted.
+
+The model for the active profile is cached; call invalidate_active_timing_model()
+whenever profiles change.
+
+Usage:
+- model = TimingModel.from_profile(profile_data, seed=1234)
+- model.next_interval() -> seconds from one press to the next
+- model.next_hold() -> seconds a key stays pressed
+- get_active_timing_model() -> model for the active profile (or defaults)
+'''
+
+from array import array
+import random
+import threading
+from logic.profiles_manager import get_active_profile, load_profile
+
+DEFAULT_WPM = 60
+DEFAULT_KEY_DURATION_MS = 100
+MIN_WPM = 1.0            # Sampled speeds never drop below this
+MIN_HOLD_SECONDS = 0.005  # Shortest hold the matrix switches reliably register
+MIN_KEY_GAP = 0.005       # Seconds between a release and the next press, so repeats register
+DEFAULT_BATCH_SIZE = 512
+
+class TimingModel:
+    def __init__(self, wpm=DEFAULT_WPM, wpm_variation=0, key_duration=DEFAULT_KEY_DURATION_MS,
+                 key_duration_variation=0, seed=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.wpm = float(wpm)
+        self.wpm_variation = abs(float(wpm_variation))
+        self.key_duration = float(key_duration)
+        self.key_duration_variation = abs(float(key_duration_variation))
+        self.batch_size = batch_size
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._intervals = array('d')
+        self._holds = array('d')
+        self._interval_index = 0
+        self._hold_index = 0
+
+    @classmethod
+    def from_profile(cls, profile, seed=None):
+        '''Builds a model from a profile (or sequence) dict using its wpm/keyDuration fields'''
+        return cls(
+            wpm=profile.get('wpm') or DEFAULT_WPM,
+            wpm_variation=profile.get('wpmVariation') or 0,
+            key_duration=profile.get('keyDuration') or DEFAULT_KEY_DURATION_MS,
+            key_duration_variation=profile.get('keyDurationVariation') or 0,
+            seed=seed
+        )
+
+    def _sample_intervals(self, count):
+        low = max(MIN_WPM, self.wpm - self.wpm_variation)
+        high = max(low, self.wpm + self.wpm_variation)
+        uniform = self._rng.uniform
+        # A "word" is five characters, so seconds per key = 60 / (wpm * 5)
+        return array('d', [12.0 / uniform(low, high) for _ in range(count)])
+
+    def _sample_holds(self, count):
+        low = max(MIN_HOLD_SECONDS * 1000, self.key_duration - self.key_duration_variation)
+        high = max(low, self.key_duration + self.key_duration_variation)
+        uniform = self._rng.uniform
+        return array('d', [uniform(low, high) / 1000.0 for _ in range(count)])
+
+    def intervals(self, count):
+        '''Returns the next `count` inter-key intervals (seconds) as an array'''
+        with self._lock:
+            result = array('d')
+            while len(result) < count:
+                if self._interval_index >= len(self._intervals):
+                    self._intervals = self._sample_intervals(max(self.batch_size, count - len(result)))
+                    self._interval_index = 0
+                take = min(count - len(result), len(self._intervals) - self._interval_index)
+                result.extend(self._intervals[self._interval_index:self._interval_index + take])
+                self._interval_index += take
+            return result
+
+    def holds(self, count):
+        '''Returns the next `count` hold times (seconds) as an array'''
+        with self._lock:
+            result = array('d')
+            while len(result) < count:
+                if self._hold_index >= len(self._holds):
+                    self._holds = self._sample_holds(max(self.batch_size, count - len(result)))
+                    self._hold_index = 0
+                take = min(count - len(result), len(self._holds) - self._hold_index)
+                result.extend(self._holds[self._hold_index:self._hold_index + take])
+                self._hold_index += take
+            return result
+
+    def next_interval(self):
+        with self._lock:
+            if self._interval_index >= len(self._intervals):
+                self._intervals = self._sample_intervals(self.batch_size)
+                self._interval_index = 0
+            value = self._intervals[self._interval_index]
+            self._interval_index += 1
+            return value
+
+    def next_hold(self):
+        with self._lock:
+            if self._hold_index >= len(self._holds):
+                self._holds = self._sample_holds(self.batch_size)
+                self._hold_index = 0
+            value = self._holds[self._hold_index]
+            self._hold_index += 1
+            return value
+
+_active_model = None
+_active_model_lock = threading.Lock()
+
+def get_active_timing_model():
+    '''Returns the cached model for the active profile, building it on first use'''
+    global _active_model
+    with _active_model_lock:
+        if _active_model is None:
+            filename = get_active_profile()
+            try:
+                active = load_profile(filename) if filename else None
+            except ValueError:
+                active = None  # Corrupted profile file; fall back to defaults
+            _active_model = TimingModel.from_profile(active) if active else TimingModel()
+        return _active_model
+
+def invalidate_active_timing_model():
+    '''Drops the cached model so the next call picks up profile changes'''
+    global _active_model
+    with _active_model_lock:
+        _active_model = None
@@ -1,52 +1,29 @@
-from flask import Blueprint, jsonify
-from app import VERBOSE
+from flask import Blueprint, Response, jsonify, request
+from logic.device_pool import device_pool
+from logic.status_broadcaster import status_broadcaster, status_events
 
 bp = Blueprint('connection_status', __name__)
 
-def get_itsy_device():
-    import app
-    return app.itsy_device
-
 @bp.route('/connection_status')
 def connection_status():
-    itsy_device = get_itsy_device()
-    
-    if VERBOSE:
-        print(f'Connection status check - Device: {itsy_device}')
-        print(f'Device port: {itsy_device.port if itsy_device else "None"}')
-    
-    if not itsy_device:
-        if VERBOSE:
-            print('No device found')
-        return jsonify({
-            'connected': False,
-            'status': 'disconnected',
-            'message': 'No device found',
-            'port': None,
-            'last_heartbeat': None
-        })
-    
-    # Check if device is actually connected and responsive
-    is_connected = itsy_device.is_connected()
-    if VERBOSE:
-        print(f'Device on {itsy_device.port} - Connected: {is_connected}')
-    
-    if is_connected:
-        if VERBOSE:
-            print('Returning connected status')
-        return jsonify({
-            'connected': True,
-            'status': 'connected',
-            'message': f'Device connected on port {itsy_device.port}',
-            'port': itsy_device.port,
-            'last_heartbeat': itsy_device.last_heartbeat
-        })
-    else:
-        print('Returning unresponsive status')
-        return jsonify({
-            'connected': False,
-            'status': 'unresponsive',
-            'message': f'Device on port {itsy_device.port} is not responding',
-            'port': itsy_device.port,
-            'last_heartbeat': itsy_device.last_heartbeat
-        }) 
\ No newline at end of file
+    '''Latest status as published by the drinky_manager thread (for clients without EventSource)'''
+    _, status = status_broadcaster.current()
+    return jsonify(status)
+
+@bp.route('/connection_status/devices')
+def connection_status_devices():
+    '''Every connected board with its health, heartbeat, queue depth and the keys it holds'''
+    return jsonify({
+        'message': f'{len(device_pool)} device(s) connected',
+        'success': True,
+        'devices': device_pool.summary(details=True)
+    })
+
+@bp.route('/connection_status/stream')
+def connection_status_stream():
+    '''Server-Sent Events: 'status' on every transition, 'heartbeat' in between'''
+    events = status_events(status_broadcaster, request.headers.get('Last-Event-ID'))
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -1,112 +1,214 @@
+import json
 from flask import Blueprint, jsonify, request
+from app import sock
+from logic.device_pool import device_pool
+from logic.itsybitsy_device import BLOCK
 from logic.keymaps.key_definitions import KEYS
-from time import sleep
+from logic.keymaps.key_index import lookup_web_client_code
+from logic.timing_model import MIN_KEY_GAP, get_active_timing_model
 
 bp = Blueprint('direct_input', __name__, url_prefix='/direct_input')
 
-def get_itsy_device():
+# Both sides of each modifier are sent to the left-hand switch on the board
+MODIFIER_KEYS = {
+    'ControlLeft': KEYS.LEFT_CTRL,
+    'ControlRight': KEYS.LEFT_CTRL,
+    'ShiftLeft': KEYS.LEFT_SHIFT,
+    'ShiftRight': KEYS.LEFT_SHIFT,
+    'AltLeft': KEYS.LEFT_ALT,
+    'AltRight': KEYS.LEFT_ALT,
+    'MetaLeft': KEYS.LEFT_WINDOWS,
+    'MetaRight': KEYS.LEFT_WINDOWS,
+}
+
+# Channel batches keep the spacing of their client timestamps, up to this many seconds per gap
+MAX_EVENT_SPACING = 1.0
+# Seconds a key event or channel batch waits for room in a full device queue before it is rejected
+QUEUE_TIMEOUT = 1.0
+
+def get_devices(target=None):
+    '''Connected devices for a request's optional device (a key or 'all'; None for the primary device);
+    KeyError for an unknown key'''
+    return [device for _, device in device_pool.targets(target) if device.is_connected()]
+
+def key_event_frames(itsy_device, code, event_type, offset=0.0):
+    '''Resolves one key event to (offset, frame) pairs and its result for the client.
+
+    Updates the held modifiers; the pairs are empty for events that send nothing.'''
     import app
-    return app.itsy_device
+    # Handle modifier keys (auto-repeated keydowns are dropped by the device's key state)
+    modifier_key = MODIFIER_KEYS.get(code)
+    if modifier_key is not None:
+        frames = []
+        if event_type == 'keydown':
+            app.active_modifiers.add(code)
+            frames.append((offset, itsy_device.frame(modifier_key, 'PRESS')))
+        elif event_type == 'keyup':
+            app.active_modifiers.discard(code)
+            frames.append((offset, itsy_device.frame(modifier_key, 'RELEASE')))
+        return frames, {
+            'message': f'Modifier key {code} {event_type}',
+            'success': True,
+            'code': code,
+            'modifiers': list(app.active_modifiers)
+        }
+
+    # Resolve the code through the prebuilt web client index
+    match = lookup_web_client_code(code)
+    if not match:
+        return [], {
+            'message': f'No matching key found for code: {code}',
+            'success': False,
+            'code': code
+        }
+    matching_key, matching_key_obj = match
+
+    # Send device no commands (as of current hardware design) for non-modifier keyup events
+    if event_type == 'keyup':
+        return [], {
+            'message': f'Found matching key: {matching_key}, performed no action for event {event_type}',
+            'success': True,
+            'code': code,
+            'modifiers': list(app.active_modifiers)
+        }
+
+    # PRESS and the timed RELEASE go out together; the device writer thread handles the hold
+    hold = get_active_timing_model().next_hold()
+    return [(offset, itsy_device.frame(matching_key_obj, 'PRESS')),
+            (offset + hold, itsy_device.frame(matching_key_obj, 'RELEASE'))], {
+        'message': f'Found matching key: {matching_key}',
+        'success': True,
+        'code': code,
+        'matching_key': matching_key,
+        'modifiers': list(app.active_modifiers)
+    }
 
 @bp.route('/listen', methods=['GET', 'POST'])
 def direct_input():
-    import app
     try:
-        itsy_device = get_itsy_device()
-
-        def handleModifier(modifier: str, action: str):
-            if modifier in ['ControlLeft', 'ControlRight']:
-                itsy_device.send_command(KEYS.LEFT_CTRL, action)
-            elif modifier in ['ShiftLeft', 'ShiftRight']:
-                itsy_device.send_command(KEYS.LEFT_SHIFT, action)
-            elif modifier in ['AltLeft', 'AltRight']:
-                itsy_device.send_command(KEYS.LEFT_ALT, action)
-            elif modifier in ['MetaLeft', 'MetaRight']:
-                itsy_device.send_command(KEYS.LEFT_WINDOWS, action)
-
         if request.method == 'POST':
             # Handle POST request with key data
             data = request.get_json()
             code = data.get('code', '')
             additional_data = data.get('data', [])
             event_type = data.get('type', 'keydown')  # 'keydown' or 'keyup'
-            
-            # Handle modifier keys
-            modifier_keys = {'ControlLeft', 'ControlRight', 'ShiftLeft', 'ShiftRight', 'AltLeft', 'AltRight', 'MetaLeft', 'MetaRight'}
-            if code in modifier_keys:
-                if event_type == 'keydown':
-                    app.active_modifiers.add(code)
-                    handleModifier(code, 'PRESS')
-                elif event_type == 'keyup':
-                    app.active_modifiers.discard(code)
-                    handleModifier(code, 'RELEASE')
-                print(f"Modifier state: {app.active_modifiers}")
+            try:
+                devices = get_devices(data.get('device'))
+            except KeyError as e:
                 return jsonify({
-                    'message': f'Modifier key {code} {event_type}',
-                    'success': True,
-                    'code': code,
-                    'modifiers': list(app.active_modifiers)
-                })
-            
-            # Search through KEYS object to find matching key
-            matching_key = None
-            matching_key_obj = None
-            for key_name, key_obj in vars(KEYS).items():
-                if hasattr(key_obj, 'string_aliases') and hasattr(key_obj.string_aliases, 'web_client'):
-                    if code in key_obj.string_aliases.web_client:
-                        matching_key = key_name
-                        matching_key_obj = key_obj
-                        break
-            
-            if matching_key:
-                print(f"Found matching key: {matching_key}")
-
-                # Send device no commands (as of current hardware design) for non-modifier keyup events
-                if event_type == 'keyup':
-                    return jsonify({
-                        'message': f'Found matching key: {matching_key}, performed no action for event {event_type}',
-                        'success': True,
-                        'code': code,
-                        'modifiers': list(app.active_modifiers)
-                    })
-
-                # Check if command was sent successfully (PRESS)
-                if not itsy_device.send_command(matching_key_obj, 'PRESS'):
-                    return jsonify({
-                        'message': 'Device disconnected',
-                        'success': False,
-                        'device_disconnected': True
-                    }), 500
-                sleep(0.02)
-
-                # Check if command was sent successfully (RELEASE)
-                if not itsy_device.send_command(matching_key_obj, 'RELEASE'):
-                    return jsonify({
-                        'message': 'Device disconnected',
-                        'success': False,
-                        'device_disconnected': True
-                    }), 500
-                sleep(0.02)
-
-                # Only return success if both commands succeeded
+                    'message': e.args[0],
+                    'success': False
+                }), 404
+
+            if not devices:
                 return jsonify({
-                    'message': f'Found matching key: {matching_key}',
-                    'success': True,
-                    'code': code,
-                    'matching_key': matching_key,
-                    'data': additional_data,
-                    'modifiers': list(app.active_modifiers)
-                })
-            else:
-                print(f"No matching key found for code: {code}")
+                    'message': 'Device disconnected',
+                    'success': False,
+                    'device_disconnected': True
+                }), 500
+
+            # Every targeted board gets its own frames; the result is the same for each
+            queued = []
+            for itsy_device in devices:
+                frames, result = key_event_frames(itsy_device, code, event_type)
+                queued.append(not frames or itsy_device.enqueue(frames, BLOCK, QUEUE_TIMEOUT))
+            print(result['message'])
+
+            # Only return success if the frames were queued
+            if not all(queued):
                 return jsonify({
-                    'message': f'No matching key found for code: {code}',
+                    'message': 'Device disconnected',
                     'success': False,
-                    'code': code,
-                    'data': additional_data
-                })
+                    'device_disconnected': True
+                }), 500
+
+            # Key presses and unknown codes echo the client's data
+            if 'modifiers' not in result or 'matching_key' in result:
+                result['data'] = additional_data
+            return jsonify(result)
     except Exception as e:
         return jsonify({
             'message': str(e),
             'success': False
         }), 500
+
+def _batch_frames(itsy_device, events):
+    '''(offset, frame) pairs for a batch of events, spaced as their client timestamps were'''
+    frames, results = [], []
+    offset, previous = 0.0, None
+    released_at = None
+    for event in events:
+        stamp = event.get('t')
+        if isinstance(stamp, (int, float)) and isinstance(previous, (int, float)):
+            offset += min(max(stamp - previous, 0.0) / 1000.0, MAX_EVENT_SPACING)
+        previous = stamp
+        # Like separate taps, nothing happens before the previous key is back up
+        if released_at is not None:
+            offset = max(offset, released_at + MIN_KEY_GAP)
+        event_frames, result = key_event_frames(itsy_device, event.get('code', ''), event.get('type', 'keydown'), offset)
+        if len(event_frames) > 1:
+            released_at = event_frames[-1][0]
+        frames.extend(event_frames)
+        result.pop('modifiers', None)
+        results.append(result)
+    return frames, results
+
+@sock.route('/direct_input/ws')
+def direct_input_channel(ws):
+    '''Persistent direct input channel: ordered batches of key events in, acknowledgements out.
+
+    Client -> server: {"seq": 1, "events": [{"code": "KeyA", "type": "keydown", "t": 1032.5}, ...]}
+    (t is the client's event timestamp in ms, e.g. KeyboardEvent.timeStamp)
+    Server -> client: {"ack": 1, "success": true, "results": [...], "modifiers": [...]}
+
+    Each batch becomes one device queue item, so batches reach the board in the
+    order they were sent and keep their spacing. Clients send without waiting
+    for acknowledgements. A batch may name a "device" (a key, or "all") to go
+    to other boards than the primary one.'''
+    import app
+    while True:
+        message = ws.receive()
+        if message is None:
+            break
+        try:
+            batch = json.loads(message)
+            seq, events = batch.get('seq'), batch.get('events')
+            if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+                raise ValueError('events must be a list of objects')
+        except (ValueError, AttributeError) as e:
+            ws.send(json.dumps({'ack': None, 'success': False, 'message': f'Invalid batch: {e}'}))
+            continue
+
+        try:
+            devices = get_devices(batch.get('device'))
+            if not devices:
+                ws.send(json.dumps({
+                    'ack': seq,
+                    'message': 'Device disconnected',
+                    'success': False,
+                    'device_disconnected': True
+                }))
+                continue
+
+            rejected = []
+            for itsy_device in devices:
+                frames, results = _batch_frames(itsy_device, events)
+                if frames and not itsy_device.enqueue(frames, BLOCK, QUEUE_TIMEOUT):
+                    rejected.append(itsy_device)
+            if rejected:
+                ws.send(json.dumps({
+                    'ack': seq,
+                    'message': 'Device queue full or disconnected',
+                    'success': False,
+                    'device_disconnected': any(itsy_device.failed for itsy_device in rejected)
+                }))
+                continue
+
+            ws.send(json.dumps({
+                'ack': seq,
+                'success': all(result['success'] for result in results),
+                'results': results,
+                'modifiers': list(app.active_modifiers)
+            }))
+        except Exception as e:
+            ws.send(json.dumps({'ack': seq, 'message': str(e), 'success': False}))
@@ -1,27 +1,52 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
+from logic.device_pool import device_pool
 from logic.keymaps.key_definitions import KEYS
-from time import sleep
+from logic.timing_model import MIN_KEY_GAP, get_active_timing_model
 
 bp = Blueprint('output_tests', __name__, url_prefix='/output_tests')
 
-def get_itsy_device():
+def get_sequence_player():
     import app
-    return app.itsy_device
+    return app.sequence_player
 
 @bp.route('/alphabet')
 def output_tests():
+    '''Types the alphabet on the primary device, or ?device=<key> (or all).
+    It plays through the sequence player, so it replaces a playing sequence and /sequences/stop ends it.'''
     try:
-        itsy_device = get_itsy_device()
+        try:
+            targets = device_pool.targets(request.args.get('device'))
+        except KeyError as e:
+            return jsonify({
+                'message': e.args[0],
+                'success': False
+            }), 404
 
         alphabet = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x', 'y', 'z']
 
-        for letter in alphabet:
+        # Timings for the whole run are drawn from the active profile in one batch
+        timing = get_active_timing_model()
+        intervals = timing.intervals(len(alphabet))
+        holds = timing.holds(len(alphabet))
+
+        # Schedule the whole run against absolute deadlines so the request returns without waiting on the hardware
+        events = []
+        offset = 0.0
+        for i, letter in enumerate(alphabet):
             keymap = getattr(KEYS, letter.capitalize())
             if keymap is not None:
-                itsy_device.send_command(keymap, 'PRESS')
-                sleep(0.02)
-                itsy_device.send_command(keymap, 'RELEASE')
-                sleep(0.02)
+                events.append((offset, keymap, 'PRESS'))
+                events.append((offset + holds[i], keymap, 'RELEASE'))
+                offset += max(intervals[i], holds[i] + MIN_KEY_GAP)
+        targets = [(key, device) for key, device in targets if device.is_connected()]
+        if not targets:
+            return jsonify({
+                'message': 'Device disconnected',
+                'success': False,
+                'device_disconnected': True
+            }), 500
+        # One scheduler per board, so boards type in parallel
+        get_sequence_player().play_events(targets, 'Output test: Alphabet', events)
         return jsonify({
             'message': 'Performed output test: "Alphabet"',
             'success': True
@@ -1,5 +1,7 @@
 from flask import Blueprint, jsonify, request
-from logic.preferences_manager import load_preferences, save_preferences, get_default_preferences
+from logic.preferences_manager import load_preferences, patch_preferences, reset_preferences as reset_stored_preferences
+from logic.profiles_manager import load_all_profiles, move_profile, reorder_profiles
+from logic.sequences_manager import load_all_sequences, move_sequence, reorder_sequences
 
 bp = Blueprint('preferences', __name__, url_prefix='/preferences')
 
@@ -21,22 +23,18 @@ def get_preferences():
 
 @bp.route('/update', methods=['PUT'])
 def update_preferences():
-    '''Update user preferences'''
+    '''Update user preferences with a JSON merge patch (keys set to null are removed)'''
     try:
-        preferences = load_preferences()
         updates = request.get_json()
         
-        if not updates:
+        if not updates or not isinstance(updates, dict):
             return jsonify({
                 'message': 'No preference data provided',
                 'success': False
             }), 400
         
-        # Merge updates with existing preferences
-        preferences.update(updates)
-        
-        # Save updated preferences
-        save_preferences(preferences)
+        # Applied in memory under the store's lock; the write to disk follows shortly
+        preferences = patch_preferences(updates)
         
         return jsonify({
             'message': 'Preferences updated successfully',
@@ -49,26 +47,40 @@ def update_preferences():
             'success': False
         }), 500
 
-@bp.route('/update_profile_order', methods=['PUT'])
-def update_profile_order():
-    '''Update the order of profiles in the UI'''
-    try:
-        preferences = load_preferences()
-        profile_order = request.get_json()
-        
-        if not isinstance(profile_order, list):
+def _apply_order(payload, move, reorder):
+    '''Applies an order update: one move {filename, before|after}, a list of moves, or
+    (the old API) a whole list of filenames. Returns an error response, or None.'''
+    if isinstance(payload, list) and all(isinstance(filename, str) for filename in payload):
+        reorder(payload)
+        return None
+    moves = payload if isinstance(payload, list) else [payload]
+    for op in moves:
+        if not isinstance(op, dict) or not isinstance(op.get('filename'), str) or \
+                (op.get('before') is None) == (op.get('after') is None):
             return jsonify({
-                'message': 'Profile order must be a list',
+                'message': 'Order must be a move {filename, before or after}, a list of moves, or a list of filenames',
                 'success': False
             }), 400
-        
-        preferences['profileOrder'] = profile_order
-        save_preferences(preferences)
+    for op in moves:
+        if not move(op['filename'], before=op.get('before'), after=op.get('after')):
+            return jsonify({
+                'message': f'Cannot move {op["filename"]}: it or its anchor was not found',
+                'success': False
+            }), 404
+    return None
+
+@bp.route('/update_profile_order', methods=['PUT'])
+def update_profile_order():
+    '''Move profiles in the UI order; only the moved profiles are rewritten'''
+    try:
+        error = _apply_order(request.get_json(), move_profile, reorder_profiles)
+        if error:
+            return error
         
         return jsonify({
             'message': 'Profile order updated successfully',
             'success': True,
-            'profileOrder': profile_order
+            'profileOrder': [profile['filename'] for profile in load_all_profiles()]
         })
     except Exception as e:
         return jsonify({
@@ -78,24 +90,16 @@ def update_profile_order():
     
 @bp.route('/update_sequence_order', methods=['PUT'])
 def update_sequence_order():
-    '''Update the order of sequences in the UI'''
+    '''Move sequences in the UI order; only the moved sequences are rewritten'''
     try:
-        preferences = load_preferences()
-        sequence_order = request.get_json()
-        
-        if not isinstance(sequence_order, list):
-            return jsonify({
-                'message': 'Sequence order must be a list',
-                'success': False
-            }), 400
-        
-        preferences['sequenceOrder'] = sequence_order
-        save_preferences(preferences)
+        error = _apply_order(request.get_json(), move_sequence, reorder_sequences)
+        if error:
+            return error
         
         return jsonify({
             'message': 'Sequence order updated successfully',
             'success': True,
-            'sequenceOrder': sequence_order
+            'sequenceOrder': [sequence['filename'] for sequence in load_all_sequences()]
         })
     except Exception as e:
         return jsonify({
@@ -105,15 +109,14 @@ def update_sequence_order():
 
 @bp.route('/reset', methods=['POST'])
 def reset_preferences():
-    '''Reset preferences to defaults'''
+    '''Reset preferences to defaults (the active profile and sequence stay active)'''
     try:
-        default_prefs = get_default_preferences()
-        save_preferences(default_prefs)
+        preferences = reset_stored_preferences()
         
         return jsonify({
             'message': 'Preferences reset to defaults',
             'success': True,
-            'preferences': default_prefs
+            'preferences': preferences
         })
     except Exception as e:
         return jsonify({
@@ -1,20 +1,39 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
+from logic.pagination import PageQuery
 from logic.profiles_manager import (
-    load_all_profiles, load_profile, save_profile, delete_profile,
-    add_profile, edit_profile, deactivate_all_except
+    list_profiles, load_profile, save_profile, delete_profile,
+    add_profile, edit_profile, set_active_profile
 )
+from logic.timing_model import invalidate_active_timing_model
 
 bp = Blueprint('profiles', __name__, url_prefix='/profiles')
 
 @bp.route('/get_all')
 def get_all():
+    '''List profiles; optional offset, limit, cursor and fields (e.g. fields=name,isActive).
+    Answers 304 when If-None-Match matches the list's ETag.'''
     try:
-        profiles = load_all_profiles()
-        return jsonify({
-            'message': 'Profiles loaded successfully',
-            'success': True,
-            'profiles': profiles
-        })
+        try:
+            query = PageQuery.from_args(request.args)
+        except ValueError as e:
+            return jsonify({
+                'message': str(e),
+                'success': False
+            }), 400
+        
+        page = list_profiles(query)
+        if request.if_none_match.contains(page.etag):
+            response = Response(status=304)
+        else:
+            response = jsonify({
+                'message': 'Profiles loaded successfully',
+                'success': True,
+                'profiles': page.items,
+                'total': page.total,
+                'nextCursor': page.next_cursor
+            })
+        response.set_etag(page.etag)
+        return response
     except Exception as e:
         return jsonify({
             'message': str(e),
@@ -38,6 +57,7 @@ def add():
                     'success': False
                 }), 400
         filename = add_profile(profile_data)
+        invalidate_active_timing_model()
         return jsonify({
             'message': 'Profile added successfully',
             'success': True,
@@ -59,6 +79,7 @@ def delete(filename):
                 'success': False
             }), 400
         deleted = delete_profile(filename)
+        invalidate_active_timing_model()
         if not deleted:
             return jsonify({
                 'message': 'Profile not found',
@@ -97,6 +118,7 @@ def edit(filename):
                     'success': False
                 }), 400
         edited = edit_profile(filename, profile_data)
+        invalidate_active_timing_model()
         if not edited:
             return jsonify({
                 'message': 'Profile not found or corrupted',
@@ -122,17 +144,17 @@ def deactivate_except(filename):
                 'message': 'Invalid filename',
                 'success': False
             }), 400
-        updated_count = deactivate_all_except(filename)
-        if updated_count == 0:
+        activated = set_active_profile(filename)
+        invalidate_active_timing_model()
+        if not activated:
             return jsonify({
-                'message': 'No profiles updated (target not found?)',
+                'message': 'Profile not found or corrupted',
                 'success': False
             }), 404
         return jsonify({
-            'message': f'Successfully updated {updated_count} profiles. Only {filename} is now active.',
+            'message': f'Only {filename} is now active.',
             'success': True,
-            'active_profile': filename,
-            'profiles_updated': updated_count
+            'active_profile': filename
         })
     except Exception as e:
         return jsonify({
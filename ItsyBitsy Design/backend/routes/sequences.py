@@ -1,20 +1,40 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
+from logic.pagination import PageQuery
 from logic.sequences_manager import (
-    load_all_sequences, load_sequence, save_sequence, delete_sequence,
-    add_sequence, edit_sequence, deactivate_all_except
+    list_sequences, load_sequence, save_sequence, delete_sequence,
+    add_sequence, edit_sequence, set_active_sequence
 )
+from logic.device_pool import device_pool
+from logic.sequence_player import SequenceError
 
 bp = Blueprint('sequences', __name__, url_prefix='/sequences')
 
 @bp.route('/get_all')
 def get_all():
+    '''List sequences; optional offset, limit, cursor and fields (e.g. fields=name,isActive).
+    Answers 304 when If-None-Match matches the list's ETag.'''
     try:
-        sequences = load_all_sequences()
-        return jsonify({
-            'message': 'Sequences loaded successfully',
-            'success': True,
-            'sequences': sequences
-        })
+        try:
+            query = PageQuery.from_args(request.args)
+        except ValueError as e:
+            return jsonify({
+                'message': str(e),
+                'success': False
+            }), 400
+        
+        page = list_sequences(query)
+        if request.if_none_match.contains(page.etag):
+            response = Response(status=304)
+        else:
+            response = jsonify({
+                'message': 'Sequences loaded successfully',
+                'success': True,
+                'sequences': page.items,
+                'total': page.total,
+                'nextCursor': page.next_cursor
+            })
+        response.set_etag(page.etag)
+        return response
     except Exception as e:
         return jsonify({
             'message': str(e),
@@ -122,20 +142,129 @@ def deactivate_except(filename):
                 'message': 'Invalid filename',
                 'success': False
             }), 400
-        updated_count = deactivate_all_except(filename)
-        if updated_count == 0:
+        activated = set_active_sequence(filename)
+        if not activated:
+            return jsonify({
+                'message': 'Sequence not found or corrupted',
+                'success': False
+            }), 404
+        return jsonify({
+            'message': f'Only {filename} is now active.',
+            'success': True,
+            'active_sequence': filename
+        })
+    except Exception as e:
+        return jsonify({
+            'message': str(e),
+            'success': False
+        }), 500
+
+def get_sequence_player():
+    import app
+    return app.sequence_player
+
+@bp.route('/play/<filename>', methods=['POST'])
+def play(filename):
+    '''Plays a sequence on the primary device; an optional device (a device key, or 'all')
+    in the JSON body or query string picks another board or fans out to every board'''
+    try:
+        if not filename.endswith('.json'):
+            return jsonify({
+                'message': 'Invalid filename',
+                'success': False
+            }), 400
+        data = request.get_json(silent=True) or {}
+        try:
+            targets = device_pool.targets(data.get('device') or request.args.get('device'))
+        except KeyError as e:
             return jsonify({
-                'message': 'No sequences updated (target not found?)',
+                'message': e.args[0],
                 'success': False
             }), 404
+        targets = [(key, device) for key, device in targets if device.is_connected()]
+        if not targets:
+            return jsonify({
+                'message': 'Device disconnected',
+                'success': False,
+                'device_disconnected': True
+            }), 500
+        player = get_sequence_player()
+        try:
+            player.start(targets, filename)
+        except SequenceError as e:
+            return jsonify({
+                'message': str(e),
+                'success': False
+            }), 400
+        return jsonify({
+            'message': f'Playing sequence {filename}',
+            'success': True,
+            'progress': player.progress()
+        })
+    except Exception as e:
         return jsonify({
-            'message': f'Successfully updated {updated_count} sequences. Only {filename} is now active.',
+            'message': str(e),
+            'success': False
+        }), 500
+
+@bp.route('/stop', methods=['POST'])
+def stop():
+    try:
+        player = get_sequence_player()
+        stopped = player.stop()
+        return jsonify({
+            'message': 'Playback stopped' if stopped else 'No sequence is playing',
+            'success': stopped,
+            'progress': player.progress()
+        })
+    except Exception as e:
+        return jsonify({
+            'message': str(e),
+            'success': False
+        }), 500
+
+@bp.route('/pause', methods=['POST'])
+def pause():
+    try:
+        player = get_sequence_player()
+        paused = player.pause()
+        return jsonify({
+            'message': 'Playback paused' if paused else 'No sequence is playing',
+            'success': paused,
+            'progress': player.progress()
+        })
+    except Exception as e:
+        return jsonify({
+            'message': str(e),
+            'success': False
+        }), 500
+
+@bp.route('/resume', methods=['POST'])
+def resume():
+    try:
+        player = get_sequence_player()
+        resumed = player.resume()
+        return jsonify({
+            'message': 'Playback resumed' if resumed else 'No sequence is paused',
+            'success': resumed,
+            'progress': player.progress()
+        })
+    except Exception as e:
+        return jsonify({
+            'message': str(e),
+            'success': False
+        }), 500
+
+@bp.route('/progress')
+def progress():
+    try:
+        return jsonify({
+            'message': 'Playback progress',
             'success': True,
-            'active_sequence': filename,
-            'sequences_updated': updated_count
+            'progress': get_sequence_player().progress()
         })
     except Exception as e:
         return jsonify({
             'message': str(e),
             'success': False
-        }), 500
\ No newline at end of file
+        }), 500
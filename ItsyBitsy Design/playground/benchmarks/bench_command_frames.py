@@ -0,0 +1,57 @@
+'''
+Micro-benchmark: packing the KeyCommand frame per keystroke vs. the frames
+precompiled on each KeyDefinition.
+
+Run from anywhere: python playground/benchmarks/bench_command_frames.py
+'''
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+import struct
+import timeit
+from logic.keymaps.key_definitions import KEYS, KeyDefinition
+
+ITERATIONS = 200_000
+
+def pack_per_keystroke(key, action):
+    '''The frame construction send_command used to do on every call'''
+    return struct.pack('>BBBBBBBBBBBBB',
+        key.physical_mapping.row.i2c_addr,
+        key.physical_mapping.row.logi_pin,
+        key.physical_mapping.row.pin.axis.value,
+        key.physical_mapping.row.pin.channel,
+        key.physical_mapping.row.bus_pin.axis.value,
+        key.physical_mapping.row.bus_pin.channel,
+        key.physical_mapping.col.i2c_addr,
+        key.physical_mapping.col.logi_pin,
+        key.physical_mapping.col.pin.axis.value,
+        key.physical_mapping.col.pin.channel,
+        key.physical_mapping.col.bus_pin.axis.value,
+        key.physical_mapping.col.bus_pin.channel,
+        1 if action == 'PRESS' else 0
+    )
+
+def precompiled(key, action):
+    '''The lookup send_command does now'''
+    return key.press_frame if action == 'PRESS' else key.release_frame
+
+def main():
+    keys = [key for key in vars(KEYS).values() if isinstance(key, KeyDefinition)]
+
+    # Both approaches must produce identical bytes on the wire
+    for key in keys:
+        for action in ('PRESS', 'RELEASE'):
+            assert pack_per_keystroke(key, action) == precompiled(key, action)
+
+    key = KEYS.A
+    packed = min(timeit.repeat(lambda: pack_per_keystroke(key, 'PRESS'), number=ITERATIONS, repeat=5))
+    cached = min(timeit.repeat(lambda: precompiled(key, 'PRESS'), number=ITERATIONS, repeat=5))
+
+    print(f'Verified {len(keys)} keys x 2 actions produce identical frames')
+    print(f'struct.pack per keystroke: {packed / ITERATIONS * 1e9:8.1f} ns/frame')
+    print(f'precompiled frame:         {cached / ITERATIONS * 1e9:8.1f} ns/frame')
+    print(f'speedup:                   {packed / cached:8.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+Benchmark: write throughput of JSON saves under rapid UI edits.
+
+Compares, for the same stream of profile-sized documents:
+- plain: open(path, 'w') + json.dump (the old, non-crash-safe save)
+- atomic: temp file + fsync + os.replace + directory fsync, one flush per save
+- group commit: the same atomic writes through GroupCommitWriter, with several
+  threads saving at once (like overlapping reorder/add/edit requests)
+
+Run: python playground/benchmarks/bench_json_writes.py [saves] [threads]
+'''
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+import json
+import tempfile
+import threading
+import time
+from logic.atomic_files import GroupCommitWriter, atomic_write
+
+SAVES = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+FILES = 20  # Distinct files being edited
+
+def document(i):
+    return {'name': f'Profile {i}', 'wpm': 60 + i % 40, 'wpmVariation': 5,
+            'keyDuration': 100, 'keyDurationVariation': 10, 'created': '2025-01-01T00:00:00'}
+
+def plain(directory):
+    for i in range(SAVES):
+        with open(os.path.join(directory, f'{i % FILES}.json'), 'w') as f:
+            json.dump(document(i), f, indent=2)
+
+def atomic(directory):
+    for i in range(SAVES):
+        atomic_write(os.path.join(directory, f'{i % FILES}.json'), json.dumps(document(i), indent=2))
+
+def group_commit(directory, window):
+    writer = GroupCommitWriter(window=window)
+    def worker(offset):
+        for i in range(offset, SAVES, THREADS):
+            writer.write(os.path.join(directory, f'{i % FILES}.json'), json.dumps(document(i), indent=2))
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return writer.flushes
+
+def run(label, fn, *args):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        result = fn(directory, *args)
+        elapsed = time.perf_counter() - start
+    extra = f'  ({result} flushes)' if result is not None else ''
+    print(f'{label:<34}{SAVES / elapsed:>10.0f} saves/s{extra}')
+
+def main():
+    print(f'{SAVES} saves over {FILES} files, {THREADS} threads for group commit')
+    run('plain open/json.dump', plain)
+    run('atomic, one flush per save', atomic)
+    run('group commit, no window', group_commit, 0.0)
+    run('group commit, 5 ms window', group_commit, 0.005)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+'''
+Benchmark: per-key cost of the table-driven 'bash' translator vs. a linear
+comparison chain (the shape of the old get_keymap_name if/elif chain).
+
+The translator cost should stay flat no matter where a key sits in the table,
+while the chain grows with the number of comparisons made before a match.
+
+Requires pynput. Run: python playground/benchmarks/bench_key_translation.py
+'''
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+import timeit
+from pynput import keyboard
+from logic.keygroup.keygroup import BASH_SPECIAL_KEYS, BASH_CHARACTERS
+from logic.keygroup.translators import get_translator
+
+ITERATIONS = 100_000
+
+def linear_chain(key):
+    '''Walks the special keys then the characters in order, like an elif chain'''
+    for special, name in BASH_SPECIAL_KEYS.items():
+        if key == special:
+            return name
+    char = getattr(key, 'char', None)
+    for candidate, name in BASH_CHARACTERS.items():
+        if char == candidate:
+            return name
+    return None
+
+def main():
+    translator = get_translator('bash')
+    samples = [
+        ('first special (shift)', keyboard.Key.shift),
+        ('last special (page_down)', keyboard.Key.page_down),
+        ('first char (1)', keyboard.KeyCode.from_char('1')),
+        ('letter (z)', keyboard.KeyCode.from_char('z')),
+        ('last char (\\x03)', keyboard.KeyCode.from_char('\x03')),
+    ]
+
+    print(f'{"key":<26}{"table ns/key":>14}{"chain ns/key":>14}')
+    for label, key in samples:
+        assert translator.translate_name(key) == linear_chain(key)
+        table = min(timeit.repeat(lambda: translator.translate(key), number=ITERATIONS, repeat=5))
+        chain = min(timeit.repeat(lambda: linear_chain(key), number=ITERATIONS, repeat=5))
+        print(f'{label:<26}{table / ITERATIONS * 1e9:>14.1f}{chain / ITERATIONS * 1e9:>14.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+'''
+Benchmark: planning text into key taps with the precomputed str.translate
+tables (plan_text) vs. translating it one character at a time through the
+'text' KeyTranslator (how sequences were compiled before).
+
+For each corpus it prints the throughput of both, and the key events a
+playback sends with shift held across runs vs. pressed around every shifted
+character.
+
+Run: python playground/benchmarks/bench_text_planner.py [path/to/corpus.txt ...]
+'''
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+import random
+import time
+from logic.keygroup.text_planner import plan_text
+from logic.keygroup.translators import SHIFTED_CHARACTERS, translate
+
+CORPUS_CHARS = 2_000_000
+
+def per_character(text):
+    '''One translator lookup and one shift check per character'''
+    taps, skipped = [], 0
+    for char in text:
+        key = translate(char, 'text')
+        if key is None:
+            skipped += 1
+        else:
+            taps.append((key, char in SHIFTED_CHARACTERS))
+    return taps, skipped
+
+def generated_corpora():
+    rng = random.Random(0)
+    words = ['the', 'board', 'Drinky', 'sequence', 'KEY', 'press', 'HELLO', 'World', 'shift', 'ItsyBitsy']
+    prose = ' '.join(rng.choice(words) for _ in range(CORPUS_CHARS // 6))
+    code = 'def f(x): return {"A": x[0] + 1, "B": (x * 2) % 3}  # TODO: FIX_ME!\n' * (CORPUS_CHARS // 70)
+    shouting = 'WARNING: DO NOT UNPLUG THE BOARD!!! ' * (CORPUS_CHARS // 36)
+    accented = 'Café crème, naïve façade — 50€ ' * (CORPUS_CHARS // 30)
+    return [('prose', prose), ('code', code), ('uppercase', shouting), ('non-ASCII', accented)]
+
+def best_of(fn, text, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(paths):
+    corpora = [(os.path.basename(path), open(path, encoding='utf-8', errors='replace').read()) for path in paths]
+    corpora = corpora or generated_corpora()
+
+    print(f'{"corpus":<12}{"chars":>10}{"plan MB/s":>11}{"loop MB/s":>11}{"skipped":>9}'
+          f'{"events held":>13}{"events unheld":>15}')
+    for label, text in corpora:
+        plan = plan_text(text)
+        taps, skipped = per_character(text)
+        assert len(plan) == len(taps) and len(plan.untypeable) == skipped
+        planned = best_of(plan_text, text)
+        looped = best_of(per_character, text)
+        # Pressing shift around every shifted character costs two events each
+        unheld = 2 * (len(plan) + sum(plan.shifted))
+        print(f'{label:<12}{len(text):>10}{len(text) / planned / 1e6:>11.1f}{len(text) / looped / 1e6:>11.1f}'
+              f'{skipped:>9}{plan.event_count:>13}{unheld:>15}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -6,17 +6,16 @@ from pynput import keyboard
 from collections import deque
 import asyncio
 from time import sleep
-import struct
 import serial
 import glob
-from backend.logic.keymaps.key_definitions import KEYS
-from backend.logic.keygroup.keygroup import KeyGroup, get_keymap_name
+from backend.logic.keygroup.keygroup import get_key_definition
 #endregio
 
 #region Global Variables
 key_queue = deque()
 ser = None  # Global variable for serial connection
 pressed_modifiers = set()
+board_modifiers = set()  # Modifier KeyDefinitions currently pressed on the board
 eligible_modifiers = {keyboard.Key.shift, keyboard.Key.shift_r, keyboard.Key.cmd, keyboard.Key.alt, keyboard.Key.ctrl, keyboard.Key.esc}
 #endregion
 
@@ -30,24 +29,19 @@ def find_itsybitsy_port():
 
 def send_command(ser, key, action):
     """Send a command to the Arduino"""
-    command = struct.pack('>BBBBBBBBBBBBB',
-        key.row.i2c_addr,
-        key.row.logi_pin,
-        key.row.pin.axis.value,
-        key.row.pin.channel,
-        key.row.bus_pin.axis.value,
-        key.row.bus_pin.channel,
-        key.col.i2c_addr,
-        key.col.logi_pin,
-        key.col.pin.axis.value,
-        key.col.pin.channel,
-        key.col.bus_pin.axis.value,
-        key.col.bus_pin.channel,
-        1 if action == "PRESS" else 0
-    )
+    command = key.press_frame if action == "PRESS" else key.release_frame
     ser.write(command)
     ser.flush()
 
+def sync_modifiers(ser, modifier_keys):
+    """Press/release board modifiers so exactly modifier_keys are held (each sent once per chord)"""
+    for modifier_key in board_modifiers - modifier_keys:
+        send_command(ser, modifier_key, 'RELEASE')
+    for modifier_key in modifier_keys - board_modifiers:
+        send_command(ser, modifier_key, 'PRESS')
+    board_modifiers.clear()
+    board_modifiers.update(modifier_keys)
+
 def on_press(key):
     global ser
 
@@ -74,36 +68,28 @@ def on_press(key):
 
         # print(key)
 
-        # Create keygroup using tracked modifiers and base key
-        my_keygroup = KeyGroup(base=str(get_keymap_name(current_key, 'bash')), modifiers=frozenset(pressed_modifiers))
-
-        # Press modifier key(s)
-        for mk in my_keygroup.modifiers:
-            keymap_name = get_keymap_name(mk, 'bash')
-            if keymap_name is not None:
-                modifier_key = getattr(KEYS, get_keymap_name(mk, 'bash'))
-                if modifier_key:
-                    send_command(ser, modifier_key, 'PRESS')
-
-        if my_keygroup.base is not None:
-            mapped_key = getattr(KEYS, my_keygroup.base)
-            if mapped_key is not None:
-                send_command(ser, mapped_key, 'PRESS')
-                sleep(0.02)
-                send_command(ser, mapped_key, 'RELEASE')
-                sleep(0.02)
-
-        # Release modifier key(s)
-        for mk in my_keygroup.modifiers:
-            keymap_name = get_keymap_name(mk, 'bash')
-            if keymap_name is not None:
-                modifier_key = getattr(KEYS, get_keymap_name(mk, 'bash'))
-                if modifier_key:
-                    send_command(ser, modifier_key, 'RELEASE')
+        # Resolve base key and tracked modifiers straight to KeyDefinitions
+        base_key = get_key_definition(current_key, 'bash')
+        modifier_keys = {get_key_definition(mk, 'bash') for mk in frozenset(pressed_modifiers)} - {None}
+
+        # Modifiers stay down across the chord (e.g. Ctrl held over C then V); only changes are sent
+        sync_modifiers(ser, modifier_keys)
+
+        if base_key is not None:
+            send_command(ser, base_key, 'PRESS')
+            sleep(0.02)
+            send_command(ser, base_key, 'RELEASE')
+            sleep(0.02)
 
 def on_release(key):
     if key in eligible_modifiers:
-        pressed_modifiers.remove(key)
+        pressed_modifiers.discard(key)
+        # Release the modifier on the board once its chord is over (unless the other side still holds it)
+        modifier_key = get_key_definition(key, 'bash')
+        still_held = {get_key_definition(mk, 'bash') for mk in frozenset(pressed_modifiers)}
+        if modifier_key in board_modifiers and modifier_key not in still_held:
+            send_command(ser, modifier_key, 'RELEASE')
+            board_modifiers.discard(modifier_key)
 #endregion
 
 #region Main
@@ -119,7 +105,8 @@ def main():
     with keyboard.Listener(on_press=on_press, on_release=on_release) as listener:
         listener.join()
 
-    # Cleanup
+    # Cleanup: nothing stays held on the board
+    sync_modifiers(ser, set())
     ser.close()
 
 if __name__ == "__main__":
@@ -2,7 +2,6 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import serial
-import struct
 import time
 import glob
 from pynput import keyboard
@@ -17,21 +16,7 @@ def find_itsybitsy_port():
 
 def send_command(ser, key, action):
     """Send a command to the Arduino"""
-    command = struct.pack('>BBBBBBBBBBBBB',
-        key.row.i2c_addr,
-        key.row.logi_pin,
-        key.row.pin.axis.value,
-        key.row.pin.channel,
-        key.row.bus_pin.axis.value,
-        key.row.bus_pin.channel,
-        key.col.i2c_addr,
-        key.col.logi_pin,
-        key.col.pin.axis.value,
-        key.col.pin.channel,
-        key.col.bus_pin.axis.value,
-        key.col.bus_pin.channel,
-        1 if action == "PRESS" else 0
-    )
+    command = key.press_frame if action == "PRESS" else key.release_frame
     ser.write(command)
     ser.flush()
 
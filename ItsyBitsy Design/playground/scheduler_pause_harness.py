@@ -0,0 +1,78 @@
+'''
+Pause harness: plays a compiled sequence on a fake device, pausing and resuming
+after every write in turn, and checks what the board would have typed.
+
+- Shift is held across runs of shifted characters ("HELLOWORLD" presses it once),
+  so a pause in the middle of the run must not turn the rest of it lowercase
+- Every key must be up while paused, and at the end of the run
+
+Run: python playground/scheduler_pause_harness.py
+'''
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+import threading
+from logic.key_scheduler import KeyScheduler
+from logic.keymaps.key_definitions import KEYS
+from logic.sequence_compiler import compile_timeline
+
+TEXT = 'HELLOWORLD Hello World'
+SEQUENCE = {'wpm': 1200, 'wpmVariation': 0, 'keyDuration': 5, 'keyDurationVariation': 0, 'actions': [{'type': 'text', 'text': TEXT}]}
+LETTERS = {getattr(KEYS, letter): letter for letter in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'}
+LETTERS[KEYS.SPACE] = ' '
+
+class FakeBoard:
+    '''Records the switches closed by the frames it receives, and the text they type'''
+
+    def __init__(self, pause_after=None):
+        self.pause_after = pause_after
+        self.scheduler = None
+        self.writes = 0
+        self.down = set()
+        self.typed = []
+        self.down_while_paused = set()
+
+    def frame(self, key, action):
+        return key, action
+
+    def write_frames(self, frames):
+        if self.scheduler.paused:
+            # Only the release on the way into the pause may arrive now
+            assert all(action == 'RELEASE' for _, action in frames), frames
+        for key, action in frames:
+            if action == 'PRESS':
+                if key in LETTERS and key not in self.down:
+                    letter = LETTERS[key]
+                    self.typed.append(letter if KEYS.LEFT_SHIFT in self.down else letter.lower())
+                self.down.add(key)
+            else:
+                self.down.discard(key)
+        self.writes += 1
+        if self.writes == self.pause_after:
+            self.scheduler.pause()
+            threading.Timer(0.01, self._resume).start()
+        return True
+
+    def _resume(self):
+        self.down_while_paused |= self.down
+        self.scheduler.resume()
+
+def play(pause_after=None):
+    board = FakeBoard(pause_after)
+    board.scheduler = KeyScheduler(board)
+    board.scheduler.run(compile_timeline('pause.json', load=lambda name: SEQUENCE, seed=7))
+    return board
+
+def check_pauses():
+    writes = play().writes
+    for pause_after in range(1, writes):
+        board = play(pause_after)
+        typed = ''.join(board.typed)
+        assert typed == TEXT, f'pause after write {pause_after}: typed {typed!r}'
+        assert not board.down_while_paused, f'pause after write {pause_after}: held {board.down_while_paused}'
+        assert not board.down, f'pause after write {pause_after}: left {board.down} down'
+    print(f'pause after each of {writes - 1} writes: typed {TEXT!r} every time')
+
+if __name__ == '__main__':
+    check_pauses()
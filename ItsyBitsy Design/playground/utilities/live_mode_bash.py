@@ -4,12 +4,10 @@ import os
 from pynput import keyboard
 from collections import deque
 from time import sleep
-import struct
 import serial
 import glob
-sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
-from logic.keymaps.key_definitions import KEYS
-from logic.keygroup.keygroup import KeyGroup, get_keymap_name
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend'))
+from logic.keygroup.keygroup import get_key_definition
 #endregion
 
 #region Global Variables
@@ -29,21 +27,7 @@ def find_itsybitsy_port():
 
 def send_command(key, action):
     '''Send a command to the Arduino'''
-    command = struct.pack('>BBBBBBBBBBBBB',
-        key.row.i2c_addr,
-        key.row.logi_pin,
-        key.row.pin.axis.value,
-        key.row.pin.channel,
-        key.row.bus_pin.axis.value,
-        key.row.bus_pin.channel,
-        key.col.i2c_addr,
-        key.col.logi_pin,
-        key.col.pin.axis.value,
-        key.col.pin.channel,
-        key.col.bus_pin.axis.value,
-        key.col.bus_pin.channel,
-        1 if action == 'PRESS' else 0
-    )
+    command = key.press_frame if action == 'PRESS' else key.release_frame
     ser.write(command)
     ser.flush()
 
@@ -71,32 +55,25 @@ def on_press(key):
         if current_key in eligible_modifiers:
             continue
 
-        # Create keygroup using tracked modifiers and base key
-        my_keygroup = KeyGroup(base=str(get_keymap_name(current_key, 'bash')), modifiers=frozenset(pressed_modifiers))
+        # Resolve base key and tracked modifiers straight to KeyDefinitions
+        base_key = get_key_definition(current_key, 'bash')
+        modifier_keys = [get_key_definition(mk, 'bash') for mk in frozenset(pressed_modifiers)]
 
         # Press modifier key(s)
-        for mk in my_keygroup.modifiers:
-            keymap_name = get_keymap_name(mk, 'bash')
-            if keymap_name is not None:
-                modifier_key = getattr(KEYS, get_keymap_name(mk, 'bash'))
-                if modifier_key:
-                    send_command(modifier_key, 'PRESS')
-
-        if my_keygroup.base is not None:
-            mapped_key = getattr(KEYS, my_keygroup.base)
-            if mapped_key is not None:
-                send_command(mapped_key, 'PRESS')
-                sleep(0.02)
-                send_command(mapped_key, 'RELEASE')
-                sleep(0.02)
+        for modifier_key in modifier_keys:
+            if modifier_key is not None:
+                send_command(modifier_key, 'PRESS')
+
+        if base_key is not None:
+            send_command(base_key, 'PRESS')
+            sleep(0.02)
+            send_command(base_key, 'RELEASE')
+            sleep(0.02)
 
         # Release modifier key(s)
-        for mk in my_keygroup.modifiers:
-            keymap_name = get_keymap_name(mk, 'bash')
-            if keymap_name is not None:
-                modifier_key = getattr(KEYS, get_keymap_name(mk, 'bash'))
-                if modifier_key:
-                    send_command(modifier_key, 'RELEASE')
+        for modifier_key in modifier_keys:
+            if modifier_key is not None:
+                send_command(modifier_key, 'RELEASE')
 
 def on_release(key):
     if key in eligible_modifiers:
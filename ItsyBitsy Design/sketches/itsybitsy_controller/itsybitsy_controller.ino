@@ -1,4 +1,5 @@
 #include <Wire.h>
+#include <EEPROM.h>
 #include "ADG2128.h"
 
 enum Axis
@@ -16,6 +17,70 @@ enum Action
 ADG2128 chip0(0x70);
 ADG2128 chip1(0x71);
 
+// Bus pins joining the two switch matrices (see adg2128_pin.py: BUS_PIN_X / BUS_PIN_Y)
+const uint8_t BUS_PIN_X_CHANNEL = 6;
+const uint8_t BUS_PIN_Y_CHANNEL = 7;
+
+/*
+ * Batch frame (protocol extension, version 1)
+ *
+ * A legacy KeyCommand always starts with the row I2C address (0x70), so a frame
+ * starting with BATCH_MAGIC is a batch instead:
+ *   [BATCH_MAGIC][version][count] followed by `count` 4-byte entries:
+ *   [row_pin][col_pin][delay_ms hi][delay_ms lo]
+ * row_pin/col_pin pack a pin as (axis << 4) | channel; bit 7 of row_pin is the
+ * action (1 = PRESS). Each entry waits delay_ms, then executes, so a chord or a
+ * word is timed on the microcontroller instead of across USB round trips.
+ */
+const uint8_t BATCH_MAGIC = 0xB1;
+const uint8_t BATCH_VERSION = 1;
+const uint8_t MAX_BATCH_ENTRIES = 32;
+const unsigned long BATCH_READ_TIMEOUT_MS = 50;
+
+/*
+ * Compact key-index protocol
+ *
+ * The host uploads a packed key table once: entry i holds key i's packed
+ * (row_pin, col_pin) pair. After that a key command is 2 bytes, [key_id][action],
+ * with key_id < LEGACY_FRAME_START so it can't be confused with a legacy frame.
+ *   TABLE_QUERY:  host [0xB2] -> device [0xB2][version][count][crc32 x4]
+ *   TABLE_UPLOAD: host [0xB3][version][count][count x 2 bytes][crc32 x4] -> device [0xB3][1 = stored, 0 = rejected]
+ * The CRC-32 (same as zlib.crc32) covers [version][count][table] and lets the
+ * host skip the upload when the stored table already matches. The table is kept
+ * in EEPROM so it survives power cycles.
+ */
+const uint8_t TABLE_QUERY = 0xB2;
+const uint8_t TABLE_UPLOAD = 0xB3;
+const uint8_t LEGACY_FRAME_START = 0x70; // Row I2C address, first byte of every KeyCommand
+const uint8_t MAX_KEYS = LEGACY_FRAME_START;
+const int EEPROM_TABLE_ADDR = 0; // [version][count][crc32 x4][table]
+
+uint8_t key_table[MAX_KEYS][2];
+uint8_t key_table_version = 0;
+uint8_t key_count = 0;
+uint32_t key_table_crc = 0;
+
+/*
+ * Acknowledged frames (optional ACK mode)
+ *
+ *   SEQ_RESET: host [0xB5] -> device [0xB5][1]; the next expected sequence number becomes 0
+ *   SEQ_FRAME: host [0xB4][seq][length][payload x length][crc8] -> device [0xB4][seq]
+ *   SEQ_NAK:   device [0xB6][expected_seq] when a packet is corrupt or out of order
+ * The payload is any run of whole frames (compact, legacy or batch); an empty
+ * payload is a ping. The CRC-8 (polynomial 0x07) covers seq, length and payload.
+ * A packet is acknowledged as soon as it arrives intact, before it executes, so
+ * the ACK measures the link rather than batch delays. Retransmitted packets that
+ * already ran are acknowledged again without running twice.
+ */
+const uint8_t SEQ_FRAME = 0xB4;
+const uint8_t SEQ_RESET = 0xB5;
+const uint8_t SEQ_NAK = 0xB6;
+const uint8_t MAX_SEQ_PAYLOAD = 160;
+
+uint8_t seq_payload[MAX_SEQ_PAYLOAD];
+uint8_t expected_seq = 0;
+bool nak_sent = false; // One NAK per gap; after that the host's retransmit timer takes over
+
 // Command structure to match Python's KEY object
 struct KeyCommand
 {
@@ -75,11 +140,61 @@ void setup()
     }
 
     clearAll();
+    loadKeyTable();
+    Serial.setTimeout(BATCH_READ_TIMEOUT_MS);
     Serial.println("Ready for 3-second switch activations.");
 }
 
 void loop()
 {
+    if (Serial.available() == 0)
+    {
+        return;
+    }
+
+    // Frames are identified by their first byte
+    uint8_t first = Serial.peek();
+    if (first == BATCH_MAGIC)
+    {
+        handleBatch();
+        return;
+    }
+    if (first == TABLE_QUERY)
+    {
+        Serial.read();
+        sendTableInfo(TABLE_QUERY);
+        return;
+    }
+    if (first == TABLE_UPLOAD)
+    {
+        handleTableUpload();
+        return;
+    }
+    if (first == SEQ_FRAME)
+    {
+        handleSeqFrame();
+        return;
+    }
+    if (first == SEQ_RESET)
+    {
+        Serial.read();
+        expected_seq = 0;
+        nak_sent = false;
+        uint8_t reply[2] = {SEQ_RESET, 1};
+        Serial.write(reply, sizeof(reply));
+        return;
+    }
+    if (first < LEGACY_FRAME_START)
+    {
+        if (Serial.available() >= 2)
+        {
+            uint8_t command[2];
+            Serial.readBytes((char *)command, 2);
+            performKeyIndex(command[0], command[1]);
+        }
+        return;
+    }
+
     // Check for incoming command
     if (Serial.available() >= sizeof(KeyCommand))
     {
@@ -89,9 +204,310 @@ void loop()
         // delay(5); // Add delay if having problems
 
         // Process the command
-        performAction(cmd.action, cmd.row_pin_axis, cmd.row_pin_channel, cmd.row_bus_pin_axis, cmd.row_bus_pin_channel,
-                      cmd.col_pin_axis, cmd.col_pin_channel, cmd.col_bus_pin_axis, cmd.col_bus_pin_channel);
+        performKeyCommand(cmd);
+    }
+}
+
+void performKeyCommand(const KeyCommand &cmd)
+{
+    performAction(cmd.action, cmd.row_pin_axis, cmd.row_pin_channel, cmd.row_bus_pin_axis, cmd.row_bus_pin_channel,
+                  cmd.col_pin_axis, cmd.col_pin_channel, cmd.col_bus_pin_axis, cmd.col_bus_pin_channel);
+}
+
+uint8_t crc8Update(uint8_t crc, uint8_t data)
+{
+    crc ^= data;
+    for (uint8_t bit = 0; bit < 8; bit++)
+    {
+        crc = (crc & 0x80) ? (crc << 1) ^ 0x07 : crc << 1;
+    }
+    return crc;
+}
+
+void sendSeqReply(uint8_t opcode, uint8_t seq)
+{
+    uint8_t reply[2] = {opcode, seq};
+    Serial.write(reply, sizeof(reply));
+}
+
+void sendNak()
+{
+    if (!nak_sent)
+    {
+        sendSeqReply(SEQ_NAK, expected_seq);
+        nak_sent = true;
+    }
+}
+
+void handleSeqFrame()
+{
+    uint8_t header[3]; // [SEQ_FRAME][seq][length]
+    uint8_t crc = 0;
+    if (!readExactly(header, sizeof(header)) || header[2] > MAX_SEQ_PAYLOAD ||
+        !readExactly(seq_payload, header[2]) || !readExactly(&crc, 1))
+    {
+        discardInput();
+        sendNak();
+        return;
+    }
+    uint8_t expected_crc = crc8Update(crc8Update(0, header[1]), header[2]);
+    for (uint8_t i = 0; i < header[2]; i++)
+    {
+        expected_crc = crc8Update(expected_crc, seq_payload[i]);
+    }
+    if (crc != expected_crc)
+    {
+        discardInput();
+        sendNak();
+        return;
+    }
+
+    uint8_t seq = header[1];
+    if (seq != expected_seq)
+    {
+        // Behind: a retransmission of a packet that already ran. Ahead: an earlier packet was lost.
+        uint8_t behind = expected_seq - seq;
+        if (behind <= 128)
+        {
+            sendSeqReply(SEQ_FRAME, seq);
+        }
+        else
+        {
+            sendNak();
+        }
+        return;
+    }
+
+    sendSeqReply(SEQ_FRAME, seq);
+    expected_seq++;
+    nak_sent = false;
+    executeFrames(seq_payload, header[2]);
+}
+
+// Runs a buffer of whole frames, as carried in a sequenced packet
+void executeFrames(const uint8_t *data, uint8_t length)
+{
+    uint8_t i = 0;
+    while (i < length)
+    {
+        uint8_t first = data[i];
+        if (first < LEGACY_FRAME_START && i + 2 <= length)
+        {
+            performKeyIndex(data[i], data[i + 1]);
+            i += 2;
+        }
+        else if (first == LEGACY_FRAME_START && i + sizeof(KeyCommand) <= length)
+        {
+            KeyCommand cmd;
+            memcpy(&cmd, data + i, sizeof(KeyCommand));
+            performKeyCommand(cmd);
+            i += sizeof(KeyCommand);
+        }
+        else if (first == BATCH_MAGIC && i + 3 <= length && data[i + 1] == BATCH_VERSION &&
+                 i + 3 + data[i + 2] * 4 <= length)
+        {
+            for (uint8_t entry = 0; entry < data[i + 2]; entry++)
+            {
+                runBatchEntry(data + i + 3 + entry * 4);
+            }
+            i += 3 + data[i + 2] * 4;
+        }
+        else
+        {
+            Serial.println("ERR: malformed packet payload");
+            return;
+        }
+    }
+}
+
+uint32_t crc32Update(uint32_t crc, uint8_t data)
+{
+    crc ^= data;
+    for (uint8_t bit = 0; bit < 8; bit++)
+    {
+        crc = (crc >> 1) ^ (0xEDB88320UL & (0UL - (crc & 1)));
     }
+    return crc;
+}
+
+uint32_t keyTableCrc(uint8_t version, uint8_t count)
+{
+    uint32_t crc = 0xFFFFFFFFUL;
+    crc = crc32Update(crc, version);
+    crc = crc32Update(crc, count);
+    for (uint8_t i = 0; i < count; i++)
+    {
+        crc = crc32Update(crc, key_table[i][0]);
+        crc = crc32Update(crc, key_table[i][1]);
+    }
+    return ~crc;
+}
+
+void loadKeyTable()
+{
+    uint8_t version = EEPROM.read(EEPROM_TABLE_ADDR);
+    uint8_t count = EEPROM.read(EEPROM_TABLE_ADDR + 1);
+    if (count > MAX_KEYS)
+    {
+        return;
+    }
+    uint32_t stored_crc = 0;
+    for (uint8_t i = 0; i < 4; i++)
+    {
+        stored_crc = (stored_crc << 8) | EEPROM.read(EEPROM_TABLE_ADDR + 2 + i);
+    }
+    for (uint8_t i = 0; i < count; i++)
+    {
+        key_table[i][0] = EEPROM.read(EEPROM_TABLE_ADDR + 6 + i * 2);
+        key_table[i][1] = EEPROM.read(EEPROM_TABLE_ADDR + 7 + i * 2);
+    }
+    // A blank or half-written EEPROM leaves the table unloaded
+    if (count > 0 && keyTableCrc(version, count) == stored_crc)
+    {
+        key_table_version = version;
+        key_count = count;
+        key_table_crc = stored_crc;
+    }
+}
+
+void saveKeyTable()
+{
+    EEPROM.update(EEPROM_TABLE_ADDR, key_table_version);
+    EEPROM.update(EEPROM_TABLE_ADDR + 1, key_count);
+    for (uint8_t i = 0; i < 4; i++)
+    {
+        EEPROM.update(EEPROM_TABLE_ADDR + 2 + i, (key_table_crc >> (24 - i * 8)) & 0xFF);
+    }
+    for (uint8_t i = 0; i < key_count; i++)
+    {
+        EEPROM.update(EEPROM_TABLE_ADDR + 6 + i * 2, key_table[i][0]);
+        EEPROM.update(EEPROM_TABLE_ADDR + 7 + i * 2, key_table[i][1]);
+    }
+}
+
+void sendTableInfo(uint8_t opcode)
+{
+    uint8_t reply[7] = {
+        opcode, key_table_version, key_count,
+        (uint8_t)(key_table_crc >> 24), (uint8_t)(key_table_crc >> 16),
+        (uint8_t)(key_table_crc >> 8), (uint8_t)key_table_crc};
+    Serial.write(reply, sizeof(reply));
+}
+
+void handleTableUpload()
+{
+    uint8_t header[3];
+    uint8_t status = 0;
+    if (readExactly(header, sizeof(header)) && header[2] > 0 && header[2] <= MAX_KEYS)
+    {
+        uint8_t count = header[2];
+        uint8_t crc_bytes[4];
+        // Stop using the old table while the new one streams in
+        key_count = 0;
+        if (readExactly((uint8_t *)key_table, count * 2) && readExactly(crc_bytes, sizeof(crc_bytes)))
+        {
+            uint32_t crc = ((uint32_t)crc_bytes[0] << 24) | ((uint32_t)crc_bytes[1] << 16) |
+                           ((uint32_t)crc_bytes[2] << 8) | crc_bytes[3];
+            if (keyTableCrc(header[1], count) == crc)
+            {
+                key_table_version = header[1];
+                key_count = count;
+                key_table_crc = crc;
+                saveKeyTable();
+                status = 1;
+            }
+        }
+    }
+    if (!status)
+    {
+        discardInput();
+    }
+    uint8_t reply[2] = {TABLE_UPLOAD, status};
+    Serial.write(reply, sizeof(reply));
+}
+
+void performKeyIndex(uint8_t key_id, uint8_t action)
+{
+    if (key_id >= key_count)
+    {
+        return;
+    }
+    performPackedAction(action ? key_table[key_id][0] | 0x80 : key_table[key_id][0], key_table[key_id][1]);
+}
+
+// A pin on one axis is bridged through the bus pin on the other axis
+uint8_t busAxis(uint8_t pin_axis)
+{
+    return pin_axis == Y ? X : Y;
+}
+
+uint8_t busChannel(uint8_t pin_axis)
+{
+    return pin_axis == Y ? BUS_PIN_X_CHANNEL : BUS_PIN_Y_CHANNEL;
+}
+
+// Reads exactly `length` bytes or gives up after the serial timeout
+bool readExactly(uint8_t *buffer, size_t length)
+{
+    return Serial.readBytes((char *)buffer, length) == length;
+}
+
+void discardInput()
+{
+    while (Serial.available() > 0)
+    {
+        Serial.read();
+    }
+}
+
+void handleBatch()
+{
+    uint8_t header[3];
+    if (!readExactly(header, sizeof(header)))
+    {
+        return;
+    }
+    if (header[1] != BATCH_VERSION || header[2] == 0 || header[2] > MAX_BATCH_ENTRIES)
+    {
+        // Entry size is unknown for other versions; drop whatever followed
+        discardInput();
+        Serial.println("ERR: unsupported batch frame");
+        return;
+    }
+
+    // Entries are read one at a time so a long batch never overflows the serial buffer
+    for (uint8_t i = 0; i < header[2]; i++)
+    {
+        uint8_t entry[4];
+        if (!readExactly(entry, sizeof(entry)))
+        {
+            return;
+        }
+        runBatchEntry(entry);
+    }
+}
+
+// Waits the entry's delay_ms, then executes it
+void runBatchEntry(const uint8_t *entry)
+{
+    uint16_t delay_ms = ((uint16_t)entry[2] << 8) | entry[3];
+    if (delay_ms > 0)
+    {
+        delay(delay_ms);
+    }
+    performPackedAction(entry[0], entry[1]);
+}
+
+// Executes an action given packed (axis << 4) | channel pins; bit 7 of row_pin is the action
+void performPackedAction(uint8_t row_pin, uint8_t col_pin)
+{
+    uint8_t action = (row_pin & 0x80) ? PRESS : RELEASE;
+    uint8_t row_axis = (row_pin >> 4) & 0x01;
+    uint8_t row_channel = row_pin & 0x0F;
+    uint8_t col_axis = (col_pin >> 4) & 0x01;
+    uint8_t col_channel = col_pin & 0x0F;
+    performAction(action, row_axis, row_channel, busAxis(row_axis), busChannel(row_axis),
+                  col_axis, col_channel, busAxis(col_axis), busChannel(col_axis));
 }
 
 void clearAll()
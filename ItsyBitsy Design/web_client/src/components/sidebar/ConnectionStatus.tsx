@@ -35,12 +35,49 @@ const ConnectionStatus: React.FC = () => {
     };
 
     useEffect(() => {
-        fetchStatus();
-
         const pollInterval = Number(process.env.NEXT_PUBLIC_DRINKY_STATUS_POLL_MS) || 500;
-        const interval = setInterval(fetchStatus, pollInterval);
+        let interval: ReturnType<typeof setInterval> | null = null;
+        let source: EventSource | null = null;
+
+        // Fallback for browsers without EventSource, or a backend without the stream
+        const startPolling = () => {
+            if (interval) return;
+            fetchStatus();
+            interval = setInterval(fetchStatus, pollInterval);
+        };
+
+        if (typeof EventSource === 'undefined') {
+            startPolling();
+        } else {
+            // The backend pushes a 'status' event on every transition and a 'heartbeat' in between
+            source = new EventSource(`${flaskUrl}/connection_status/stream`);
+            source.addEventListener('status', (event) => {
+                setStatus(JSON.parse((event as MessageEvent).data));
+                setError(null);
+                setLoading(false);
+            });
+            source.addEventListener('heartbeat', (event) => {
+                const { last_heartbeat } = JSON.parse((event as MessageEvent).data);
+                setStatus((previous) => (previous ? { ...previous, last_heartbeat } : previous));
+            });
+            source.onerror = () => {
+                // EventSource reconnects by itself; CLOSED means the stream is not served at all
+                if (source?.readyState === EventSource.CLOSED) {
+                    source.close();
+                    source = null;
+                    startPolling();
+                    return;
+                }
+                setError('Connection to backend lost');
+                setStatus(null);
+                setLoading(false);
+            };
+        }
 
-        return () => clearInterval(interval);
+        return () => {
+            source?.close();
+            if (interval) clearInterval(interval);
+        };
     }, []);
 
     const getStatusText = () => {
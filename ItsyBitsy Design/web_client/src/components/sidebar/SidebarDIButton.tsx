@@ -3,7 +3,7 @@ import type { AlertColor } from '@mui/material/Alert';
 import * as React from 'react';
 import DrinkySnackbar from '../DrinkySnackbar';
 import { DIBackdrop, DIButton, DIDialog } from './directInput';
-import { fetchDeviceStatus, listen } from './directInput/api';
+import { DirectInputAck, DirectInputChannel, fetchDeviceStatus, listen } from './directInput/api';
 
 
 export default function SidebarDIButton() {
@@ -13,6 +13,44 @@ export default function SidebarDIButton() {
     const [snackbarMessage, setSnackbarMessage] = React.useState('');
     const [openSnackbar, setOpenSnackbar] = React.useState(false);
     const [snackbarSeverity, setSnackbarSeverity] = React.useState<AlertColor>('success');
+    // Open while Direct Input mode is on; null falls back to one POST per key event
+    const channelRef = React.useRef<DirectInputChannel | null>(null);
+
+    const handleChannelAck = (ack: DirectInputAck) => {
+        if (ack.success) return;
+        if (ack.device_disconnected) {
+            console.log('Device disconnected, closing Direct Input mode');
+            setBackdropOpen(false);
+            setSnackbarSeverity('error');
+            setSnackbarMessage('Device disconnected - Direct Input mode disabled');
+            setOpenSnackbar(true);
+            return;
+        }
+        const failed = ack.results?.find((result) => !result.success);
+        setSnackbarSeverity('error');
+        setSnackbarMessage(failed?.message || ack.message || 'Key command failed');
+        setOpenSnackbar(true);
+    };
+
+    React.useEffect(() => {
+        if (!backdropOpen) return;
+        const channel = new DirectInputChannel(handleChannelAck, (wasOpen) => {
+            channelRef.current = null;
+            if (!wasOpen) {
+                console.warn('Direct Input channel unavailable, sending key events over HTTP');
+                return;
+            }
+            setBackdropOpen(false);
+            setSnackbarSeverity('error');
+            setSnackbarMessage('Device connection lost - Direct Input mode disabled');
+            setOpenSnackbar(true);
+        });
+        channelRef.current = channel;
+        return () => {
+            channelRef.current = null;
+            channel.close();
+        };
+    }, [backdropOpen]);
 
     const sendKeyToFlask = async (code: string, data: unknown[], eventType: string = 'keydown') => {
         try {
@@ -80,13 +118,21 @@ export default function SidebarDIButton() {
     const handleKeyDown = (e: KeyboardEvent) => {
         if (backdropOpen) {
             e.preventDefault();
-            sendKeyToFlask(e.code, [], 'keydown');
+            if (channelRef.current) {
+                channelRef.current.send({ code: e.code, type: 'keydown', t: e.timeStamp });
+            } else {
+                sendKeyToFlask(e.code, [], 'keydown');
+            }
         }
     };
 
     const handleKeyUp = (e: KeyboardEvent) => {
         if (backdropOpen) {
-            sendKeyToFlask(e.code, [], 'keyup');
+            if (channelRef.current) {
+                channelRef.current.send({ code: e.code, type: 'keyup', t: e.timeStamp });
+            } else {
+                sendKeyToFlask(e.code, [], 'keyup');
+            }
         }
     };
 
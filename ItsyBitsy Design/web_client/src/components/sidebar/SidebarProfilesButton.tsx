@@ -30,6 +30,13 @@ interface TypingProfile {
     isActive: boolean;
 }
 
+/* Moves one item directly before or after another; the backend re-ranks only that item */
+interface OrderMove {
+    filename: string;
+    before?: string;
+    after?: string;
+}
+
 interface Profile {
     filename: string;
     data: TypingProfile;
@@ -122,14 +129,14 @@ export default function SidebarProfilesButton() {
     }
 
     /* API function */
-    const updateProfileOrder = async (profilesArg: string[]) => {
+    const updateProfileOrder = async (move: OrderMove) => {
 
         const res = await fetch(`${flaskUrl}/preferences/update_profile_order`, {
             method: 'PUT',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify(profilesArg)
+            body: JSON.stringify(move)
         });
         return res;
     }
@@ -254,10 +261,16 @@ export default function SidebarProfilesButton() {
     }
 
     const handleReorder = async (oldIndex: number, newIndex: number) => {
+        if (oldIndex === newIndex) {
+            return;
+        }
         const oldProfiles = [...profiles];
         const item = oldProfiles.splice(oldIndex, 1)[0];
         oldProfiles.splice(newIndex, 0, item);
-        const res = await updateProfileOrder(oldProfiles.map(prof => prof.filename));
+        const move: OrderMove = newIndex > 0
+            ? { filename: item.filename, after: oldProfiles[newIndex - 1].filename }
+            : { filename: item.filename, before: oldProfiles[1].filename };
+        const res = await updateProfileOrder(move);
         const data = await res.json();
 
         if (data.success) {
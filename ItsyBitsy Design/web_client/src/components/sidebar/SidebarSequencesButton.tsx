@@ -30,6 +30,13 @@ interface SequenceInterface {
     isActive: boolean;
 }
 
+/* Moves one item directly before or after another; the backend re-ranks only that item */
+interface OrderMove {
+    filename: string;
+    before?: string;
+    after?: string;
+}
+
 interface Sequence {
     filename: string;
     data: SequenceInterface;
@@ -135,14 +142,14 @@ export default function SidebarSequencesButton() {
     }
 
     /* API function */
-    const updateSequenceOrder = async (sequencesArg: string[]) => {
+    const updateSequenceOrder = async (move: OrderMove) => {
 
         const res = await fetch(`${flaskUrl}/preferences/update_sequence_order`, {
             method: 'PUT',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify(sequencesArg)
+            body: JSON.stringify(move)
         });
         return res;
     }
@@ -265,10 +272,16 @@ export default function SidebarSequencesButton() {
     }
 
     const handleReorder = async (oldIndex: number, newIndex: number) => {
+        if (oldIndex === newIndex) {
+            return;
+        }
         const oldSequences = [...sequences];
         const item = oldSequences.splice(oldIndex, 1)[0];
         oldSequences.splice(newIndex, 0, item);
-        const res = await updateSequenceOrder(oldSequences.map(seq => seq.filename));
+        const move: OrderMove = newIndex > 0
+            ? { filename: item.filename, after: oldSequences[newIndex - 1].filename }
+            : { filename: item.filename, before: oldSequences[1].filename };
+        const res = await updateSequenceOrder(move);
         const data = await res.json();
 
         if (data.success) {
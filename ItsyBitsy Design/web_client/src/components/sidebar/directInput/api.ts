@@ -20,4 +20,60 @@ export const listen = async (code: string, data: unknown[], eventType: string =
     });
 
     return res;
-}
\ No newline at end of file
+}
+export interface DirectInputEvent {
+    code: string;
+    type: 'keydown' | 'keyup';
+    t: number; // KeyboardEvent.timeStamp, so the board keeps the typing rhythm
+}
+
+export interface DirectInputAck {
+    ack: number | null;
+    success: boolean;
+    message?: string;
+    device_disconnected?: boolean;
+    results?: { code: string; success: boolean; message: string; matching_key?: string }[];
+    modifiers?: string[];
+}
+
+// Persistent WebSocket for Direct Input: key events are sent in order, batched per
+// task, without waiting for the acknowledgements that come back asynchronously
+export class DirectInputChannel {
+    private socket: WebSocket;
+    private pending: DirectInputEvent[] = [];
+    private seq = 0;
+    private flushScheduled = false;
+    opened = false;
+
+    constructor(onAck: (ack: DirectInputAck) => void, onClose: (wasOpen: boolean) => void) {
+        this.socket = new WebSocket(`${flaskUrl?.replace(/^http/, 'ws')}/direct_input/ws`);
+        this.socket.onopen = () => {
+            this.opened = true;
+            this.flush();
+        };
+        this.socket.onmessage = (event) => onAck(JSON.parse(event.data));
+        this.socket.onclose = () => onClose(this.opened);
+    }
+
+    send(event: DirectInputEvent) {
+        this.pending.push(event);
+        // Events fired in the same task (e.g. a modifier and its key) go out as one batch
+        if (!this.flushScheduled) {
+            this.flushScheduled = true;
+            queueMicrotask(() => this.flush());
+        }
+    }
+
+    private flush() {
+        this.flushScheduled = false;
+        if (this.socket.readyState !== WebSocket.OPEN || this.pending.length === 0) return;
+        this.seq += 1;
+        this.socket.send(JSON.stringify({ seq: this.seq, events: this.pending }));
+        this.pending = [];
+    }
+
+    close() {
+        this.socket.onclose = null;
+        this.socket.close();
+    }
+}